@@ -1,23 +1,43 @@
-from openai import OpenAI
-import base64
+import os
+import sys
+import json
 import time
+import hashlib
+import base64
+import random
+import asyncio
+import argparse
+
+import openai
+from openai import AsyncOpenAI
+
+# 复用 producer 的配置和模板库（AI_COMIC_DIR、COMIC_TEMPLATES）
+PRODUCER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "producer")
+sys.path.insert(0, PRODUCER_DIR)
+from comic_templates import COMIC_TEMPLATES  # noqa: E402
+import auto_generate_comic  # noqa: E402
+from auto_generate_comic import AI_COMIC_DIR  # noqa: E402
+from site_config import cache_path  # noqa: E402
+
+# ===================== 配置项 =====================
+CHAT_MODEL = "gpt-4o-mini"
+IMAGE_MODEL = "gpt-image-1"
+IMAGE_SIZE = "1024x1024"
+# 同时进行中的想法数（每个想法 = 1 次改写 + 1 次出图）
+CONCURRENCY = 4
+# 每分钟最多发起的请求数（改写和出图都算）
+REQUESTS_PER_MINUTE = 30
+# 限流/超时/5xx 时的重试次数和退避基数（秒），第 n 次重试等待 BACKOFF_BASE * 2^n + 随机抖动
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+# 改写结果缓存：同一个想法重复出图时不再调用 GPT 改写（和 producer 的缓存一样放在站点的 .cache/ 下）
+PROMPT_CACHE_FILE = cache_path("prompt-cache.json")
+PROMPT_CACHE_TTL = 30 * 24 * 3600
+PROMPT_CACHE_MAX_ENTRIES = 5000
 
-client = OpenAI()
-
-# ========= 1️⃣ 中文想法 =========
-idea_cn = "一只很可爱的Q版小猫，卡通风格，明亮配色，适合做表情包"
-
-# ========= 2️⃣ 用 GPT 生成英文绘画 Prompt =========
-prompt_response = client.chat.completions.create(
-    model="gpt-4o-mini",
-    messages=[
-        {
-            "role": "system",
-            "content": "You are a professional AI art prompt engineer."
-        },
-        {
-            "role": "user",
-            "content": f"""
+SYSTEM_PROMPT = "You are a professional AI art prompt engineer."
+USER_PROMPT = """
 请把下面的中文描述，改写成一个高质量的英文绘画 prompt，
 适合用在 AI 图像生成模型中。
 
@@ -30,27 +50,281 @@ prompt_response = client.chat.completions.create(
 中文描述：
 {idea_cn}
 """
-        }
-    ]
-)
 
-image_prompt = prompt_response.choices[0].message.content.strip()
 
-print("🎨 生成的绘画 Prompt：")
-print(image_prompt)
-print("-" * 50)
+# ===================== 限流与重试 =====================
+class RateLimiter:
+    """按固定间隔放行请求（平滑限流，避免一开始就打满配额）"""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0
+        self.next_time = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self.lock:
+            now = time.monotonic()
+            delay = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+async def with_retry(limiter, what, request):
+    """
+    带限流和指数退避的请求
+    :param request: 无参协程函数，每次重试重新调用
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        await limiter.wait()
+        try:
+            return await request()
+        except RETRYABLE_ERRORS as e:
+            if attempt == MAX_RETRIES:
+                raise
+            delay = BACKOFF_BASE * (2 ** attempt) + random.uniform(0, BACKOFF_BASE)
+            print(f"⚠️ {what}失败（{type(e).__name__}），{delay:.1f}s 后第 {attempt + 1} 次重试")
+            await asyncio.sleep(delay)
+
+
+# ===================== 改写缓存 =====================
+class PromptCache:
+    """
+    改写结果的磁盘缓存
+    键 = hash(模型, 系统提示词, 改写要求, 中文想法)，过期（TTL）自动失效，超过上限按最近使用时间淘汰
+    同一批次里重复的想法共用一次进行中的请求
+    """
+
+    def __init__(self, path=PROMPT_CACHE_FILE, ttl=PROMPT_CACHE_TTL, max_entries=PROMPT_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.inflight = {}
+        self.entries = {}
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        now = time.time()
+        self.entries = {k: v for k, v in self.entries.items() if now - v["created"] < ttl}
+
+    @staticmethod
+    def make_key(idea_cn):
+        payload = json.dumps([CHAT_MODEL, SYSTEM_PROMPT, USER_PROMPT, idea_cn], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def get_or_create(self, idea_cn, create):
+        """
+        命中直接返回缓存；未命中调用 create() 并写入缓存
+        :param create: 无参协程函数，返回改写后的 prompt
+        """
+        key = self.make_key(idea_cn)
+        entry = self.entries.get(key)
+        if entry:
+            self.hits += 1
+            entry["used"] = time.time()
+            return entry["prompt"]
+        if key in self.inflight:
+            self.hits += 1
+            return await asyncio.shield(self.inflight[key])
+
+        self.misses += 1
+        future = asyncio.ensure_future(create())
+        self.inflight[key] = future
+        try:
+            prompt = await future
+        finally:
+            del self.inflight[key]
+        now = time.time()
+        self.entries[key] = {"prompt": prompt, "created": now, "used": now}
+        return prompt
+
+    def save(self):
+        """按最近使用时间只保留 max_entries 条，先写临时文件再替换"""
+        if not self.path:
+            return
+        recent = sorted(self.entries.items(), key=lambda kv: kv[1]["used"], reverse=True)
+        self.entries = dict(recent[:self.max_entries])
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries)}
+
+
+# ===================== 生成流程 =====================
+async def rewrite_prompt(client, limiter, idea_cn, cache=None):
+    """用 GPT 把中文想法改写成英文绘画 Prompt（有缓存时相同想法只改写一次）"""
+    async def request():
+        response = await with_retry(limiter, "改写Prompt", lambda: client.chat.completions.create(
+            model=CHAT_MODEL,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": USER_PROMPT.format(idea_cn=idea_cn)}
+            ]
+        ))
+        return response.choices[0].message.content.strip()
+
+    if cache is None:
+        return await request()
+    return await cache.get_or_create(idea_cn, request)
+
+
+async def generate_image(client, limiter, image_prompt):
+    """用 prompt 生成图片，返回解码后的图片字节"""
+    result = await with_retry(limiter, "生成图片", lambda: client.images.generate(
+        model=IMAGE_MODEL,
+        prompt=image_prompt,
+        size=IMAGE_SIZE
+    ))
+    return base64.b64decode(result.data[0].b64_json)
+
+
+def idea_meta(idea):
+    """想法对应的漫画元数据（写进 comic_meta.json 或直接交给 producer），没有时返回 None"""
+    meta = {k: idea[k] for k in ("category", "sub_category") if k in idea}
+    return meta or None
+
+
+def write_comic_dir(output_dir, name, image_bytes, meta):
+    """
+    把一个想法写成 output_dir/<name>/ 子目录（raw_comic.png + comic_meta.json），
+    auto_generate_comic 的 batch/watch 会把每个子目录发布为一个漫画。
+    先写到隐藏的临时目录再整体改名，监听模式不会看到写了一半的漫画
+    :return: 子目录路径
+    """
+    comic_dir = os.path.join(output_dir, name)
+    tmp_dir = os.path.join(output_dir, f".{name}.tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    with open(os.path.join(tmp_dir, "raw_comic.png"), "wb") as f:
+        f.write(image_bytes)
+    if meta:
+        with open(os.path.join(tmp_dir, "comic_meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_dir, comic_dir)
+    return comic_dir
+
+
+async def process_idea(client, limiter, semaphore, idx, idea, output_dir, run_tag, cache=None, write_raw=True):
+    """
+    单个想法：改写 → 出图 → （可选）写入 AI_COMIC_DIR 下的独立子目录，失败只影响自己
+    :return: 解码后的图片字节，失败返回 None
+    """
+    async with semaphore:
+        try:
+            image_prompt = await rewrite_prompt(client, limiter, idea["idea"], cache)
+            print(f"🎨 [{idx:03d}] {image_prompt[:80]}")
+            image_bytes = await generate_image(client, limiter, image_prompt)
+        except Exception as e:
+            # 不只是接口报错：返回格式不对、图片数据解码失败等也只算这一个想法失败，不能打断整批
+            print(f"❌ [{idx:03d}] 生成失败：{type(e).__name__}: {e}")
+            return None
+
+    if write_raw:
+        try:
+            comic_dir = write_comic_dir(output_dir, f"raw_comic_{run_tag}_{idx:03d}", image_bytes, idea_meta(idea))
+        except OSError as e:
+            print(f"❌ [{idx:03d}] 图片写入失败：{e}")
+            return None
+        print(f"✅ [{idx:03d}] 图片生成成功：{comic_dir}")
+    else:
+        print(f"✅ [{idx:03d}] 图片生成成功（{len(image_bytes) / 1024:.0f}KB，直接交给压缩）")
+    return image_bytes
+
+
+def load_ideas(ideas_file=None):
+    """
+    读取想法列表：指定文件时每行一个中文想法，否则每个模板一条（用模板的笑点描述）
+    :return: [{"idea": 中文描述, "category": ..., "sub_category": ...}, ...]
+    """
+    if ideas_file:
+        with open(ideas_file, "r", encoding="utf-8") as f:
+            return [{"idea": line.strip()} for line in f if line.strip()]
+
+    ideas = []
+    for category, subs in COMIC_TEMPLATES.items():
+        for sub_category, template in subs.items():
+            ideas.append({
+                "idea": template["funny_example"],
+                "category": category,
+                "sub_category": sub_category
+            })
+    return ideas
+
+
+async def generate_all(ideas, output_dir, concurrency=CONCURRENCY, per_minute=REQUESTS_PER_MINUTE,
+                       base_url=None, use_cache=True, write_raw=True):
+    """并发处理全部想法，返回每个想法的图片字节（顺序与 ideas 一致，失败为 None）"""
+    if write_raw:
+        os.makedirs(output_dir, exist_ok=True)
+    # 重试由 with_retry 统一处理，关闭 SDK 自带的重试避免叠加
+    client = AsyncOpenAI(base_url=base_url, max_retries=0)
+    limiter = RateLimiter(per_minute)
+    semaphore = asyncio.Semaphore(concurrency)
+    run_tag = time.strftime("%Y%m%d_%H%M%S")
+    cache = PromptCache() if use_cache else None
+
+    try:
+        tasks = [process_idea(client, limiter, semaphore, idx, idea, output_dir, run_tag, cache, write_raw)
+                 for idx, idea in enumerate(ideas, 1)]
+        results = await asyncio.gather(*tasks)
+    finally:
+        await client.close()
+        if cache:
+            cache.save()
+            stats = cache.stats()
+            print(f"Prompt缓存：命中 {stats['hits']}，未命中 {stats['misses']}，共 {stats['entries']} 条")
+
+    ok = sum(1 for image_bytes in results if image_bytes)
+    print(f"\n✅ 批量生成完成：成功 {ok}/{len(ideas)}" + (f"，原图目录：{output_dir}" if write_raw else ""))
+    return results
+
+
+def publish_direct(ideas, results):
+    """
+    直接发布：图片字节在内存里交给 producer 压缩，只写出最终压缩结果
+    （省掉一次全尺寸 PNG 写盘 + 读回），每个想法发布为一个漫画
+    """
+    jobs = []
+    for idea, image_bytes in zip(ideas, results):
+        if not image_bytes:
+            continue
+        jobs.append({"images": [image_bytes], "meta": idea_meta(idea)})
+    if jobs:
+        auto_generate_comic.publish_jobs(jobs)
+        auto_generate_comic.flush_git_push()
+        auto_generate_comic.metrics.write_prometheus()
 
-# ========= 3️⃣ 用 prompt 生成图片 =========
-image_result = client.images.generate(
-    model="gpt-image-1",
-    prompt=image_prompt,
-    size="1024x1024"
-)
 
-image_base64 = image_result.data[0].b64_json
-filename = f"cat_{int(time.time())}.png"
+def parse_args():
+    parser = argparse.ArgumentParser(description="批量把中文想法生成为 AI 漫画图片")
+    parser.add_argument("--ideas", help="想法文件（每行一个中文描述），默认每个模板一条")
+    parser.add_argument("--limit", type=int, help="只处理前 N 条想法")
+    parser.add_argument("--output-dir", default=AI_COMIC_DIR, help=f"输出目录（默认 {AI_COMIC_DIR}）")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="同时处理的想法数")
+    parser.add_argument("--rpm", type=int, default=REQUESTS_PER_MINUTE, help="每分钟最多请求数，0 表示不限")
+    parser.add_argument("--repeat", type=int, default=1, help="每个想法重复出图的次数（改写只做一次）")
+    parser.add_argument("--no-prompt-cache", action="store_true", help="不使用改写缓存")
+    parser.add_argument("--direct", action="store_true",
+                        help="生成后直接在内存中交给 producer 压缩并发布（每个想法一个漫画），不写原图")
+    parser.add_argument("--keep-raw", action="store_true", help="配合 --direct：同时把原图归档到 输出目录/done/raw/")
+    parser.add_argument("--base-url", help="OpenAI 兼容接口地址（如本地桩服务 http://127.0.0.1:8000/v1）")
+    return parser.parse_args()
 
-with open(filename, "wb") as f:
-    f.write(base64.b64decode(image_base64))
 
-print(f"✅ 图片生成成功：{filename}")
+if __name__ == "__main__":
+    args = parse_args()
+    ideas = [idea for idea in load_ideas(args.ideas)[:args.limit] for _ in range(args.repeat)]
+    write_raw = not args.direct or args.keep_raw
+    output_dir = args.output_dir
+    if args.direct:
+        # 直接发布时保留的原图只做归档：放进 done/ 下，batch/watch 不会再把它们当新漫画发布一次
+        output_dir = os.path.join(output_dir, auto_generate_comic.DONE_DIR_NAME, "raw")
+    results = asyncio.run(generate_all(ideas, output_dir, args.concurrency, args.rpm, args.base_url,
+                                       not args.no_prompt_cache, write_raw))
+    if args.direct:
+        publish_direct(ideas, results)
@@ -16,16 +16,9 @@ class ComicStats {
         }
     }
     
-    // 获取漫画阅读量
+    // 获取漫画阅读量（/hit 会同时计一次阅读，和 recordComicView 是同一个请求）
     async getComicViews(comicId) {
-        try {
-            const response = await fetch(`${this.workerUrl}/hit?id=${comicId}`);
-            const data = await response.json();
-            return data.success ? data.data.views : 0;
-        } catch (error) {
-            console.error('获取漫画阅读量失败:', error);
-            return 0;
-        }
+        return this.recordComicView(comicId);
     }
     
     // 获取热门排行榜
@@ -43,12 +36,17 @@ class ComicStats {
         }
     }
     
-    // 记录漫画阅读（使用图片方式，避免被拦截）
-    recordComicView(comicId) {
-        // 使用 Image 对象，不会被广告拦截器拦截
-        const img = new Image();
-        img.src = `${this.workerUrl}/hit?id=${comicId}`;
-        return img;
+    // 记录漫画阅读并返回最新阅读量：只发一次请求，不再额外用 Image 重复计数
+    async recordComicView(comicId) {
+        try {
+            // keepalive：页面很快关闭时请求也能发出去
+            const response = await fetch(`${this.workerUrl}/hit?id=${comicId}`, { keepalive: true });
+            const data = await response.json();
+            return data.success ? data.data.views : 0;
+        } catch (error) {
+            console.error('记录漫画阅读失败:', error);
+            return 0;
+        }
     }
 }
 
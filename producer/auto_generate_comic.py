@@ -1,23 +1,81 @@
 import os
+import io
+import csv
 import json
+import argparse
 import shutil
+import signal
 import subprocess
 import time
 import glob
+import html
+import string
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image, ImageSequence  # 增加ImageSequence用于处理GIF
+try:
+    from inotify_simple import INotify, flags as inotify_flags  # 可选依赖：Linux 下监听目录，没有时轮询
+except ImportError:
+    INotify = None
 # 导入模板库
-from comic_templates import get_template, get_all_categories, get_sub_categories
+from comic_templates import get_template, has_category, get_sub_categories
+import compress_cache
+import metrics
+import perceptual_hash
+import stage_journal
+from file_lock import file_lock
+import index_journal
+from site_config import PROJECT_ROOT, IMG_DIR, COMIC_HTML_DIR, COUNTER_URL, cache_path
 
 # ===================== 配置项 =====================
 AI_COMIC_DIR = "D:/AI_Comic_Output"
 # 修改为支持多种图片格式，包括GIF
 AI_COMIC_PATTERNS = ["raw_comic*.png", "raw_comic*.jpg", "raw_comic*.jpeg", "raw_comic*.gif", "raw_comic*.webp"]
-PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
-IMG_DIR = os.path.join(PROJECT_ROOT, "img")
-COMIC_HTML_DIR = os.path.join(PROJECT_ROOT, "comics")
 COMIC_INDEX_JSON = os.path.join(PROJECT_ROOT, "comic-index.json")
 GIT_BRANCH = "main"
+# 攒够 N 个漫画或距离上次提交超过 T 秒才提交推送一次（监听模式下很有用；单次运行结束时总会提交）
+GIT_COALESCE_COMICS = 1
+GIT_COALESCE_SECONDS = 0
+# 提交推送失败后，队列里的文件至少隔这么多秒再重试（监听模式下避免每轮轮询都去推送）
+GIT_RETRY_SECONDS = 60
+# --no-push：只提交不推送；--dry-run：只打印将要提交的文件，不执行任何 git 命令
+GIT_PUSH_ENABLED = True
+GIT_DRY_RUN = False
 IMAGE_QUALITY = 85
+# GIF 优化参数：最长边上限、调色板颜色数、单帧最短时长（超过的帧率会被合并降帧）、最多帧数
+GIF_MAX_DIMENSION = 640
+GIF_MAX_COLORS = 128
+GIF_MIN_FRAME_MS = 60
+GIF_MAX_FRAMES = 300
+# 是否额外输出同名动画 WebP（详情页会优先加载）
+GIF_EMIT_WEBP = False
+# 内存受限模式：静态图先缩到最长边 MAX_SOURCE_DIMENSION 以内（JPEG 直接按比例解码）再转换颜色模式；
+# GIF 逐帧读取并立即减色，不同时保留全部 RGB 帧（动画 WebP 也由减色后的帧生成）
+MEMORY_BOUNDED = False
+MAX_SOURCE_DIMENSION = 2048
+# 每个进程的常驻内存上限（MB）：预计解码后会超过时不解码，直接复制原图；None 表示不限制
+RSS_CEILING_MB = None
+# 列表页缩略图：多宽度 × 多格式（不会放大，源图更窄时只按源图宽度出一档）
+THUMB_WIDTHS = [320, 640, 1024]
+THUMB_FORMATS = [("webp", "WEBP", "image/webp"), ("jpg", "JPEG", "image/jpeg")]
+# 监听模式：文件停止变化多少秒后视为一个漫画已写完；轮询间隔；处理完的源文件移到 AI_COMIC_DIR/done/
+WATCH_DEBOUNCE_SECONDS = 5
+WATCH_POLL_INTERVAL = 2
+DONE_DIR_NAME = "done"
+# rebuild 时记录每个详情页输入指纹的文件（指纹不变的页面跳过）
+HTML_FINGERPRINT_FILE = cache_path("html-fingerprints.json")
+# 图片压缩进程数（PIL 编码是 CPU 密集型，默认用满所有核心；1 表示串行）
+COMPRESS_WORKERS = os.cpu_count() or 1
+# 压缩缓存：相同源文件 + 相同编码参数时直接复用上次的结果
+COMPRESS_CACHE_ENABLED = True
+# 命令行可改、且进程池子进程里要用到的配置：spawn 方式（Windows、macOS 默认）启动的子进程
+# 不会执行 __main__ 里的赋值，由 worker_settings() 打包后在子进程初始化时恢复
+WORKER_SETTINGS = ("COMPRESS_CACHE_ENABLED", "GIF_EMIT_WEBP", "MEMORY_BOUNDED", "MAX_SOURCE_DIMENSION",
+                   "RSS_CEILING_MB")
+# 发布前查重：源图与 img/ 已有图片感知哈希相近时，"flag" 只提示，"reject" 拒绝发布该漫画，"off" 不检查
+DUPLICATE_POLICY = "flag"
+# 批量清单（CSV）中多张图片路径的分隔符
+BATCH_IMAGE_SEPARATOR = "|"
 
 # 默认配置（从模板库兜底）
 DEFAULT_CATEGORY = "生活日常"
@@ -26,50 +84,339 @@ DEFAULT_SUB_CATEGORY = "居家日常"
 
 # ===================== 核心函数 =====================
 def get_next_comic_id():
-    """获取下一个漫画的序号（comic-001→002→003...）"""
-    if not os.path.exists(COMIC_INDEX_JSON):
-        with open(COMIC_INDEX_JSON, "w", encoding="utf-8") as f:
-            json.dump({"comics": []}, f, ensure_ascii=False, indent=2)
-        return "001"
+    """获取下一个漫画的序号（comic-001→002→003...），只读索引日志头部"""
+    with metrics.stage("allocate_ids", count=1):
+        return str(index_journal.read_last_id() + 1).zfill(3)
 
-    with open(COMIC_INDEX_JSON, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    comic_list = data.get("comics", [])
-    if not comic_list:
-        return "001"
 
-    last_id_str = comic_list[-1]["id"].split("-")[-1]
-    last_id = int(last_id_str)
-    next_id = str(last_id + 1).zfill(3)
-    return next_id
+def compress_settings(output_path):
+    """影响压缩输出的参数（作为压缩缓存键的一部分）"""
+    settings = {
+        "format": os.path.splitext(output_path)[1].lower(),
+        "quality": IMAGE_QUALITY,
+    }
+    if settings["format"] == ".gif":
+        settings["gif"] = [GIF_MAX_DIMENSION, GIF_MAX_COLORS, GIF_MIN_FRAME_MS, GIF_MAX_FRAMES, GIF_EMIT_WEBP]
+    if MEMORY_BOUNDED:
+        settings["bounded"] = MAX_SOURCE_DIMENSION
+    return settings
+
+
+# 源图片既可以是文件路径，也可以是内存里的图片字节（生成脚本直接交接，不落地原图）
+SOURCE_EXTENSIONS = {"PNG": ".png", "JPEG": ".jpg", "GIF": ".gif", "WEBP": ".webp"}
+
+
+def open_source(source):
+    """打开源图片（路径或字节）"""
+    return Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+
+
+def source_size(source):
+    return len(source) if isinstance(source, bytes) else os.path.getsize(source)
+
+
+def copy_source(source, output_path):
+    """原样写出源图片（压缩失败兜底 / 优化后反而更大时使用）"""
+    if isinstance(source, bytes):
+        with open(output_path, "wb") as f:
+            f.write(source)
+    else:
+        shutil.copy(source, output_path)
+
+
+def source_ext(source):
+    """源图片扩展名：路径取后缀，字节按图片格式识别"""
+    if isinstance(source, bytes):
+        with open_source(source) as img:
+            return SOURCE_EXTENSIONS.get(img.format, ".png")
+    return os.path.splitext(source)[1].lower()
+
+
+def webp_sibling(output_path):
+    """GIF 对应的动画 WebP 路径（img/comic-XXX-N.gif → img/comic-XXX-N.webp）"""
+    return os.path.splitext(output_path)[0] + ".webp"
+
+
+def gif_poster(output_path):
+    """GIF 对应的静态海报路径（img/comic-XXX-N.gif → img/comic-XXX-N-poster.jpg）"""
+    return os.path.splitext(output_path)[0] + "-poster.jpg"
+
+
+def save_gif_poster(gif_path):
+    """
+    取（优化后的）GIF 第一帧存成 JPEG 海报：列表页默认只加载海报，卡片可见或悬停时才换成动图
+    海报失败不影响 GIF 本身
+    """
+    poster_path = gif_poster(gif_path)
+    try:
+        with Image.open(gif_path) as img:
+            img.seek(0)
+            frame = img.convert("RGB")
+        frame.save(poster_path, "JPEG", optimize=True, quality=IMAGE_QUALITY)
+        print(f"GIF静态海报已生成：{poster_path}（{os.path.getsize(poster_path) / 1024:.0f}KB）")
+    except Exception as e:
+        print(f"⚠️ GIF静态海报生成失败：{gif_path}（{e}）")
+
+
+def find_gif_poster(img_path):
+    """图片是 GIF 且已有静态海报时返回海报的相对路径，否则 None"""
+    if not img_path.lower().endswith(".gif"):
+        return None
+    poster_path = gif_poster(img_path)
+    return poster_path if os.path.exists(os.path.join(PROJECT_ROOT, poster_path)) else None
+
+
+def image_bytes(size, mode):
+    """解码后的像素数据大小（字节）"""
+    return size[0] * size[1] * Image.getmodebands(mode)
+
+
+def check_memory(needed, what):
+    """
+    预计再占用 needed 字节就会超过 RSS_CEILING_MB 时抛出 MemoryError
+    不兜底为复制原图（那样全尺寸原图会被当成压缩结果发布）：compress_images 在进程池结束后重试，仍超出时推迟整个漫画
+    """
+    if not RSS_CEILING_MB:
+        return
+    rss = metrics.current_rss()
+    if rss + needed > RSS_CEILING_MB * 1024 * 1024:
+        raise MemoryError(f"{what}预计需要 {needed / 1024 / 1024:.0f}MB，当前已用 {rss / 1024 / 1024:.0f}MB，"
+                          f"超过上限 {RSS_CEILING_MB}MB")
+
+
+def decode_bounded(img, max_dimension):
+    """
+    内存受限解码：先缩到最长边不超过 max_dimension，再由调用方转成 RGB（透明通道在这里就会被丢弃）
+    JPEG 用 draft 直接按 1/2~1/8 解码；其他格式只能整张载入，载入后先整数倍 reduce 再精确缩放，
+    同一时刻最多只有一份全尺寸数据
+    """
+    if max(img.size) > max_dimension:
+        scale = max_dimension / max(img.size)
+        img.draft(None, (max(1, int(img.width * scale)), max(1, int(img.height * scale))))
+    check_memory(image_bytes(img.size, img.mode), "解码")
+    if max(img.size) <= max_dimension:
+        return img
+
+    # 调色板图、16 位图等不能直接 reduce，先转成真彩色
+    if img.mode not in ("RGB", "RGBA", "L", "LA"):
+        img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+    factor = max(img.size) // max_dimension
+    if img.mode in ("RGBA", "LA"):
+        # 带透明通道的图缩放前会整张预乘一份；反正之后要转成不透明图，逐个颜色通道缩小再合并
+        mode = img.mode[:-1] if img.mode == "LA" else "RGB"
+        img = Image.merge(mode, [img.getchannel(c).reduce(max(1, factor)) for c in mode])
+    elif factor >= 2:
+        img = img.reduce(factor)
+    if max(img.size) > max_dimension:
+        scale = max_dimension / max(img.size)
+        img = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))), Image.LANCZOS)
+    return img
+
+
+def gif_frame_size(img):
+    """GIF 输出尺寸：最长边不超过 GIF_MAX_DIMENSION"""
+    scale = min(1.0, GIF_MAX_DIMENSION / max(img.size))
+    return max(1, round(img.width * scale)), max(1, round(img.height * scale))
+
+
+def gif_has_alpha(img):
+    """GIF 是否带透明色（透明 GIF 要按 RGBA 读帧，否则透明处会变成黑底）"""
+    return "transparency" in img.info or img.mode in ("RGBA", "LA")
+
+
+def quantize_frame(frame, palette):
+    """
+    按全局调色板减色（不抖动）
+    RGBA 帧先按不透明颜色减色，再把透明像素写成调色板末尾新增的一个索引（GIF 的透明色），
+    透明索引不参与颜色匹配，不透明像素不会被误映射成透明
+    """
+    if frame.mode != "RGBA":
+        return frame.quantize(palette=palette, dither=Image.Dither.NONE)
+    quantized = frame.convert("RGB").quantize(palette=palette, dither=Image.Dither.NONE)
+    colors = palette.getpalette()
+    transparent_index = len(colors) // 3
+    quantized.putpalette(colors + [0, 0, 0])
+    quantized.paste(transparent_index, mask=frame.getchannel("A").point(lambda a: 255 if a < 128 else 0, "L"))
+    quantized.info["transparency"] = transparent_index
+    return quantized
+
+
+def read_gif_frames(img, palette=None):
+    """
+    逐帧读取GIF并统一尺寸，同时限制帧率和帧数
+    :param palette: 给出时每帧读出后立即减色（内存受限模式：每帧只保留 1 字节/像素）
+    :return: (帧列表（RGB/RGBA，或按 palette 减色后的帧）, 每帧时长列表)
+    """
+    size = gif_frame_size(img)
+    mode = "RGBA" if gif_has_alpha(img) else "RGB"
+
+    frames, durations = [], []
+    for frame in ImageSequence.Iterator(img):
+        duration = frame.info.get("duration", 100) or 100
+        # 帧率上限：上一帧时长还不够 GIF_MIN_FRAME_MS 时，丢弃本帧并把时长并入上一帧
+        if durations and durations[-1] < GIF_MIN_FRAME_MS:
+            durations[-1] += duration
+            continue
+        # 帧数上限：之后的帧全部并入最后一帧
+        if len(frames) >= GIF_MAX_FRAMES:
+            durations[-1] += duration
+            continue
+
+        rgb = frame.convert(mode)
+        if rgb.size != size:
+            rgb = rgb.resize(size, Image.LANCZOS)
+        frames.append(rgb if palette is None else quantize_frame(rgb, palette))
+        durations.append(duration)
+    return frames, durations
+
+
+def sample_gif_frames(img, count=8):
+    """内存受限模式下生成调色板用：按帧号均匀抽 count 帧，不读出全部 RGB 帧"""
+    step = max(1, getattr(img, "n_frames", 1) // count)
+    size = gif_frame_size(img)
+    samples = []
+    for idx, frame in enumerate(ImageSequence.Iterator(img)):
+        if len(samples) >= count:
+            break
+        if idx % step == 0:
+            samples.append(frame.convert("RGB").resize(size, Image.LANCZOS))
+    return samples
+
+
+def build_gif_palette(frames, alpha=False):
+    """
+    从抽样帧拼图生成全局调色板，所有帧共用，相邻帧相同像素的索引也相同
+    :param alpha: 透明 GIF 少分配一种颜色，留给透明索引
+    """
+    samples = frames[::max(1, len(frames) // 8)][:8]
+    thumb_w, thumb_h = max(1, samples[0].width // 2), max(1, samples[0].height // 2)
+    montage = Image.new("RGB", (thumb_w * len(samples), thumb_h))
+    for i, frame in enumerate(samples):
+        montage.paste(frame.convert("RGB").resize((thumb_w, thumb_h)), (i * thumb_w, 0))
+    return montage.quantize(colors=min(GIF_MAX_COLORS, 255 if alpha else 256), method=Image.MEDIANCUT)
+
+
+def optimize_gif(source, output_path):
+    """
+    优化GIF动图：限制尺寸/帧率/帧数 + 全局调色板减色
+    Pillow 写多帧 GIF 时会把每帧裁剪到与上一帧有差异的区域（disposal=1 保留上一帧）；
+    透明 GIF 保留透明色，改用 disposal=2（每帧先清空，否则变透明的像素会露出上一帧）
+    优化后反而更大时保留原文件；动画 WebP 只在比最终的 GIF 小时保留
+    """
+    before = source_size(source)
+    with open_source(source) as img:
+        loop = img.info.get("loop", 0)
+        alpha = gif_has_alpha(img)
+        # 全部输出帧常驻内存：减色后每像素 1 字节，否则 RGB 帧 3 字节 + 减色时再 1 字节
+        frame_count = min(getattr(img, "n_frames", 1), GIF_MAX_FRAMES)
+        check_memory(frame_count * image_bytes(gif_frame_size(img), "P") * (1 if MEMORY_BOUNDED else 4),
+                     f"GIF（{frame_count}帧）")
+        if MEMORY_BOUNDED:
+            palette = build_gif_palette(sample_gif_frames(img), alpha)
+            frames, durations = read_gif_frames(img, palette)
+        else:
+            frames, durations = read_gif_frames(img)
+
+    webp_path = webp_sibling(output_path)
+    if os.path.exists(webp_path):
+        os.remove(webp_path)
+    if GIF_EMIT_WEBP:
+        # 内存受限模式下帧已减色，透明 GIF 的帧先还原成 RGBA，WebP 才带透明通道
+        webp_frames = [frame.convert("RGBA") if alpha and frame.mode == "P" else frame for frame in frames]
+        webp_frames[0].save(webp_path, "WEBP", save_all=True, append_images=webp_frames[1:],
+                            duration=durations, loop=loop, quality=IMAGE_QUALITY, method=6)
+        del webp_frames
+
+    if not MEMORY_BOUNDED:
+        palette = build_gif_palette(frames, alpha)
+        # 不抖动：抖动噪点会让相邻帧处处不同，差异裁剪就失效了
+        frames = [quantize_frame(frame, palette) for frame in frames]
+    gif_options = {"transparency": frames[0].info["transparency"], "disposal": 2} if alpha else {"disposal": 1}
+    frames[0].save(output_path, "GIF", save_all=True, append_images=frames[1:],
+                   duration=durations, loop=loop, optimize=True, **gif_options)
+
+    after = os.path.getsize(output_path)
+    if after >= before:
+        copy_source(source, output_path)
+        print(f"GIF优化后更大（{before / 1024:.0f}KB → {after / 1024:.0f}KB），保留原文件：{output_path}")
+        after = before
+    else:
+        print(f"GIF优化完成：{output_path}（{before / 1024:.0f}KB → {after / 1024:.0f}KB，"
+              f"{len(frames)}帧，节省 {(1 - after / before) * 100:.0f}%）")
+
+    if GIF_EMIT_WEBP:
+        webp_size = os.path.getsize(webp_path)
+        if webp_size >= after:
+            os.remove(webp_path)
+            print(f"动画WebP不比GIF小（{webp_size / 1024:.0f}KB ≥ {after / 1024:.0f}KB），不保留：{webp_path}")
+        else:
+            print(f"动画WebP已生成：{webp_path}（{after / 1024:.0f}KB → {webp_size / 1024:.0f}KB）")
 
 
 def compress_image(input_path, output_path):
-    """压缩图片（适配多图片类型，包括GIF）"""
+    """
+    压缩图片并记录指标（耗时、输入/输出字节、压缩率、是否命中缓存）
+    :param input_path: 源文件路径，或内存中的图片字节（只写出压缩结果）
+    """
+    with metrics.stage("compress_image", file=os.path.basename(output_path)) as m:
+        # 峰值内存按单张图片统计（Linux 下每张图开始前清零）
+        metrics.reset_peak_rss()
+        m["bytes_in"] = source_size(input_path)
+        m["cache_hit"] = _compress_image(input_path, output_path)
+        m["bytes_out"] = metrics.file_size(output_path)
+        if output_path.lower().endswith(".gif"):
+            m["bytes_out"] += metrics.file_size(webp_sibling(output_path)) + metrics.file_size(gif_poster(output_path))
+        m["peak_rss"] = metrics.peak_rss()
+    if MEMORY_BOUNDED:
+        print(f"内存峰值 {m['peak_rss'] / 1024 / 1024:.0f}MB：{output_path}")
+    return output_path
+
+
+def _compress_image(input_path, output_path):
+    """
+    压缩图片（适配多图片类型，包括GIF；源文件和参数都没变时直接复用缓存）
+    :return: 是否命中缓存
+    """
+    cache_key = None
+    if COMPRESS_CACHE_ENABLED:
+        cache_key = compress_cache.cache_key(input_path, compress_settings(output_path))
+        hit = compress_cache.fetch(cache_key, output_path)
+        if hit and GIF_EMIT_WEBP and output_path.lower().endswith(".gif"):
+            # 不比 GIF 小的 WebP 当初就没有保留，缓存里也没有；去掉上次留下的旧文件即可
+            if not compress_cache.fetch(cache_key, webp_sibling(output_path)) and \
+                    os.path.exists(webp_sibling(output_path)):
+                os.remove(webp_sibling(output_path))
+        if hit and output_path.lower().endswith(".gif"):
+            hit = compress_cache.fetch(cache_key, gif_poster(output_path))
+        if hit:
+            print(f"命中压缩缓存：{output_path}")
+            return True
+
+    # 输出文件可能是缓存条目的硬链接，先删除再写，避免原地改写污染缓存
+    if os.path.exists(output_path):
+        os.remove(output_path)
+
     try:
         # 获取文件扩展名
-        file_ext = os.path.splitext(input_path)[1].lower()
+        file_ext = source_ext(input_path)
 
         # 如果是GIF，进行特殊处理
         if file_ext == '.gif':
-            # 对于GIF动图，有两种处理方式：
-            # 方式1：直接复制（保持动画）
-            shutil.copy(input_path, output_path)
-            print(f"GIF动图已复制（保持动画）：{output_path}")
-
-            # 方式2：提取第一帧作为静态图片（如果需要静态预览）
-            # 可以添加一个额外的静态版本
-            # static_output_path = output_path.replace('.gif', '_static.jpg')
-            # with Image.open(input_path) as img:
-            #     img.seek(0)  # 获取第一帧
-            #     if img.mode in ("RGBA", "P"):
-            #         img = img.convert("RGB")
-            #     img.save(static_output_path, "JPEG", optimize=True, quality=IMAGE_QUALITY)
-            # print(f"GIF静态预览已生成：{static_output_path}")
+            # 对于GIF动图，两种产出都要：
+            # 方式1：逐帧优化（保持动画）
+            optimize_gif(input_path, output_path)
+
+            # 方式2：提取第一帧作为静态海报（列表页默认显示它，动图按需加载）
+            save_gif_poster(output_path)
 
         else:
             # 处理静态图片（PNG、JPG等）
-            img = Image.open(input_path)
+            img = open_source(input_path)
+            if MEMORY_BOUNDED:
+                img = decode_bounded(img, MAX_SOURCE_DIMENSION)
+            else:
+                # 整张解码一份，转 RGB 再一份
+                check_memory(image_bytes(img.size, img.mode) + image_bytes(img.size, "RGB"), "解码")
             if img.mode in ("RGBA", "P"):
                 img = img.convert("RGB")
 
@@ -82,23 +429,205 @@ def compress_image(input_path, output_path):
                 img.save(output_path, "JPEG", optimize=True, quality=IMAGE_QUALITY)
             print(f"静态图片压缩完成：{output_path}")
 
+        if cache_key:
+            compress_cache.store(cache_key, output_path)
+            if GIF_EMIT_WEBP and file_ext == '.gif' and os.path.exists(webp_sibling(output_path)):
+                compress_cache.store(cache_key, webp_sibling(output_path))
+            if file_ext == '.gif' and os.path.exists(gif_poster(output_path)):
+                compress_cache.store(cache_key, gif_poster(output_path))
+
+    except MemoryError:
+        # 超出内存上限：交给调用方推迟/重试，不写出任何结果
+        for path in [output_path] + gif_derived_files(output_path):
+            if os.path.exists(path):
+                os.remove(path)
+        raise
     except Exception as e:
         # 如果处理失败，直接复制原文件
-        shutil.copy(input_path, output_path)
+        copy_source(input_path, output_path)
         print(f"图片处理失败，直接复制：{e}")
 
+    return False
+
+
+def compress_images(jobs, workers=None):
+    """
+    并行压缩多张图片（进程池），结果顺序与 jobs 一致
+    超出 RSS_CEILING_MB 的图片等进程池结束后在主进程里逐张重试（此时没有其他图片同时解码）
+    :param jobs: [(input_path, output_path), ...]
+    :param workers: 进程数，默认 COMPRESS_WORKERS
+    :return: 去重后的输出路径列表（内容相同的图片会指向同一个文件）；重试后仍超出内存上限的为 None
+    """
+    workers = min(workers or COMPRESS_WORKERS, len(jobs))
+    if workers <= 1:
+        results = [_compress_or_defer(src, dst) for src, dst in jobs]
+    else:
+        results = _compress_in_pool(jobs, workers)
+
+    deferred = [idx for idx, path in enumerate(results) if path is None]
+    if deferred and workers > 1:
+        print(f"⚠️ {len(deferred)} 张图片超出内存上限，进程池结束后逐张重试")
+        for idx in deferred:
+            results[idx] = _compress_or_defer(*jobs[idx])
+
+    done = [idx for idx, path in enumerate(results) if path is not None]
+    for idx, path in zip(done, compress_cache.dedupe_outputs([results[idx] for idx in done], IMG_DIR,
+                                                             derived=gif_derived_files)):
+        results[idx] = path
+    with metrics.stage("dhash", count=len(done)):
+        perceptual_hash.index_images([results[idx] for idx in done], IMG_DIR)
+    if COMPRESS_CACHE_ENABLED:
+        compress_cache.evict()
+    return results
+
+
+def _compress_or_defer(src, dst):
+    """压缩一张图；超出内存上限时返回 None"""
+    try:
+        return compress_image(src, dst)
+    except MemoryError as e:
+        print(f"⚠️ 图片超出内存上限，暂不处理：{dst}（{e}）")
+        return None
+
+
+def gif_derived_files(path):
+    """GIF 输出附带生成的动画 WebP 和静态海报（其他格式没有派生文件）"""
+    if not path.lower().endswith(".gif"):
+        return []
+    return [webp_sibling(path), gif_poster(path)]
+
+
+def worker_settings():
+    return {name: globals()[name] for name in WORKER_SETTINGS}
+
+
+def _init_worker(settings):
+    """进程池子进程初始化：恢复主进程里被命令行参数改过的配置"""
+    globals().update(settings)
+
+
+def new_pool(workers):
+    """创建进程池，子进程与主进程使用同样的配置（不依赖 fork 继承全局变量）"""
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(worker_settings(),))
+
+
+def _compress_in_pool(jobs, workers):
+    """进程池压缩，单个文件出错不影响其他文件"""
+    results = []
+    with new_pool(workers) as pool:
+        futures = [pool.submit(_compress_job, src, dst) for src, dst in jobs]
+        for (src, dst), future in zip(jobs, futures):
+            try:
+                output_path, records = future.result()
+                for rec in records:
+                    metrics.record(rec)
+                results.append(output_path)
+            except MemoryError:
+                # 子进程里超出内存上限：留给 compress_images 在主进程重试
+                results.append(None)
+            except Exception as e:
+                # compress_image 内部已兜底，这里只会是子进程崩溃等异常，同样退回直接复制
+                copy_source(src, dst)
+                print(f"图片处理进程异常，直接复制：{dst}（{e}）")
+                results.append(dst)
+    return results
+
+
+def _compress_job(src, dst):
+    """进程池任务：压缩一张图，指标记录随结果带回主进程汇总"""
+    with metrics.capture() as records:
+        output_path = compress_image(src, dst)
+    return output_path, records
+
+
+def map_in_pool(func, items, workers=None):
+    """用进程池按顺序对 items 执行 func（func 需自行兜底异常）"""
+    workers = min(workers or COMPRESS_WORKERS, len(items))
+    if workers <= 1:
+        return [func(item) for item in items]
+    with new_pool(workers) as pool:
+        return list(pool.map(func, items))
+
+
+def thumbnail_path(image_path, width, ext):
+    """img/comic-XXX-N.gif → img/comic-XXX-N-320w.webp"""
+    return f"{os.path.splitext(image_path)[0]}-{width}w.{ext}"
+
+
+def generate_thumbnails(img_path):
+    """
+    为列表页生成多宽度缩略图（WebP + JPEG，GIF 取第一帧），已是最新的直接复用
+    :param img_path: 相对路径（img/comic-XXX-N.ext）
+    :return: [{"src": "img/comic-XXX-N-320w.webp", "width": 320, "height": 240, "type": "image/webp"}, ...]
+    """
+    thumbs = []
+    try:
+        src_path = os.path.join(PROJECT_ROOT, img_path)
+        src_mtime = os.path.getmtime(src_path)
+        with Image.open(src_path) as img:
+            img.seek(0)
+            if MEMORY_BOUNDED:
+                # 只要宽度比最大一档缩略图略宽，缩略图档位就和完整解码时一致
+                frame = decode_bounded(img, -(-(max(THUMB_WIDTHS) + 2) * max(img.size) // img.width))
+            else:
+                frame = img
+            frame = frame.convert("RGB")
+
+        widths = [w for w in THUMB_WIDTHS if w < frame.width] or [frame.width]
+        for width in widths:
+            height = max(1, round(frame.height * width / frame.width))
+            resized = None
+            for ext, fmt, mime in THUMB_FORMATS:
+                rel_path = thumbnail_path(img_path, width, ext)
+                dst_path = os.path.join(PROJECT_ROOT, rel_path)
+                if not os.path.exists(dst_path) or os.path.getmtime(dst_path) < src_mtime:
+                    resized = resized or frame.resize((width, height), Image.LANCZOS)
+                    resized.save(dst_path, fmt, optimize=True, quality=IMAGE_QUALITY)
+                thumbs.append({"src": rel_path, "width": width, "height": height, "type": mime})
+        print(f"缩略图生成完成：{img_path}（{len(thumbs)}张）")
+    except Exception as e:
+        print(f"缩略图生成失败，列表页将直接使用原图：{img_path}（{e}）")
+        return []
+    return thumbs
+
 
 def get_image_files():
     """获取所有支持的图片文件"""
+    return find_images(AI_COMIC_DIR)
+
+
+def find_images(folder):
+    """获取指定目录下所有支持的图片文件"""
     img_files = []
     for pattern in AI_COMIC_PATTERNS:
-        img_files.extend(glob.glob(os.path.join(AI_COMIC_DIR, pattern)))
+        img_files.extend(glob.glob(os.path.join(folder, pattern)))
 
     # 按文件名排序，确保顺序正确
     img_files.sort()
     return img_files
 
 
+def plan_comic_images(comic_id, img_files):
+    """规划一个漫画的图片输出：[(源文件或图片字节, 目标文件), ...]"""
+    jobs = []
+    for idx, img in enumerate(img_files, 1):
+        # 获取原始扩展名，保留原始格式（.png, .jpg, .gif等）
+        ext = source_ext(img)
+        img_name = f"{comic_id}-{idx}{ext}"
+        jobs.append((img, os.path.join(IMG_DIR, img_name)))
+    return jobs
+
+
+def to_img_paths(output_paths):
+    """把输出文件路径转换成页面/索引里用的相对路径（img/xxx）"""
+    return [f"img/{os.path.basename(path)}" for path in output_paths]
+
+
+def compress_comic_images(comic_id, img_files):
+    """压缩一个漫画的全部图片，返回相对路径列表（img/comic-XXX-N.ext）"""
+    return to_img_paths(compress_images(plan_comic_images(comic_id, img_files)))
+
+
 def get_comic_meta(comic_id_num, meta_file_path=None):
     """
     获取漫画元数据（优先读JSON，其次用模板，最后兜底）
@@ -111,31 +640,44 @@ def get_comic_meta(comic_id_num, meta_file_path=None):
         try:
             with open(meta_file_path, "r", encoding="utf-8") as f:
                 meta_data = json.load(f)
+            return resolve_comic_meta(comic_id_num, meta_data)
+        except Exception as e:
+            print(f"读取自定义JSON失败，使用模板：{e}")
 
-            category = meta_data.get("category", DEFAULT_CATEGORY)
-            sub_category = meta_data.get("sub_category", DEFAULT_SUB_CATEGORY)
+    return resolve_comic_meta(comic_id_num, None)
 
-            # 尝试从模板补全缺失字段
-            template = get_template(category, sub_category)
-            if template:
-                title = meta_data.get("title", template["default_title"])
-                topic = meta_data.get("topic", template["default_topic"])
-                sub_topic = meta_data.get("sub_topic", template["sub_topic"])
-                funny_example = meta_data.get("funny_example", template["funny_example"])
-            else:
-                # 无模板时用自定义值/默认值
-                title = meta_data.get("title", f"趣味四格漫画-{comic_id_num}")
-                topic = meta_data.get("topic", "日常·搞笑·轻松一刻")
-                sub_topic = meta_data.get("sub_topic", "居家日常")
-                funny_example = meta_data.get("funny_example", "简单有趣的日常小笑点")
 
-            # 校验主分类合法性
-            if category not in get_all_categories():
-                category = DEFAULT_CATEGORY
+def resolve_comic_meta(comic_id_num, meta_data=None):
+    """
+    根据元数据字典补全漫画信息（批量模式的清单行也走这里）
+    :param comic_id_num: 漫画ID（如"001"）
+    :param meta_data: 自定义元数据字典，None 表示直接用默认模板
+    :return: (title, topic, category, sub_topic, funny_example)
+    """
+    # 1. 优先使用自定义字段
+    if meta_data:
+        category = meta_data.get("category", DEFAULT_CATEGORY)
+        sub_category = meta_data.get("sub_category", DEFAULT_SUB_CATEGORY)
 
-            return title, topic, category, sub_topic, funny_example
-        except Exception as e:
-            print(f"读取自定义JSON失败，使用模板：{e}")
+        # 尝试从模板补全缺失字段
+        template = get_template(category, sub_category)
+        if template:
+            title = meta_data.get("title", template["default_title"])
+            topic = meta_data.get("topic", template["default_topic"])
+            sub_topic = meta_data.get("sub_topic", template["sub_topic"])
+            funny_example = meta_data.get("funny_example", template["funny_example"])
+        else:
+            # 无模板时用自定义值/默认值
+            title = meta_data.get("title", f"趣味四格漫画-{comic_id_num}")
+            topic = meta_data.get("topic", "日常·搞笑·轻松一刻")
+            sub_topic = meta_data.get("sub_topic", "居家日常")
+            funny_example = meta_data.get("funny_example", "简单有趣的日常小笑点")
+
+        # 校验主分类合法性
+        if not has_category(category):
+            category = DEFAULT_CATEGORY
+
+        return title, topic, category, sub_topic, funny_example
 
     # 2. 使用默认模板
     template = get_template(DEFAULT_CATEGORY, DEFAULT_SUB_CATEGORY)
@@ -158,9 +700,158 @@ def get_comic_meta(comic_id_num, meta_file_path=None):
     )
 
 
+# 详情页模板（模块加载时编译一次，rebuild 时所有页面共用）
+# 修改模板后递增 TEMPLATE_VERSION，rebuild 会据此重新生成全部详情页
+TEMPLATE_VERSION = 3
+COMIC_PAGE_TEMPLATE = string.Template("""
+<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>$title - 笑点制造机</title>
+    <!-- 预连接统计服务 -->
+    <link rel="preconnect" href="$counter_url">
+
+    <style>
+        * { margin: 0; padding: 0; box-sizing: border-box; }
+        body {
+            font-family: -apple-system, BlinkMacSystemFont, "PingFang SC", "Microsoft YaHei", sans-serif;
+            background: #f5f5f5;
+            color: #333;
+        }
+        .container {
+            max-width: 800px;
+            margin: 0 auto;
+            padding: 40px 20px;
+        }
+        .back-btn {
+            display: inline-block;
+            padding: 8px 16px;
+            background: #333;
+            color: white;
+            text-decoration: none;
+            border-radius: 4px;
+            margin-bottom: 30px;
+            font-size: 14px;
+        }
+        h1 {
+            font-size: 28px;
+            margin-bottom: 10px;
+            font-weight: 600;
+        }
+        .meta-info {
+            background: white;
+            padding: 20px;
+            border-radius: 8px;
+            margin-bottom: 30px;
+            box-shadow: 0 2px 8px rgba(0,0,0,0.05);
+            line-height: 1.8;
+            font-size: 16px;
+        }
+        .meta-info .label {
+            font-weight: 500;
+            display: inline-block;
+            width: 90px;
+        }
+        .comic-img {
+            width: 100%;
+            border-radius: 8px;
+            margin-bottom: 20px;
+            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
+        }
+
+        /* 广告位样式 */
+        .ad-slot {
+            width: 100%;
+            margin: 30px 0;
+            padding: 16px;
+            background: #fafafa;
+            border: 1px dashed #ddd;
+            border-radius: 8px;
+            text-align: center;
+            color: #999;
+            font-size: 14px;
+        }
+        .ad-top { min-height: 90px; }
+        .ad-middle { min-height: 250px; }
+        .ad-footer { min-height: 90px; }
+
+        .footer {
+            text-align: center;
+            margin-top: 40px;
+            color: #999;
+            font-size: 14px;
+        }
+    </style>
+
+    <script>
+        // 优化统计脚本
+        window.addEventListener('load', function() {
+            // 延迟执行统计，不阻塞页面渲染
+            setTimeout(function() {
+                // 记录阅读量并显示最新计数：/hit 本身就返回计数，只请求一次
+                // keepalive 保证页面很快被关掉时请求也能发出去
+                fetch(`$counter_url/hit?id=$comic_id`, { keepalive: true })
+                    .then(response => response.json())
+                    .then(data => {
+                        if (data.success) {
+                            document.getElementById('comic-views-count').textContent = 
+                                data.data.views.toLocaleString();
+                        }
+                    })
+                    .catch(() => {
+                        // 静默失败
+                    });
+            }, 500); // 延迟500ms执行
+        });
+    </script>
+</head>
+<body>
+<div class="container">
+    <a href="../index.html" class="back-btn">← 返回笑点制造机</a>
+
+    <h1>$title</h1>
+
+    <!-- 顶部广告位 -->
+    <div class="ad-slot ad-top">
+        <span class="ad-placeholder">广告位（728×90）</span>
+    </div>
+
+    <div class="meta-info">
+        <div><span class="label">主分类：</span>$category</div>
+        <div><span class="label">子主题：</span>$sub_topic</div>
+        <div><span class="label">核心笑点：</span>$funny_example</div>
+        <div><span class="label">主题标签：</span>$topic</div>
+        <!-- 在元数据中显示阅读量 -->
+        <div><span class="label">阅读次数：</span>
+            <span id="comic-views-count">
+                <span class="loading"></span> 统计中...
+            </span>
+        </div>
+    </div>
+
+    $img_html
+
+    <!-- 底部广告位 -->
+    <div class="ad-slot ad-footer">
+        <span class="ad-placeholder">广告位（728×90）</span>
+    </div>
+
+    <div class="footer">
+        © 笑点制造机 · AI辅助创作 · 仅供娱乐
+    </div>
+</div>
+</body>
+</html>
+""")
+
+
 def generate_comic_html(comic_id, title, topic, category, sub_topic, funny_example, img_paths):
     """生成详情页（支持GIF + 访问统计 + 广告位预留）"""
     html_path = os.path.join(COMIC_HTML_DIR, f"{comic_id}.html")
+    # 标题、主题等来自 AI 生成或人工填写的元数据，写进页面前统一转义
+    alt = html.escape(title)
 
     # 生成图片HTML（第一张图后插入中部广告）
     img_html_list = []
@@ -168,9 +859,13 @@ def generate_comic_html(comic_id, title, topic, category, sub_topic, funny_examp
         img_ext = os.path.splitext(img_path)[1].lower()
 
         if img_ext == '.gif':
-            img_html = f'<img src="../{img_path}" alt="{title}" class="comic-img gif-image" loading="lazy">'
+            img_html = f'<img src="../{img_path}" alt="{alt}" class="comic-img gif-image" loading="lazy">'
+            # 有动画 WebP 时优先给支持的浏览器
+            webp_path = webp_sibling(img_path)
+            if os.path.exists(os.path.join(PROJECT_ROOT, webp_path)):
+                img_html = f'<picture><source srcset="../{webp_path}" type="image/webp">{img_html}</picture>'
         else:
-            img_html = f'<img src="../{img_path}" alt="{title}" class="comic-img" loading="lazy">'
+            img_html = f'<img src="../{img_path}" alt="{alt}" class="comic-img" loading="lazy">'
 
         img_html_list.append(img_html)
 
@@ -184,66 +879,24 @@ def generate_comic_html(comic_id, title, topic, category, sub_topic, funny_examp
 
     img_html = "".join(img_html_list)
 
-    html_template = f"""
-<!DOCTYPE html>
-<html lang="zh-CN">
-<head>
-    <!-- 预连接统计服务 -->
-    <link rel="preconnect" href="https://comic-hot-counter.zhouguangzheng.workers.dev">
-    
-    <script>
-
-
-        // 优化统计脚本
-        window.addEventListener('load', function() {{
-            // 延迟执行统计，不阻塞页面渲染
-            setTimeout(function() {{
-                // 记录阅读量
-                const img = new Image();
-                img.src = `https://comic-hot-counter.zhouguangzheng.workers.dev/hit?id={comic_id}`;
-                
-                // 获取并显示阅读量
-                fetch(`https://comic-hot-counter.zhouguangzheng.workers.dev/hit?id={comic_id}`)
-                    .then(response => response.json())
-                    .then(data => {{
-                        if (data.success) {{
-                            document.getElementById('comic-views-count').textContent = 
-                                data.data.views.toLocaleString();
-                        }}
-                    }})
-                    .catch(() => {{
-                        // 静默失败
-                    }});
-            }}, 500); // 延迟500ms执行
-        }});
-    </script>
-</head>
-<body>
-    <!-- 在元数据中显示阅读量 -->
-    <div><span class="label">阅读次数：</span>
-        <span id="comic-views-count">
-            <span class="loading"></span> 统计中...
-        </span>
-    </div>
-</body>
-</html>
-    """
+    page = COMIC_PAGE_TEMPLATE.substitute(
+        comic_id=comic_id, title=alt, topic=html.escape(topic), category=html.escape(category),
+        sub_topic=html.escape(sub_topic), funny_example=html.escape(funny_example),
+        img_html=img_html, counter_url=COUNTER_URL).strip()
 
     with open(html_path, "w", encoding="utf-8") as f:
-        f.write(html_template.strip())
+        f.write(page)
 
     print(f"详情页生成完成：{html_path}")
     return html_path
 
-def update_comic_index(comic_id, title, topic, category, sub_topic, funny_example, main_img, html_path, img_count):
-    """更新索引（含完整模板字段和图片数量信息）"""
-    with open(COMIC_INDEX_JSON, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
+def build_comic_entry(comic_id, title, topic, category, sub_topic, funny_example, main_img, html_path, img_count,
+                      thumbs=None, imgs=None, poster=None):
+    """组装一条索引记录（含完整模板字段、图片数量、缩略图和 GIF 静态海报信息）"""
     # 检查是否有GIF动图
     has_gif = main_img.lower().endswith('.gif')
 
-    new_comic = {
+    return {
         "id": comic_id,
         "title": title,
         "topic": topic,
@@ -253,79 +906,741 @@ def update_comic_index(comic_id, title, topic, category, sub_topic, funny_exampl
         "img": main_img,
         "html": html_path,
         "img_count": img_count,
+        "imgs": imgs or [main_img],
         "has_gif": has_gif,
+        "thumbs": thumbs or [],
+        # 封面 GIF 的静态海报（列表页先显示它，动图按需加载），非 GIF 为 None
+        "poster": poster,
         "create_time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
     }
-    data["comics"].append(new_comic)
 
-    with open(COMIC_INDEX_JSON, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-    print(f"索引更新完成：{COMIC_INDEX_JSON}")
+
+def update_comic_index(comic_id, title, topic, category, sub_topic, funny_example, main_img, html_path, img_count,
+                       thumbs=None, imgs=None, poster=None):
+    """更新索引（含完整模板字段、图片列表、缩略图和 GIF 静态海报信息），返回写入的记录"""
+    new_comic = build_comic_entry(comic_id, title, topic, category, sub_topic, funny_example,
+                                  main_img, html_path, img_count, thumbs, imgs, poster)
+    append_comic_entries([new_comic])
+    return new_comic
+
+
+def append_comic_entries(entries):
+    """把记录追加进索引日志（每条一行，与索引大小无关）"""
+    with metrics.stage("index_append", count=len(entries)) as m:
+        before = metrics.file_size(index_journal.JOURNAL_PATH)
+        index_journal.append_entries(entries)
+        m["bytes_out"] = metrics.file_size(index_journal.JOURNAL_PATH) - before
+    print(f"索引日志追加完成：新增 {len(entries)} 条")
+
+
+def compact_comic_index(force=False):
+    """
+    把索引日志压实成 comic-index.json 快照：发布后只在日志积累够 COMPACT_TAIL_BYTES 时才做，
+    列表页用的分片索引由 build_index 生成，它自己会先压实
+    :param force: 不管积累了多少都压实
+    """
+    with metrics.stage("index_compact") as m:
+        m["bytes_in"] = metrics.file_size(index_journal.JOURNAL_PATH)
+        comics = index_journal.compact() if force else index_journal.compact_if_needed()
+        m["skipped"] = comics is None
+        m["bytes_out"] = 0 if comics is None else metrics.file_size(index_journal.SNAPSHOT_PATH)
+
+
+def comic_output_paths(entry):
+    """
+    一个漫画产出的全部文件（相对 PROJECT_ROOT）：图片（含动画 WebP 和静态海报）、缩略图、详情页
+    :return: 路径列表
+    """
+    paths = [entry["html"]]
+    for img_path in get_entry_images(entry):
+        paths.append(img_path)
+        if img_path.lower().endswith(".gif"):
+            paths.extend([webp_sibling(img_path), gif_poster(img_path)])
+    paths.extend(thumb["src"] for thumb in entry.get("thumbs") or [])
+    return paths
+
+
+def index_output_paths():
+    """索引日志和快照（每次发布都会改写）"""
+    return [os.path.relpath(p, PROJECT_ROOT) for p in (index_journal.JOURNAL_PATH, index_journal.SNAPSHOT_PATH)]
+
+
+def git_push(paths, comic_count=1):
+    """
+    Git推送：只暂存本次产出的文件（不再 git add . 扫描整个仓库）
+    :param paths: 相对 PROJECT_ROOT 的文件路径
+    :param comic_count: 本次提交包含的漫画数（只用于提交说明）
+    :return: 是否提交成功（--dry-run 视为未提交）
+    """
+    # 不存在的文件（如未开启 --gif-webp 时的 .webp）直接跳过，否则 git add 会报错
+    paths = sorted(p for p in set(paths) if os.path.exists(os.path.join(PROJECT_ROOT, p)))
+    if not paths:
+        return True
+    if GIT_DRY_RUN:
+        print(f"[dry-run] 将提交 {len(paths)} 个文件（{comic_count} 个漫画）：")
+        for path in paths:
+            print(f"  {path}")
+        return False
+
+    # 路径经 stdin 传给 git，漫画再多也不会超出命令行长度
+    pathspec = "\n".join(paths).encode("utf-8")
+    # 并行的 producer 排队提交，避免争抢 .git/index.lock
+    with metrics.stage("git", files=len(paths), comics=comic_count) as m, file_lock("git"):
+        m["bytes_in"] = sum(metrics.file_size(os.path.join(PROJECT_ROOT, p)) for p in paths)
+        try:
+            subprocess.run(["git", "add", "--pathspec-from-file=-"], input=pathspec, cwd=PROJECT_ROOT,
+                           check=True, capture_output=True)
+            # 上次已经提交、只是推送失败时，这些文件没有新的改动：跳过提交，直接重试推送。
+            # 站点目录可能在仓库的子目录里（producer/），--relative 让输出也相对 PROJECT_ROOT
+            staged = subprocess.run(["git", "diff", "--cached", "--name-only", "--relative", "-z"],
+                                    cwd=PROJECT_ROOT, check=True, capture_output=True).stdout.decode("utf-8")
+            if set(staged.split("\0")) & {p.replace(os.sep, "/") for p in paths}:
+                subprocess.run(["git", "commit", "-m", f"新增漫画 {comic_count} 个 {time.strftime('%Y%m%d_%H%M%S')}",
+                                "--pathspec-from-file=-"], input=pathspec, cwd=PROJECT_ROOT,
+                               check=True, capture_output=True)
+            else:
+                print("没有新的改动需要提交（上次已提交），只推送")
+            if not GIT_PUSH_ENABLED:
+                print(f"Git提交成功（未推送）：{len(paths)} 个文件")
+                return True
+            subprocess.run(["git", "push", "origin", GIT_BRANCH], cwd=PROJECT_ROOT, check=True,
+                           capture_output=True)
+            print(f"Git推送成功！（{comic_count} 个漫画，{len(paths)} 个文件）")
+            return True
+        except subprocess.CalledProcessError as e:
+            m["error"] = (e.stderr or e.stdout).decode("utf-8")
+            print(f"Git推送失败：{m['error']}")
+            return False
+
+
+# 等待合并提交的文件、漫画数和对应的阶段日志键
+_git_pending = {"paths": set(), "comics": 0, "since": None, "keys": [], "retry_at": 0}
+
+
+def queue_git_push(paths, comic_count=1, journal_keys=()):
+    """
+    把产出的文件加入待提交队列，达到 GIT_COALESCE_COMICS 个漫画或 GIT_COALESCE_SECONDS 秒时提交推送
+    :param journal_keys: 推送成功后在阶段日志里标记 git 完成的任务键
+    """
+    _git_pending["paths"].update(paths)
+    _git_pending["comics"] += comic_count
+    _git_pending["keys"].extend(journal_keys)
+    if _git_pending["since"] is None:
+        _git_pending["since"] = time.time()
+    flush_git_push(force=False)
 
 
-def git_push():
-    """Git推送"""
+def flush_git_push(force=True):
+    """
+    提交推送队列里的文件
+    :param force: True 时不管阈值直接提交（运行结束、退出监听时调用）
+    """
+    if not _git_pending["comics"]:
+        return
+    due = (_git_pending["comics"] >= GIT_COALESCE_COMICS
+           or (GIT_COALESCE_SECONDS and time.time() - _git_pending["since"] >= GIT_COALESCE_SECONDS))
+    if not (force or (due and time.time() >= _git_pending["retry_at"])):
+        return
+    if git_push(_git_pending["paths"], _git_pending["comics"]):
+        stage_journal.mark_keys(_git_pending["keys"], "git")
+    elif not GIT_DRY_RUN:
+        # 失败的文件留在队列里，和后续产出一起重试（dry-run 只打印一次，也不记为完成）
+        _git_pending["retry_at"] = time.time() + GIT_RETRY_SECONDS
+        return
+    _git_pending.update(paths=set(), comics=0, since=None, keys=[], retry_at=0)
+
+
+def allocate_comic_ids(count):
+    """一次性预留 count 个连续的漫画序号"""
+    with metrics.stage("allocate_ids", count=count):
+        return [str(n).zfill(3) for n in index_journal.allocate_ids(count)]
+
+
+def parse_batch_line(line, line_no):
+    """解析 JSONL 清单的一行：images 为单个字符串时当作只有一张图"""
     try:
-        os.chdir(PROJECT_ROOT)
-        subprocess.run(["git", "add", "."], check=True, capture_output=True)
-        subprocess.run(["git", "commit", "-m", f"新增漫画 {time.strftime('%Y%m%d_%H%M%S')}"], check=True,
-                       capture_output=True)
-        subprocess.run(["git", "push", "origin", GIT_BRANCH], check=True, capture_output=True)
-        print("Git推送成功！")
-    except subprocess.CalledProcessError as e:
-        print(f"Git推送失败：{e.stderr.decode('utf-8')}")
+        row = json.loads(line)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"第 {line_no} 行不是合法的 JSON：{e}") from None
+    if not isinstance(row, dict):
+        raise ValueError(f"第 {line_no} 行应为对象（{{\"images\": [...], ...}}），实际是 {type(row).__name__}")
+    images = row.get("images", [])
+    if isinstance(images, str):
+        images = [images]
+    if not isinstance(images, list) or not all(isinstance(p, str) and p for p in images):
+        raise ValueError(f"第 {line_no} 行的 images 应为图片路径列表：{images!r}")
+    row["images"] = images
+    return row
 
 
-def main():
-    """主流程（支持模板调用和多格式图片，包括GIF）"""
-    # 1. 初始化目录
+def load_batch(batch_path):
+    """
+    读取批量任务，支持三种形式：
+    - *.jsonl：每行一个漫画，{"images": [...], "title": ..., "category": ..., ...}（只有一张图时 images 也可以写成字符串）
+    - *.csv：表头含 images 列（多张图用 | 分隔），其余列作为元数据
+    - 目录：每个子目录是一个漫画，内含 raw_comic* 图片和可选的 comic_meta.json
+    清单里的相对图片路径以清单所在目录为基准。
+    :return: [{"images": [绝对路径...], "meta": 元数据字典}, ...]
+    :raises ValueError: 清单某一行格式不对（信息里带行号），此时一个漫画都不发布
+    """
+    jobs = []
+    if os.path.isdir(batch_path):
+        for name in sorted(os.listdir(batch_path)):
+            comic_dir = os.path.join(batch_path, name)
+            if name.startswith(".") or not os.path.isdir(comic_dir):
+                continue
+            meta = None
+            meta_file = os.path.join(comic_dir, "comic_meta.json")
+            if os.path.exists(meta_file):
+                with open(meta_file, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+            jobs.append({"images": find_images(comic_dir), "meta": meta})
+        return jobs
+
+    base_dir = os.path.dirname(os.path.abspath(batch_path))
+    ext = os.path.splitext(batch_path)[1].lower()
+    with open(batch_path, "r", encoding="utf-8-sig", newline="") as f:
+        if ext == ".csv":
+            rows = list(csv.DictReader(f))
+            for row in rows:
+                row["images"] = [p.strip() for p in (row.get("images") or "").split(BATCH_IMAGE_SEPARATOR) if p.strip()]
+        else:
+            rows = [parse_batch_line(line, line_no) for line_no, line in enumerate(f, 1) if line.strip()]
+
+    for row in rows:
+        images = [os.path.join(base_dir, p) for p in row.pop("images", [])]
+        # CSV 空单元格视为未填写，交给模板补全
+        meta = {k: v for k, v in row.items() if v not in (None, "")}
+        jobs.append({"images": images, "meta": meta or None})
+    return jobs
+
+
+def publish_comic(comic_id_num, meta_data, img_paths, thumbs=None):
+    """
+    为已压缩好图片的漫画生成详情页，不写索引、不推送
+    :return: 索引记录字典
+    """
+    comic_id = f"comic-{comic_id_num}"
+    with metrics.stage("metadata", comic=comic_id):
+        title, topic, category, sub_topic, funny_example = resolve_comic_meta(comic_id_num, meta_data)
+
+    html_path = f"comics/{comic_id}.html"
+    with metrics.stage("html", comic=comic_id) as m:
+        generate_comic_html(comic_id, title, topic, category, sub_topic, funny_example, img_paths)
+        m["bytes_out"] = metrics.file_size(os.path.join(PROJECT_ROOT, html_path))
+
+    return build_comic_entry(comic_id, title, topic, category, sub_topic, funny_example,
+                             img_paths[0], html_path, len(img_paths), thumbs, img_paths, find_gif_poster(img_paths[0]))
+
+
+def get_entry_images(entry):
+    """索引记录对应的全部图片；老记录没有 imgs 字段时按 img_count 从 img/ 里找回"""
+    if entry.get("imgs"):
+        return entry["imgs"]
+    img_paths = [entry["img"]]
+    for idx in range(2, entry.get("img_count", 1) + 1):
+        # 只匹配 comic-XXX-N.ext，排除 comic-XXX-N-320w.webp 这类缩略图
+        matches = [p for p in glob.glob(os.path.join(IMG_DIR, f"{entry['id']}-{idx}.*"))
+                   if os.path.splitext(os.path.basename(p))[0] == f"{entry['id']}-{idx}"]
+        if matches:
+            img_paths.append(f"img/{os.path.basename(sorted(matches)[0])}")
+    return img_paths
+
+
+def page_fingerprint(entry):
+    """详情页输入指纹：模板版本 + 模板内容 + 页面用到的字段 + 图片列表（含 GIF 是否有动画 WebP）"""
+    imgs = get_entry_images(entry)
+    payload = {
+        "template_version": TEMPLATE_VERSION,
+        "template": hashlib.sha256(COMIC_PAGE_TEMPLATE.template.encode("utf-8")).hexdigest(),
+        "counter_url": COUNTER_URL,
+        "fields": [entry["id"], entry["title"], entry.get("topic"), entry.get("category"),
+                   entry.get("sub_topic"), entry.get("funny_example")],
+        "imgs": imgs,
+        # 有 WebP 时页面用 <picture> 输出，WebP 后来生成或被删除都要重写
+        "webp": [os.path.exists(os.path.join(PROJECT_ROOT, webp_sibling(p))) for p in imgs if p.lower().endswith(".gif")],
+    }
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def render_entry_page(entry):
+    """按索引记录重新生成详情页（rebuild 的进程池任务）"""
+    try:
+        generate_comic_html(entry["id"], entry["title"], entry.get("topic", ""),
+                            entry.get("category", DEFAULT_CATEGORY), entry.get("sub_topic", ""),
+                            entry.get("funny_example", ""), get_entry_images(entry))
+        return True
+    except Exception as e:
+        print(f"详情页生成失败：{entry['id']}（{e}）")
+        return False
+
+
+def rebuild_pages(force=False):
+    """
+    按索引重新生成详情页：只重写输入指纹变了（或页面文件缺失）的页面，并行渲染
+    :param force: 忽略指纹，全部重写
+    """
+    init_dirs()
+    fingerprints = {}
+    if not force and os.path.exists(HTML_FINGERPRINT_FILE):
+        with open(HTML_FINGERPRINT_FILE, "r", encoding="utf-8") as f:
+            fingerprints = json.load(f)
+
+    stale, fresh = [], {}
+    for entry in index_journal.read_entries():
+        fp = page_fingerprint(entry)
+        html_file = os.path.join(COMIC_HTML_DIR, f"{entry['id']}.html")
+        if fingerprints.get(entry["id"]) == fp and os.path.exists(html_file):
+            fresh[entry["id"]] = fp
+        else:
+            stale.append((entry, fp))
+
+    print(f"详情页共 {len(fresh) + len(stale)} 个，需要重新生成 {len(stale)} 个")
+    results = map_in_pool(render_entry_page, [entry for entry, _ in stale]) if stale else []
+    for (entry, fp), ok in zip(stale, results):
+        if ok:
+            fresh[entry["id"]] = fp
+
+    os.makedirs(os.path.dirname(HTML_FINGERPRINT_FILE), exist_ok=True)
+    with open(HTML_FINGERPRINT_FILE, "w", encoding="utf-8") as f:
+        json.dump(fresh, f)
+    print(f"\n✅ 详情页重建完成：重写 {sum(results)} 个，跳过 {len(fresh) - sum(results)} 个")
+
+
+def scan_watch_units():
+    """
+    扫描 AI_COMIC_DIR 中待处理的漫画：每个子目录是一个漫画，顶层散落的 raw_comic* 合起来是一个漫画
+    :return: {单元路径: {"images": [...], "meta_file": ..., "move": [要移走的路径...], "signature": ...}}
+    """
+    units = {}
+    if not os.path.isdir(AI_COMIC_DIR):
+        return units
+
+    def add_unit(key, images, meta_file, move):
+        files = images + ([meta_file] if os.path.exists(meta_file) else [])
+        # 文件列表 + 大小 + 修改时间，任何变化都说明还在写入
+        signature = tuple((p, os.path.getsize(p), os.path.getmtime(p)) for p in files)
+        units[key] = {"images": images, "meta_file": meta_file, "move": move, "signature": signature}
+
+    top_images = find_images(AI_COMIC_DIR)
+    if top_images:
+        meta_file = os.path.join(AI_COMIC_DIR, "comic_meta.json")
+        move = top_images + ([meta_file] if os.path.exists(meta_file) else [])
+        add_unit(AI_COMIC_DIR, top_images, meta_file, move)
+
+    for name in sorted(os.listdir(AI_COMIC_DIR)):
+        comic_dir = os.path.join(AI_COMIC_DIR, name)
+        # 隐藏目录是生成器还没写完的临时目录（写完整体改名）
+        if name == DONE_DIR_NAME or name.startswith(".") or not os.path.isdir(comic_dir):
+            continue
+        images = find_images(comic_dir)
+        if images:
+            add_unit(comic_dir, images, os.path.join(comic_dir, "comic_meta.json"), [comic_dir])
+    return units
+
+
+def read_meta_file(meta_file):
+    """读取 comic_meta.json，不存在或损坏时返回 None（交给模板兜底）"""
+    if not os.path.exists(meta_file):
+        return None
+    try:
+        with open(meta_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"读取自定义JSON失败，使用模板：{e}")
+        return None
+
+
+def move_to_done(unit, comic_id):
+    """把已发布漫画的源文件移到 done/<comic_id>/，之后不会再被处理"""
+    done_dir = os.path.join(AI_COMIC_DIR, DONE_DIR_NAME, comic_id)
+    os.makedirs(done_dir, exist_ok=True)
+    for path in unit["move"]:
+        shutil.move(path, os.path.join(done_dir, os.path.basename(path)))
+
+
+def open_watcher():
+    """有 inotify_simple 时监听 AI_COMIC_DIR，否则返回 None 走轮询"""
+    if INotify is None:
+        print(f"未安装 inotify_simple，使用轮询（每 {WATCH_POLL_INTERVAL}s）")
+        return None
+    try:
+        watcher = INotify()
+        watcher.watched = {}  # 路径 → watch descriptor
+        return watcher
+    except OSError as e:
+        print(f"inotify 不可用，使用轮询：{e}")
+        return None
+
+
+def wait_for_changes(watcher, units, pending):
+    """等待目录变化：inotify 下无待定漫画时一直阻塞到有事件，否则最多等一个轮询间隔"""
+    if watcher is None:
+        time.sleep(WATCH_POLL_INTERVAL)
+        return
+
+    mask = (inotify_flags.CREATE | inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_TO
+            | inotify_flags.DELETE | inotify_flags.MOVED_FROM)
+    paths = [AI_COMIC_DIR] + [key for key in units if key != AI_COMIC_DIR]
+    # 已移到 done/ 的子目录不再监听，之后同名目录重新出现时会重新加上
+    for path in [p for p in watcher.watched if p not in paths]:
+        try:
+            watcher.rm_watch(watcher.watched.pop(path))
+        except OSError:
+            pass
+    missed = False
+    for path in paths:
+        if path not in watcher.watched:
+            try:
+                watcher.watched[path] = watcher.add_watch(path, mask)
+            except OSError:
+                # 子目录在扫描之后刚好被移走/删除（或超出 inotify 监听数上限）：跳过，下一轮再加
+                missed = True
+    # 有目录没监听上时不能无限阻塞，最多等一个轮询间隔
+    timeout = WATCH_POLL_INTERVAL * 1000 if pending or missed else None
+    watcher.read(timeout=timeout, read_delay=100)
+
+
+def _raise_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def watch():
+    """
+    监听模式（常驻）：AI_COMIC_DIR 中出现新漫画且文件稳定 WATCH_DEBOUNCE_SECONDS 秒后自动发布，
+    处理完的源文件移到 done/，模块加载、模板库等启动开销只付一次
+    """
+    init_dirs()
+    os.makedirs(os.path.join(AI_COMIC_DIR, DONE_DIR_NAME), exist_ok=True)
+    watcher = open_watcher()
+    # systemd / docker stop 发的是 SIGTERM：同样走 finally，把攒着的文件提交推送后再退出
+    signal.signal(signal.SIGTERM, _raise_interrupt)
+    print(f"👀 开始监听：{AI_COMIC_DIR}（Ctrl+C 退出）")
+
+    # 单元路径 → (签名, 签名首次出现的时间)；失败的单元记下签名，文件有变化再重试
+    seen, failed = {}, {}
+    units = {}
+    try:
+        while True:
+            wait_for_changes(watcher, units, pending=bool(seen) or bool(_git_pending["comics"]))
+            flush_git_push(force=False)
+            units = scan_watch_units()
+            now = time.time()
+
+            ready = []
+            for key, unit in units.items():
+                if failed.get(key) == unit["signature"]:
+                    continue
+                prev = seen.get(key)
+                if not prev or prev[0] != unit["signature"]:
+                    seen[key] = (unit["signature"], now)
+                elif now - prev[1] >= WATCH_DEBOUNCE_SECONDS:
+                    ready.append((key, unit))
+            seen = {key: value for key, value in seen.items() if key in units}
+
+            if not ready:
+                continue
+            jobs = [{"images": unit["images"], "meta": read_meta_file(unit["meta_file"])} for _, unit in ready]
+            try:
+                entries = publish_jobs(jobs)
+            except Exception as e:
+                print(f"❌ 发布失败，文件有变化后重试：{e}")
+                failed.update({key: unit["signature"] for key, unit in ready})
+                continue
+            for (key, unit), entry in zip(ready, entries):
+                if not entry:
+                    # 近似重复被拒绝或超出内存上限被推迟：源文件留在原处，有改动后再重新检查
+                    failed[key] = unit["signature"]
+                    continue
+                move_to_done(unit, entry["id"])
+                seen.pop(key, None)
+            metrics.write_prometheus()
+    except KeyboardInterrupt:
+        print("\n监听已停止")
+    finally:
+        flush_git_push()
+
+
+def init_dirs():
+    """初始化输出目录"""
     for dir in [IMG_DIR, COMIC_HTML_DIR]:
         if not os.path.exists(dir):
             os.makedirs(dir)
             print(f"创建目录：{dir}")
 
-    # 2. 获取漫画ID
-    comic_id_num = get_next_comic_id()
-    comic_id = f"comic-{comic_id_num}"
-    print(f"开始生成漫画：{comic_id}")
 
-    # 3. 获取元数据（优先自定义JSON，其次模板）
-    meta_file = os.path.join(AI_COMIC_DIR, "comic_meta.json")
-    title, topic, category, sub_topic, funny_example = get_comic_meta(comic_id_num, meta_file)
-    print(f"元数据：\n- 标题：{title}\n- 主分类：{category}\n- 子主题：{sub_topic}\n- 笑点：{funny_example}")
+def main_batch(batch_path):
+    """批量模式：一次分配全部ID，逐个生成，最后只写一次索引、只提交一次"""
+    try:
+        jobs = [job for job in load_batch(batch_path) if job["images"]]
+    except ValueError as e:
+        print(f"❌ 批量清单有误（{batch_path}）：{e}")
+        return
+    if not jobs:
+        print(f"⚠️ 批量任务中没有可用的图片：{batch_path}")
+        return
+    publish_jobs(jobs)
+
+
+def publish_jobs(jobs):
+    """
+    发布一批漫画：一次分配全部ID，整批压缩，最后只写一次索引、只提交一次
+    每个漫画按阶段记入阶段日志：中断后用同样的源图重跑会沿用原来的ID，从第一个未完成的阶段继续，
+    已全部完成的直接跳过
+    :param jobs: [{"images": [路径或图片字节...], "meta": 元数据字典或None}, ...]
+    :return: 索引记录列表（与 jobs 一一对应；按 DUPLICATE_POLICY 拒绝发布的、超出内存上限推迟的为 None）
+    """
+    init_dirs()
+    journal = stage_journal.StageJournal()
+    records = [journal.get_or_create(job) for job in jobs]
+
+    # 同一批里源图和元数据完全相同的任务对应同一条阶段记录，只发布一次
+    unique = list({rec["key"]: (job, rec) for job, rec in zip(jobs, records)}.values())
+    if len(unique) < len(jobs):
+        print(f"⚠️ 批量任务中有 {len(jobs) - len(unique)} 个与前面的任务完全相同，只发布一次")
+    pending = [(job, rec) for job, rec in unique if not journal.is_complete(rec)]
+    if len(pending) < len(unique):
+        print(f"已发布过的漫画 {len(unique) - len(pending)} 个，跳过")
+
+    # 1. 新漫画发布前查重（续跑的漫画上次已经查过）
+    rejected = set()
+    fresh = [(job, rec) for job, rec in pending if not rec["comic_id"]]
+    if DUPLICATE_POLICY != "off" and fresh:
+        duplicates = check_near_duplicates(fresh)
+        if duplicates and DUPLICATE_POLICY == "reject":
+            rejected = duplicates
+            for key in rejected:
+                journal.forget(key)
+            pending = [(job, rec) for job, rec in pending if rec["key"] not in rejected]
+            print(f"❌ 拒绝发布近似重复的漫画 {len(rejected)} 个")
+
+    # 2. 分配ID（续跑的漫画沿用上次分配的ID），立即落盘，之后崩溃也不会重复分配
+    fresh = [rec for _, rec in pending if not rec["comic_id"]]
+    if fresh:
+        for rec, n in zip(fresh, allocate_comic_ids(len(fresh))):
+            rec["comic_id"] = f"comic-{n}"
+        journal.save()
+    if pending:
+        resumed = len(pending) - len(fresh)
+        print(f"批量生成 {len(pending)} 个漫画：{pending[0][1]['comic_id']} ~ {pending[-1][1]['comic_id']}"
+              + (f"（其中 {resumed} 个从上次中断处继续）" if resumed else ""))
+
+    # 3. 压缩：整批图片放进同一个进程池，避免每个漫画单独起一次进程池
+    # 有图片超出内存上限的漫画本次不发布，压缩阶段不记完成，留在阶段日志里下次运行重新压缩
+    todo = [(job, rec) for job, rec in pending if not journal.stage_done(rec, "compress")]
+    plans = [plan_comic_images(rec["comic_id"], job["images"]) for job, rec in todo]
+    outputs = iter(compress_images([item for plan in plans for item in plan]) if plans else [])
+    deferred = set()
+    for (job, rec), plan in zip(todo, plans):
+        paths = [next(outputs) for _ in plan]
+        if None in paths:
+            deferred.add(rec["key"])
+            continue
+        img_paths = to_img_paths(paths)
+        journal.mark(rec, "compress", comic_image_outputs(img_paths), data=img_paths)
+    journal.save()
+    if deferred:
+        pending = [(job, rec) for job, rec in pending if rec["key"] not in deferred]
+        print(f"⚠️ {len(deferred)} 个漫画的图片超出内存上限（--max-rss），本次不发布，下次运行重试"
+              "（可加 --low-memory 或调高上限）")
+
+    # 4. 缩略图：每个漫画的封面图出一套，同样走进程池
+    todo = [rec for _, rec in pending if not journal.stage_done(rec, "thumbnails")]
+    if todo:
+        with metrics.stage("thumbnails", count=len(todo)):
+            all_thumbs = map_in_pool(generate_thumbnails, [journal.data(rec, "compress")[0] for rec in todo])
+        for rec, thumbs in zip(todo, all_thumbs):
+            journal.mark(rec, "thumbnails", [t["src"] for t in thumbs], data=thumbs)
+        journal.save()
+
+    # 5. 详情页
+    for job, rec in pending:
+        if not journal.stage_done(rec, "html"):
+            entry = publish_comic(rec["comic_id"].split("-")[-1], job["meta"], journal.data(rec, "compress"),
+                                  journal.data(rec, "thumbnails"))
+            journal.mark(rec, "html", [entry["html"]], data=entry)
+    journal.save()
+
+    # 6. 索引：只写一次
+    todo = [rec for _, rec in pending if not journal.stage_done(rec, "index")]
+    if todo:
+        append_comic_entries([journal.data(rec, "html") for rec in todo])
+        for rec in todo:
+            journal.mark(rec, "index")
+        journal.save()
+        compact_comic_index()
+
+    # 7. Git：推送成功后才在阶段日志里记为完成
+    if pending:
+        entries = [journal.data(rec, "html") for _, rec in pending]
+        queue_git_push([p for entry in entries for p in comic_output_paths(entry)] + index_output_paths(),
+                       len(entries), [rec["key"] for _, rec in pending])
+        print(f"\n✅ 批量生成完成：共 {len(entries)} 个漫画")
+    return [None if rec["key"] in rejected | deferred else journal.data(rec, "html") for rec in records]
+
+
+def check_near_duplicates(items):
+    """
+    发布前查重：源图与 img/ 已有图片（以及同批排在前面的漫画）的 dHash 距离不超过阈值即视为近似重复
+    :param items: [(job, 阶段日志记录), ...]
+    :return: 近似重复的任务键集合
+    """
+    duplicates = set()
+    with metrics.stage("near_duplicates", count=len(items)) as m:
+        tree = perceptual_hash.load_tree(IMG_DIR)
+        m["catalog"] = len(tree)
+        for n, (job, rec) in enumerate(items, 1):
+            hashes = [perceptual_hash.image_hash(src) for src in job["images"]]
+            matches = []
+            for idx, value in enumerate(hashes, 1):
+                if value is not None:
+                    matches.extend(f"第{idx}张 ≈ {name}（距离 {dist}）" for dist, name in tree.search(value))
+            if matches:
+                duplicates.add(rec["key"])
+                print(f"⚠️ 本批第 {n} 个漫画与已有图片近似重复：" + "、".join(matches))
+            for idx, value in enumerate(hashes, 1):
+                if value is not None:
+                    tree.add(value, f"本批第 {n} 个漫画第{idx}张")
+        m["duplicates"] = len(duplicates)
+    return duplicates
+
+
+def comic_image_outputs(img_paths):
+    """压缩阶段的产出文件（含 GIF 的动画 WebP 和静态海报）"""
+    outputs = []
+    for img_path in img_paths:
+        outputs.append(img_path)
+        if img_path.lower().endswith(".gif"):
+            outputs.extend(p for p in (webp_sibling(img_path), gif_poster(img_path))
+                           if os.path.exists(os.path.join(PROJECT_ROOT, p)))
+    return outputs
 
-    # 4. 处理图片（支持多格式，包括GIF）
+
+def main():
+    """主流程（支持模板调用和多格式图片，包括GIF）：AI_COMIC_DIR 下的图片发布为一个漫画，中断后重跑从断点继续"""
+    # 1. 处理图片（支持多格式，包括GIF）
     img_files = get_image_files()
     if not img_files:
         print("⚠️ 未找到AI生成的图片！")
         return
 
-    img_paths = []
-    for idx, img in enumerate(img_files, 1):
-        # 获取原始文件扩展名
-        _, ext = os.path.splitext(img)
-        # 保留原始格式（.png, .jpg, .gif等）
-        img_name = f"{comic_id}-{idx}{ext}"
-        img_dst = os.path.join(IMG_DIR, img_name)
-        compress_image(img, img_dst)
-        img_paths.append(f"img/{img_name}")
+    # 2. 元数据（优先自定义JSON，其次模板），发布流程与批量模式共用
+    meta_file = os.path.join(AI_COMIC_DIR, "comic_meta.json")
+    entry = publish_jobs([{"images": img_files, "meta": read_meta_file(meta_file)}])[0]
+    if not entry:
+        return
 
-    # 5. 生成详情页
-    html_path = f"comics/{comic_id}.html"
-    generate_comic_html(comic_id, title, topic, category, sub_topic, funny_example, img_paths)
+    print(f"\n✅ 漫画 {entry['id']} 生成完成！")
+    print(f"- 标题：{entry['title']}（{entry['category']} / {entry['sub_topic']}）")
+    print(f"- 图片数量：{entry['img_count']}张（包含GIF动图）")
+    print(f"- 预览地址：index.html（首页）")
+    print(f"- 详情地址：{entry['html']}")
+
+
+def cleanup(abandon=False, list_only=False):
+    """
+    清理孤儿文件：img/ 和 comics/ 下既不属于索引中任何漫画、也不属于未完成（可续跑）漫画的文件
+    :param abandon: 同时放弃未完成的漫画，它们的产出也一并清理
+    :param list_only: 只列出不删除
+    """
+    if abandon and not list_only:
+        print(f"已放弃未完成的漫画：{stage_journal.drop_incomplete()} 个")
 
-    # 6. 更新索引（包含图片数量信息）
-    update_comic_index(comic_id, title, topic, category, sub_topic, funny_example,
-                       img_paths[0], html_path, len(img_paths))
+    keep = set()
+    for entry in index_journal.read_entries():
+        keep.update(comic_output_paths(entry))
+    if not abandon:
+        for rec in stage_journal.StageJournal().incomplete():
+            for done in rec["stages"].values():
+                keep.update(done["outputs"])
 
-    # 7. 推送Git
-    git_push()
+    orphans = []
+    for folder in (IMG_DIR, COMIC_HTML_DIR):
+        if not os.path.isdir(folder):
+            continue
+        for name in sorted(os.listdir(folder)):
+            rel_path = os.path.relpath(os.path.join(folder, name), PROJECT_ROOT).replace(os.sep, "/")
+            if os.path.isfile(os.path.join(folder, name)) and rel_path not in keep:
+                orphans.append(rel_path)
 
-    print(f"\n✅ 漫画 {comic_id} 生成完成！")
-    print(f"- 图片数量：{len(img_paths)}张（包含GIF动图）")
-    print(f"- 预览地址：index.html（首页）")
-    print(f"- 详情地址：{html_path}")
+    freed = sum(os.path.getsize(os.path.join(PROJECT_ROOT, p)) for p in orphans)
+    for rel_path in orphans:
+        print(f"{'孤儿文件' if list_only else '删除孤儿文件'}：{rel_path}")
+        if not list_only:
+            os.remove(os.path.join(PROJECT_ROOT, rel_path))
+    print(f"✅ 清理完成：{'发现' if list_only else '删除'} {len(orphans)} 个孤儿文件（{freed / 1024:.0f}KB）")
+    return orphans
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="笑点制造机：AI 漫画自动发布")
+    parser.add_argument("--gif-webp", action="store_true", help="GIF 额外输出动画 WebP")
+    parser.add_argument("--no-cache", action="store_true", help="不使用压缩缓存，全部重新编码")
+    parser.add_argument("--workers", type=int, default=COMPRESS_WORKERS,
+                        help=f"图片压缩进程数（默认 {COMPRESS_WORKERS}，1 表示串行）")
+    parser.add_argument("--coalesce", type=int, default=GIT_COALESCE_COMICS,
+                        help="攒够 N 个漫画再提交推送一次（主要用于 watch）")
+    parser.add_argument("--coalesce-seconds", type=float, default=GIT_COALESCE_SECONDS,
+                        help="距上次提交超过 T 秒也提交一次（0 表示不按时间）")
+    parser.add_argument("--no-push", action="store_true", help="只在本地提交，不推送")
+    parser.add_argument("--dry-run", action="store_true", help="不执行 git，只打印将要提交的文件")
+    parser.add_argument("--low-memory", action="store_true",
+                        help="内存受限模式：大图先缩小再转换，GIF 逐帧减色（适合内存较小的容器）")
+    parser.add_argument("--max-dimension", type=int, default=MAX_SOURCE_DIMENSION,
+                        help=f"内存受限模式下静态图的最长边上限（默认 {MAX_SOURCE_DIMENSION}）")
+    parser.add_argument("--max-rss", type=int, default=RSS_CEILING_MB,
+                        help="每个进程的常驻内存上限（MB），预计超过时不解码，该漫画推迟到下次运行")
+    parser.add_argument("--dup-policy", choices=["flag", "reject", "off"], default=DUPLICATE_POLICY,
+                        help="发布前近似重复检查：flag 只提示，reject 拒绝发布，off 不检查")
+    parser.add_argument("--dup-distance", type=int, default=perceptual_hash.MAX_DISTANCE,
+                        help="近似重复的 dHash 汉明距离阈值（64 位）")
+    parser.add_argument("--no-metrics", action="store_true", help="不记录阶段耗时指标")
+    parser.add_argument("--prom-textfile", default=metrics.PROMETHEUS_TEXTFILE,
+                        help="额外写出 Prometheus 指标文件（node exporter textfile collector 目录下的 .prom）")
+    subparsers = parser.add_subparsers(dest="command")
+
+    batch_parser = subparsers.add_parser("batch", help="批量模式：按清单（JSONL/CSV）或子目录一次生成多个漫画")
+    batch_parser.add_argument("source", help="清单文件（.jsonl/.csv）或包含每个漫画子目录的目录")
+
+    rebuild_parser = subparsers.add_parser("rebuild", help="按索引增量重建全部详情页（模板或数据变化的页面才重写）")
+    rebuild_parser.add_argument("--force", action="store_true", help="忽略指纹，全部重写")
+
+    subparsers.add_parser("watch", help="常驻监听 AI_COMIC_DIR，新漫画写完后自动发布并把源文件移到 done/")
+
+    cleanup_parser = subparsers.add_parser("cleanup", help="删除 img/、comics/ 下不属于任何漫画的孤儿文件")
+    cleanup_parser.add_argument("--list", action="store_true", help="只列出，不删除")
+    cleanup_parser.add_argument("--abandon", action="store_true", help="放弃未完成（可续跑）的漫画并清理其产出")
+
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    args = parse_args()
+    COMPRESS_WORKERS = max(1, args.workers)
+    COMPRESS_CACHE_ENABLED = not args.no_cache
+    GIF_EMIT_WEBP = GIF_EMIT_WEBP or args.gif_webp
+    MEMORY_BOUNDED = MEMORY_BOUNDED or args.low_memory
+    MAX_SOURCE_DIMENSION = max(1, args.max_dimension)
+    RSS_CEILING_MB = args.max_rss
+    GIT_COALESCE_COMICS = max(1, args.coalesce)
+    GIT_COALESCE_SECONDS = args.coalesce_seconds
+    GIT_PUSH_ENABLED = GIT_PUSH_ENABLED and not args.no_push
+    GIT_DRY_RUN = GIT_DRY_RUN or args.dry_run
+    DUPLICATE_POLICY = args.dup_policy
+    perceptual_hash.MAX_DISTANCE = args.dup_distance
+    metrics.METRICS_ENABLED = not args.no_metrics
+    metrics.PROMETHEUS_TEXTFILE = args.prom_textfile
+    if args.command == "batch":
+        main_batch(args.source)
+    elif args.command == "rebuild":
+        rebuild_pages(args.force)
+    elif args.command == "watch":
+        watch()
+    elif args.command == "cleanup":
+        cleanup(args.abandon, args.list)
+    else:
+        main()
+    flush_git_push()
+    if metrics.METRICS_ENABLED and args.command not in ("rebuild", "cleanup"):
+        print(f"\n阶段耗时（指标：{metrics.METRICS_FILE}）：\n{metrics.summary()}")
+        metrics.write_prometheus()
@@ -0,0 +1,308 @@
+"""
+生产流水线基准测试：在临时目录里生成合成数据（上万条索引 + PNG/JPEG/GIF 源图），
+分别计时压缩、ID 分配、索引追加、build_index、详情页生成，结果写入 JSON 方便在不同提交之间对比。
+
+用法：
+    python benchmark.py                       # 默认 10000 条索引、48 张源图
+    python benchmark.py --records 2000 --images 12
+    python benchmark.py --compare bench_results/上一次.json
+"""
+import os
+import io
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import platform
+import subprocess
+import contextlib
+
+try:
+    import resource  # Windows 没有，峰值内存记为 None
+except ImportError:
+    resource = None
+
+from PIL import Image, ImageDraw
+
+# ===================== 配置项 =====================
+PRODUCER_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(PRODUCER_DIR, "bench_results")
+CATEGORIES = ["生活日常", "职场打工", "校园", "趣味脑洞", "节日季节"]
+
+
+# ===================== 工具函数 =====================
+def run_peak_rss_mb():
+    """
+    整次运行的峰值常驻内存（MB）：当前进程和已结束子进程各自的历史最大值
+    getrusage 不能清零，只能整次运行报告一次（按阶段报告的是下面的 stage_peak_rss_mb）
+    """
+    if not resource:
+        return None
+    # Linux 单位是 KB，macOS 是字节
+    unit = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / unit, 1),
+        "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / unit, 1),
+    }
+
+
+def reset_stage_peak_rss():
+    """把本进程的 VmHWM 重置为当前值（Linux 4.0+，写 /proc/self/clear_refs，和 metrics.reset_peak_rss 相同）"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def stage_peak_rss_mb():
+    """本进程自上次 reset_stage_peak_rss 以来的峰值常驻内存（MB，读 VmHWM），非 Linux 返回 None"""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def dir_bytes(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total
+
+
+def git_revision():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PRODUCER_DIR,
+                             check=True, capture_output=True)
+        return out.stdout.decode("utf-8").strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@contextlib.contextmanager
+def quiet():
+    """屏蔽被测函数的进度输出，避免打印本身影响计时"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def timed(results, name, func, items=1, bytes_in=None, output_dir=None):
+    """
+    运行 func 并记录耗时、吞吐、峰值内存和输出字节数
+    峰值内存只统计本阶段、只统计本进程（进程池子进程的峰值见报告里整次运行的 peak_rss_mb.children）；
+    不能清零峰值的平台不按阶段记录
+    """
+    before = dir_bytes(output_dir) if output_dir else 0
+    reset = reset_stage_peak_rss()
+    start = time.perf_counter()
+    with quiet():
+        value = func()
+    seconds = time.perf_counter() - start
+
+    record = {
+        "seconds": round(seconds, 4),
+        "items": items,
+        "items_per_sec": round(items / seconds, 2) if seconds else None,
+        "peak_rss_mb": stage_peak_rss_mb() if reset else None,
+    }
+    if bytes_in is not None:
+        record["bytes_in"] = bytes_in
+    if output_dir:
+        record["bytes_out"] = dir_bytes(output_dir) - before
+    results[name] = record
+    print(f"- {name}: {seconds:.3f}s（{items} 项，{record['items_per_sec']}/s）")
+    return value
+
+
+# ===================== 合成数据 =====================
+def synth_frame(width, height, seed):
+    """接近 AI 漫画的画面：渐变背景 + 色块 + 少量噪点（纯噪点会让压缩结果失真）"""
+    rnd = random.Random(seed)
+    base = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    img = Image.blend(base, Image.new("RGB", (width, height), tuple(rnd.randrange(256) for _ in range(3))), 0.6)
+    draw = ImageDraw.Draw(img)
+    for _ in range(12):
+        x, y = rnd.randrange(width), rnd.randrange(height)
+        r = rnd.randrange(20, max(21, width // 4))
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=tuple(rnd.randrange(256) for _ in range(3)))
+    noise = Image.effect_noise((width, height), 12).convert("RGB")
+    return Image.blend(img, noise, 0.08)
+
+
+def make_sources(src_dir, count):
+    """按 PNG / JPEG / GIF 轮流生成源图，尺寸接近真实生成结果"""
+    paths = []
+    for i in range(count):
+        kind = ("png", "jpg", "gif")[i % 3]
+        path = os.path.join(src_dir, f"raw_comic{i:04d}.{kind}")
+        if kind == "png":
+            synth_frame(1024, 1024, i).save(path, "PNG")
+        elif kind == "jpg":
+            synth_frame(1600, 1200, i).save(path, "JPEG", quality=95)
+        else:
+            frames = [synth_frame(480, 480, i * 100 + f) for f in range(24)]
+            frames[0].save(path, "GIF", save_all=True, append_images=frames[1:], duration=40, loop=0)
+        paths.append(path)
+    return paths
+
+
+def make_records(count):
+    records = []
+    for n in range(1, count + 1):
+        comic_id = f"comic-{n:03d}"
+        records.append({
+            "id": comic_id,
+            "title": f"合成漫画{n}",
+            "topic": "基准·测试·合成数据",
+            "category": CATEGORIES[n % len(CATEGORIES)],
+            "sub_topic": "合成子主题",
+            "funny_example": f"第{n}个合成笑点，用来撑大索引体积",
+            "img": f"img/{comic_id}-1.png",
+            "html": f"comics/{comic_id}.html",
+            "img_count": 1,
+            "imgs": [f"img/{comic_id}-1.png"],
+            "has_gif": False,
+            "thumbs": [],
+            "create_time": "2026-01-01 00:00:00",
+        })
+    return records
+
+
+# ===================== 主流程 =====================
+def run_benchmark(args):
+    work_dir = tempfile.mkdtemp(prefix="comic-bench-")
+    # 必须在导入流水线模块之前设置，进程池子进程也会继承
+    os.environ["COMIC_PROJECT_ROOT"] = work_dir
+    sys.path.insert(0, PRODUCER_DIR)
+    import auto_generate_comic as agc
+    import build_index
+    import index_journal
+    import precompress
+
+    results = {}
+    try:
+        src_dir = os.path.join(work_dir, "sources")
+        for path in [src_dir, agc.IMG_DIR, agc.COMIC_HTML_DIR]:
+            os.makedirs(path, exist_ok=True)
+
+        print(f"生成合成数据：{args.records} 条索引，{args.images} 张源图（{work_dir}）")
+        sources = make_sources(src_dir, args.images)
+        source_bytes = sum(os.path.getsize(p) for p in sources)
+        records = make_records(args.records)
+        with quiet():
+            index_journal.ensure_journal()
+            index_journal.append_entries(records)
+
+        agc.COMPRESS_WORKERS = args.workers
+
+        # 1. 图片压缩：串行（不走缓存）、进程池冷缓存、缓存命中
+        agc.COMPRESS_CACHE_ENABLED = False
+        serial_dir = os.path.join(work_dir, "serial")
+        os.makedirs(serial_dir)
+        timed(results, "compress_image_serial",
+              lambda: [agc.compress_image(p, os.path.join(serial_dir, os.path.basename(p))) for p in sources],
+              items=len(sources), bytes_in=source_bytes, output_dir=serial_dir)
+
+        agc.COMPRESS_CACHE_ENABLED = True
+        jobs = agc.plan_comic_images("comic-bench", sources)
+        timed(results, "compress_images_pool_cold", lambda: agc.compress_images(jobs, args.workers),
+              items=len(sources), bytes_in=source_bytes, output_dir=agc.IMG_DIR)
+        timed(results, "compress_images_cached", lambda: agc.compress_images(jobs, args.workers),
+              items=len(sources), bytes_in=source_bytes)
+
+        # 2. 索引：ID 分配、追加、压实
+        timed(results, "get_next_comic_id", lambda: [agc.get_next_comic_id() for _ in range(args.ops)],
+              items=args.ops)
+        entry = dict(records[-1])
+
+        def append_many():
+            for n in range(args.ops):
+                entry["id"] = f"comic-{args.records + n + 1:03d}"
+                agc.update_comic_index(entry["id"], entry["title"], entry["topic"], entry["category"],
+                                       entry["sub_topic"], entry["funny_example"], entry["img"],
+                                       entry["html"], entry["img_count"])
+        timed(results, "update_comic_index", append_many, items=args.ops)
+        timed(results, "compact_comic_index", lambda: agc.compact_comic_index(force=True),
+              items=args.records + args.ops)
+
+        # 3. 前端索引（含分页分片和预压缩）
+        total = args.records + args.ops
+        timed(results, "build_index", build_index.build_index, items=total, output_dir=build_index.OUTPUT_DIR)
+        timed(results, "precompress", lambda: precompress.precompress_dir(build_index.OUTPUT_DIR),
+              items=total, output_dir=build_index.OUTPUT_DIR)
+
+        # 4. 详情页：单页生成 + 全量重建 + 无变化时的增量重建
+        sample = records[:args.pages]
+        timed(results, "generate_comic_html",
+              lambda: [agc.generate_comic_html(r["id"], r["title"], r["topic"], r["category"],
+                                               r["sub_topic"], r["funny_example"], r["imgs"]) for r in sample],
+              items=len(sample), output_dir=agc.COMIC_HTML_DIR)
+        timed(results, "rebuild_full", lambda: agc.rebuild_pages(force=True), items=total,
+              output_dir=agc.COMIC_HTML_DIR)
+        timed(results, "rebuild_noop", agc.rebuild_pages, items=total)
+    finally:
+        if args.keep:
+            print(f"保留临时目录：{work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "revision": git_revision(),
+        "time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "params": {"records": args.records, "images": args.images, "ops": args.ops,
+                   "pages": args.pages, "workers": args.workers},
+        "peak_rss_mb": run_peak_rss_mb(),
+        "results": results,
+    }
+
+
+def compare(report, baseline_path):
+    """和之前的结果逐项对比耗时（>1 表示变慢）"""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\n对比 {baseline_path}（{baseline.get('revision')} → {report.get('revision')}）：")
+    for name, record in report["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if old and old["seconds"]:
+            ratio = record["seconds"] / old["seconds"]
+            flag = "⚠️" if ratio > 1.1 else ""
+            print(f"- {name}: {old['seconds']:.3f}s → {record['seconds']:.3f}s（×{ratio:.2f}）{flag}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="生产流水线基准测试")
+    parser.add_argument("--records", type=int, default=10000, help="合成索引条数")
+    parser.add_argument("--images", type=int, default=48, help="合成源图数量（PNG/JPEG/GIF 各占三分之一）")
+    parser.add_argument("--ops", type=int, default=200, help="ID 分配 / 索引追加的次数")
+    parser.add_argument("--pages", type=int, default=500, help="单独计时生成的详情页数量")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="压缩和重建的进程数")
+    parser.add_argument("--output", help="结果 JSON 路径（默认 bench_results/bench-时间-提交.json）")
+    parser.add_argument("--compare", help="与之前的结果 JSON 对比")
+    parser.add_argument("--keep", action="store_true", help="保留临时目录便于检查输出")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = run_benchmark(args)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"bench-{time.strftime('%Y%m%d_%H%M%S')}-{report['revision'] or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ 基准测试结果已写入：{output}")
+
+    if args.compare:
+        compare(report, args.compare)
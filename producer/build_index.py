@@ -1,12 +1,80 @@
 import json
 import os
+import glob
+import time
+import hashlib
+import index_journal
+import precompress
+import search_index
+from site_config import PROJECT_ROOT, OUTPUT_DIR
 
-PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
-OUTPUT_DIR = os.path.join(PROJECT_ROOT, "output")
 SOURCE_INDEX = os.path.join(PROJECT_ROOT, "comic-index.json")
 TARGET_INDEX = os.path.join(OUTPUT_DIR, "comic-index.json")
+# 分页索引：manifest.json + 按页/按分类切好的小文件，首屏只需 manifest 和第 1 页
+SHARD_DIR = os.path.join(OUTPUT_DIR, "index")
+PAGE_SIZE = 24
+
+
+def category_key(category):
+    """分类的稳定文件名（中文分类名做哈希，新增分类不影响已有分类的文件名）"""
+    return "cat-" + hashlib.md5(category.encode("utf-8")).hexdigest()[:8]
+
+
+def write_json(path, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+
+
+def write_pages(prefix, comics):
+    """把列表切成固定大小的页：{prefix}-1.json, {prefix}-2.json ...，返回页数"""
+    pages = max(1, (len(comics) + PAGE_SIZE - 1) // PAGE_SIZE)
+    for page in range(1, pages + 1):
+        write_json(os.path.join(SHARD_DIR, f"{prefix}-{page}.json"), {
+            "page": page,
+            "pages": pages,
+            "comics": comics[(page - 1) * PAGE_SIZE:page * PAGE_SIZE]
+        })
+    return pages
+
+
+def build_shards(comics):
+    """生成分页索引（最新在前）和按分类的分页索引，并附上各分类数量"""
+    os.makedirs(SHARD_DIR, exist_ok=True)
+    # 清掉上次生成的分片，避免漫画删除或分类变化后残留旧页
+    for old_file in glob.glob(os.path.join(SHARD_DIR, "*.json")):
+        os.remove(old_file)
+
+    newest_first = comics[::-1]
+    by_category = {}
+    for c in newest_first:
+        by_category.setdefault(c["category"], []).append(c)
+
+    categories = []
+    for category, items in sorted(by_category.items(), key=lambda kv: -len(kv[1])):
+        key = category_key(category)
+        categories.append({
+            "name": category,
+            "key": key,
+            "count": len(items),
+            "pages": write_pages(key, items)
+        })
+
+    manifest = {
+        "total": len(comics),
+        "page_size": PAGE_SIZE,
+        "pages": write_pages("page", newest_first),
+        "categories": categories,
+        "generated": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+    }
+    write_json(os.path.join(SHARD_DIR, "manifest.json"), manifest)
+    print(f"✅ 分页索引已生成：{manifest['pages']} 页，{len(categories)} 个分类")
+
 
 def build_index():
+    # 有索引日志时先压实，保证快照是最新的
+    if os.path.exists(index_journal.JOURNAL_PATH):
+        index_journal.compact()
+
     if not os.path.exists(SOURCE_INDEX):
         raise RuntimeError("comic-index.json 不存在，请先生成漫画")
 
@@ -21,9 +89,13 @@ def build_index():
             {
                 "id": c["id"],
                 "title": c["title"],
-                "category": c["category"],
+                "category": c.get("category", "未分类"),
                 "topic": c["topic"],
                 "img": c["img"],
+                # 列表页用的多宽度缩略图（srcset），老数据没有时前端退回 img
+                "thumbs": c.get("thumbs", []),
+                # GIF 的静态海报：列表页默认显示静态图，卡片可见或悬停时才加载 img 动图
+                "poster": c.get("poster"),
                 "html": c["html"],
                 "create_time": c["create_time"]
             }
@@ -36,5 +108,10 @@ def build_index():
 
     print("✅ 前端 comic-index.json 已生成")
 
+    build_shards(frontend_data["comics"])
+    # 搜索要用到笑点、子主题等字段，直接用完整记录建索引
+    search_index.build_search_index(data.get("comics", []))
+
 if __name__ == "__main__":
     build_index()
+    precompress.precompress_dir(OUTPUT_DIR)
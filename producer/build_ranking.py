@@ -0,0 +1,117 @@
+import os
+import json
+import time
+import argparse
+import urllib.request
+
+import index_journal
+from site_config import OUTPUT_DIR, COUNTER_URL
+
+# ===================== 配置项 =====================
+# 排行快照：rank.html 只需这一个小文件，不用再下载完整索引在前端拼接
+RANK_FILE = os.path.join(OUTPUT_DIR, "rank.json")
+# 全站和每个分类各保留的条数
+RANK_TOP_N = 20
+# 排行榜缩略图显示宽度很小，每种格式只保留最窄的一档
+RANK_THUMB_WIDTH = 320
+# 向统计服务要的热门条数：分类榜是从这份全站名单里筛出来的（统计服务不知道分类），
+# 名单被截断时冷门分类可能凑不满；自建 counter_server.py 默认最多给 1000 条
+RANK_FETCH_LIMIT = 1000
+FETCH_TIMEOUT = 10
+
+
+def fetch_top(url=COUNTER_URL, limit=RANK_FETCH_LIMIT):
+    """
+    从统计服务拉取热门列表
+    :return: [{"id": ..., "views": n}, ...]（兼容 {"success", "data"} 和裸数组两种返回）
+    """
+    with urllib.request.urlopen(f"{url}/top?limit={limit}", timeout=FETCH_TIMEOUT) as response:
+        data = json.loads(response.read().decode("utf-8"))
+    top = normalize_top(data)
+    # 拿满了请求的条数说明名单被截断：更冷门的漫画不在里面，分类榜可能凑不满
+    if len(top) >= limit:
+        print(f"⚠️ 统计服务返回了 {len(top)} 条热门（已达上限），部分分类榜可能不满 {RANK_TOP_N} 条，"
+              f"可调大 --fetch-limit")
+    return top
+
+
+def normalize_top(data):
+    items = data.get("data", []) if isinstance(data, dict) else data
+    return [{"id": item["id"], "views": item.get("views", item.get("pv", 0))} for item in items]
+
+
+def compact_thumbs(thumbs):
+    """每种格式只留一档：不小于 RANK_THUMB_WIDTH 的最窄一张，没有则用最宽的"""
+    by_type = {}
+    for thumb in thumbs or []:
+        by_type.setdefault(thumb["type"], []).append(thumb)
+    picked = []
+    for items in by_type.values():
+        items.sort(key=lambda t: t["width"])
+        picked.append(next((t for t in items if t["width"] >= RANK_THUMB_WIDTH), items[-1]))
+    return picked
+
+
+def build_ranking(top, limit=RANK_TOP_N):
+    """
+    把热门列表和索引拼好，写出 rank.json：
+    {"generated": ..., "all": [...], "categories": {分类: [...]}}，每条已含标题、缩略图、分类、子主题、是否 GIF
+    """
+    entries = {entry["id"]: entry for entry in index_journal.read_entries()}
+
+    ranked = []
+    for item in sorted(top, key=lambda t: -t["views"]):
+        entry = entries.get(item["id"])
+        # 已删除或不在索引里的漫画不上榜
+        if not entry:
+            continue
+        ranked.append({
+            "id": entry["id"],
+            "title": entry["title"],
+            "category": entry.get("category", "未分类"),
+            "sub_topic": entry.get("sub_topic", ""),
+            "has_gif": entry.get("has_gif", False),
+            "img": entry["img"],
+            "thumbs": compact_thumbs(entry.get("thumbs")),
+            "poster": entry.get("poster"),
+            "html": entry["html"],
+            "views": item["views"]
+        })
+
+    categories = {}
+    for item in ranked:
+        items = categories.setdefault(item["category"], [])
+        if len(items) < limit:
+            items.append(item)
+
+    rank = {
+        "generated": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
+        "all": ranked[:limit],
+        "categories": categories
+    }
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    tmp_path = RANK_FILE + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(rank, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, RANK_FILE)
+    print(f"✅ 排行快照已生成：{RANK_FILE}（全站 {len(rank['all'])} 条，{len(categories)} 个分类）")
+    return rank
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="生成排行榜快照 rank.json（热门列表 + 漫画信息预先拼好）")
+    parser.add_argument("--counter-url", default=COUNTER_URL, help="统计服务地址")
+    parser.add_argument("--fetch-limit", type=int, default=RANK_FETCH_LIMIT, help="向统计服务请求的热门条数")
+    parser.add_argument("--top-file", help="不请求统计服务，直接读取保存好的 /top 返回（JSON）")
+    parser.add_argument("--limit", type=int, default=RANK_TOP_N, help="全站和每个分类保留的条数")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.top_file:
+        with open(args.top_file, "r", encoding="utf-8") as f:
+            top = normalize_top(json.load(f))
+    else:
+        top = fetch_top(args.counter_url, args.fetch_limit)
+    build_ranking(top, args.limit)
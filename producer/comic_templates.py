@@ -1,136 +1,146 @@
 # comic_templates.py
-# 四格漫画主题模板库（完整复用你提供的内容）
-COMIC_TEMPLATES = {
-    # 1. 生活日常类
-    "生活日常": {
-        "居家日常": {
-            "sub_topic": "亲子搞笑互动",
-            "funny_example": "妈妈让孩子洗碗，孩子用洗碗机 “偷懒”，最后妈妈哭笑不得",
-            "default_title": "偷懒的洗碗方式",
-            "default_topic": "居家·亲子·搞笑偷懒"
-        },
-        "宠物趣事": {
-            "sub_topic": "猫狗的奇葩行为",
-            "funny_example": "猫咪偷喝主人的奶茶，被抓包后装无辜，最后打翻杯子",
-            "default_title": "偷喝奶茶的猫咪",
-            "default_topic": "宠物·搞笑·拆家日常"
-        },
-        "合租生活": {
-            "sub_topic": "室友的神操作",
-            "funny_example": "室友囤零食藏在衣柜，被发现后借口 “防过期”",
-            "default_title": "藏零食的室友",
-            "default_topic": "合租·搞笑·零食大战"
-        },
-        "外卖/做饭": {
-            "sub_topic": "厨房翻车现场",
-            "funny_example": "学做网红菜，结果把锅烧糊，最后点外卖收尾",
-            "default_title": "翻车的网红菜",
-            "default_topic": "做饭·翻车·外卖救星"
-        }
-    },
-    # 2. 职场打工人类
-    "职场打工": {
-        "摸鱼翻车": {
-            "sub_topic": "假装工作实际摸鱼",
-            "funny_example": "上班刷短视频，老板突然走到身后，秒切工作页面却切错成购物页",
-            "default_title": "摸鱼翻车现场",
-            "default_topic": "职场·摸鱼·社死瞬间"
-        },
-        "会议吐槽": {
-            "sub_topic": "无效会议名场面",
-            "funny_example": "会议开 1 小时没结论，最后老板说 “散会，下次再聊”",
-            "default_title": "无效会议天花板",
-            "default_topic": "职场·会议·无效沟通"
-        },
-        "需求改改改": {
-            "sub_topic": "产品/客户改需求",
-            "funny_example": "客户说 “就改一点点”，结果改了 10 版又回到第一版",
-            "default_title": "改到崩溃的需求",
-            "default_topic": "职场·需求·反复横跳"
-        },
-        "加班日常": {
-            "sub_topic": "花式摸鱼加班",
-            "funny_example": "加班时假装敲代码，实际在写小说，被同事拆穿",
-            "default_title": "加班摸鱼写小说",
-            "default_topic": "职场·加班·摸鱼技巧"
-        }
-    },
-    # 3. 校园类
-    "校园": {
-        "中学趣味": {
-            "sub_topic": "课间小游戏翻车",
-            "funny_example": "玩 “石头剪刀布” 输了，被罚表演，结果紧张忘词",
-            "default_title": "表演翻车的课间游戏",
-            "default_topic": "校园·小学·课间趣事"
-        },
-        "高中日常": {
-            "sub_topic": "晚自习摸鱼",
-            "funny_example": "晚自习偷偷看漫画，被老师发现，谎称 “在看作文素材”",
-            "default_title": "晚自习偷看漫画",
-            "default_topic": "校园·高中·晚自习摸鱼"
-        },
-        "大学摆烂": {
-            "sub_topic": "早八逃课/食堂踩雷",
-            "funny_example": "为了早八课定 3 个闹钟，最后还是睡过头，谎称 “堵车”",
-            "default_title": "早八课的摆烂日常",
-            "default_topic": "校园·大学·早八逃课"
-        },
-        "师生互动": {
-            "sub_topic": "老师的神回复",
-            "funny_example": "学生问 “作业能不交吗”，老师答 “可以，我也能不批改”",
-            "default_title": "老师的神级回复",
-            "default_topic": "校园·师生·搞笑互动"
-        }
-    },
-    # 4. 趣味脑洞类
-    "趣味脑洞": {
-        "谐音梗笑话": {
-            "sub_topic": "汉字/词语谐音",
-            "funny_example": "问：什么门永远关不上？答：球门（配四格反转画面）",
-            "default_title": "永远关不上的门",
-            "default_topic": "脑洞·谐音梗·趣味问答"
-        },
-        "动物拟人": {
-            "sub_topic": "小动物的职场/校园",
-            "funny_example": "熊猫上班摸鱼吃竹子，被 “老板”（饲养员）抓包",
-            "default_title": "摸鱼的熊猫打工人",
-            "default_topic": "脑洞·动物·职场拟人"
-        },
-        "反套路鸡汤": {
-            "sub_topic": "毒鸡汤反转",
-            "funny_example": "第一格：“努力就会成功”，最后一格：“努力不一定成功，但不努力真的很舒服”",
-            "default_title": "反套路毒鸡汤",
-            "default_topic": "脑洞·鸡汤·反套路"
-        },
-        "星座趣味": {
-            "sub_topic": "星座性格反差",
-            "funny_example": "处女座整理桌面，结果越整理越乱，最后摆烂",
-            "default_title": "摆烂的处女座",
-            "default_topic": "脑洞·星座·性格反差"
-        }
-    },
-    # 5. 节日/季节类
-    "节日季节": {
-        "节日吐槽": {
-            "sub_topic": "春节催婚/中秋吃月饼",
-            "funny_example": "春节被亲戚催婚，谎称 “已经有对象了”，结果被拆穿",
-            "default_title": "春节催婚翻车记",
-            "default_topic": "节日·春节·催婚吐槽"
-        },
-        "季节趣事": {
-            "sub_topic": "夏天怕热/冬天赖床",
-            "funny_example": "夏天开空调盖被子，被妈妈吐槽 “浪费电”",
-            "default_title": "夏天的迷惑行为",
-            "default_topic": "季节·夏天·怕热日常"
-        },
-        "假期摆烂": {
-            "sub_topic": "放假计划vs实际",
-            "funny_example": "放假前计划 “学习/旅游”，实际躺平刷手机 7 天",
-            "default_title": "假期摆烂天花板",
-            "default_topic": "节日·假期·摆烂日常"
-        }
-    }
-}
+# 四格漫画主题模板库：模板数据放在 templates/ 下的 JSON/YAML 文件里，这里负责加载、校验、建索引
+import os
+import json
+import pickle
+from types import MappingProxyType
+
+from site_config import cache_path
+
+try:
+    import yaml  # 可选依赖：pip install pyyaml，没有时只读取 .json
+except ImportError:
+    yaml = None
+
+# ===================== 配置项 =====================
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+# 编译结果缓存：模板文件的 路径+修改时间+大小 都没变时直接读缓存，跳过解析和校验
+TEMPLATE_CACHE_FILE = cache_path("templates.pickle")
+# 编译格式变化时递增，旧缓存自动失效
+TEMPLATE_CACHE_VERSION = 1
+TEMPLATE_FIELDS = ("sub_topic", "funny_example", "default_title", "default_topic")
+
+
+# ===================== 加载与编译 =====================
+def list_template_files(template_dir=TEMPLATE_DIR):
+    """模板目录下的全部数据文件（按文件名排序，后面的文件可覆盖前面的同名模板）"""
+    if not os.path.isdir(template_dir):
+        return []
+    extensions = (".json", ".yaml", ".yml") if yaml else (".json",)
+    return sorted(os.path.join(template_dir, name) for name in os.listdir(template_dir)
+                  if name.lower().endswith(extensions))
+
+
+def read_template_file(path):
+    """
+    读取单个模板文件
+    :return: 模板字典列表，每个含 category / sub_category / 模板字段 / 可选 tags
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        if path.lower().endswith(".json"):
+            data = json.load(f)
+        else:
+            data = yaml.safe_load(f)
+    return (data or {}).get("templates", [])
+
+
+def compile_templates(files):
+    """
+    解析并校验模板文件，生成普通字典结构（可直接 pickle）
+    :return: {"templates": {分类: {子分类: 模板}}, "tags": {标签: [(分类, 子分类), ...]}}
+    """
+    templates, tags = {}, {}
+    for path in files:
+        for item in read_template_file(path):
+            missing = [k for k in ("category", "sub_category") + TEMPLATE_FIELDS if not item.get(k)]
+            if missing:
+                print(f"⚠️ 模板缺少字段 {missing}，已跳过：{os.path.basename(path)} {item}")
+                continue
+
+            category, sub_category = item["category"], item["sub_category"]
+            if sub_category in templates.get(category, {}):
+                print(f"⚠️ 模板重复，以后出现的为准：{category}/{sub_category}（{os.path.basename(path)}）")
+            # 没写 tags 时用 default_topic 的 “·” 分段当标签
+            item_tags = item.get("tags") or item["default_topic"].split("·")
+            template = {k: item[k] for k in TEMPLATE_FIELDS}
+            template["tags"] = [t for t in item_tags if t]
+            templates.setdefault(category, {})[sub_category] = template
+
+    for category, subs in templates.items():
+        for sub_category, template in subs.items():
+            for tag in template["tags"]:
+                tags.setdefault(tag, []).append((category, sub_category))
+    return {"templates": templates, "tags": tags}
+
+
+def template_sources(files):
+    """缓存键：每个模板文件的路径、修改时间、大小"""
+    return [(path, os.stat(path).st_mtime_ns, os.stat(path).st_size) for path in files]
+
+
+def load_compiled(template_dir=TEMPLATE_DIR, use_cache=True):
+    """读取编译结果：源文件没变就用磁盘缓存，否则重新编译并写回缓存"""
+    files = list_template_files(template_dir)
+    key = [TEMPLATE_CACHE_VERSION, template_sources(files)]
+
+    if use_cache and os.path.exists(TEMPLATE_CACHE_FILE):
+        try:
+            with open(TEMPLATE_CACHE_FILE, "rb") as f:
+                cached = pickle.load(f)
+            if cached["key"] == key:
+                return cached["compiled"]
+        except Exception as e:
+            print(f"⚠️ 模板缓存读取失败，重新编译：{e}")
+
+    compiled = compile_templates(files)
+    if use_cache:
+        try:
+            os.makedirs(os.path.dirname(TEMPLATE_CACHE_FILE), exist_ok=True)
+            tmp_path = TEMPLATE_CACHE_FILE + ".tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump({"key": key, "compiled": compiled}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, TEMPLATE_CACHE_FILE)
+        except OSError as e:
+            print(f"⚠️ 模板缓存写入失败：{e}")
+    return compiled
+
+
+class TemplateRegistry:
+    """
+    只读模板注册表：模板、分类顺序、子分类、标签索引在加载时一次算好，
+    查询都是字典/集合查找，不会每次调用都重新构造列表
+    """
+
+    def __init__(self, compiled):
+        self.templates = MappingProxyType({
+            category: MappingProxyType({
+                sub_category: MappingProxyType({**template, "tags": tuple(template["tags"])})
+                for sub_category, template in subs.items()
+            })
+            for category, subs in compiled["templates"].items()
+        })
+        self.categories = tuple(self.templates)
+        self.category_set = frozenset(self.categories)
+        self.sub_categories = MappingProxyType({c: tuple(subs) for c, subs in self.templates.items()})
+        self.by_tag = MappingProxyType({tag: tuple(self.templates[c][s] for c, s in refs)
+                                        for tag, refs in compiled["tags"].items()})
+
+    def __len__(self):
+        return sum(len(subs) for subs in self.templates.values())
+
+
+REGISTRY = TemplateRegistry(load_compiled())
+# 兼容旧用法：{分类: {子分类: 模板}}，只读
+COMIC_TEMPLATES = REGISTRY.templates
+
+
+def reload_templates(template_dir=TEMPLATE_DIR):
+    """重新加载模板（修改模板文件后常驻进程里调用）"""
+    global REGISTRY, COMIC_TEMPLATES
+    REGISTRY = TemplateRegistry(load_compiled(template_dir))
+    COMIC_TEMPLATES = REGISTRY.templates
+    return REGISTRY
+
 
 # 获取模板的快捷函数
 def get_template(category, sub_category):
@@ -138,20 +148,35 @@ def get_template(category, sub_category):
     根据主分类+子分类获取模板信息
     :param category: 主分类（如"生活日常"）
     :param sub_category: 子分类（如"居家日常"）
-    :return: 模板字典（title/topic/sub_topic/funny_example）
+    :return: 只读模板（title/topic/sub_topic/funny_example/tags），不存在返回 None
     """
-    if category not in COMIC_TEMPLATES:
-        return None
-    if sub_category not in COMIC_TEMPLATES[category]:
-        return None
-    return COMIC_TEMPLATES[category][sub_category]
+    return REGISTRY.templates.get(category, {}).get(sub_category)
+
 
 # 获取所有主分类
 def get_all_categories():
-    return list(COMIC_TEMPLATES.keys())
+    return list(REGISTRY.categories)
+
+
+# 主分类是否存在（集合查找）
+def has_category(category):
+    return category in REGISTRY.category_set
+
 
 # 获取指定主分类下的所有子分类
 def get_sub_categories(category):
-    if category not in COMIC_TEMPLATES:
-        return []
-    return list(COMIC_TEMPLATES[category].keys())
\ No newline at end of file
+    return list(REGISTRY.sub_categories.get(category, ()))
+
+
+# 按标签（关键词）查模板
+def get_templates_by_tag(tag):
+    """
+    :param tag: 标签（如"摸鱼"）
+    :return: 带该标签的只读模板元组
+    """
+    return REGISTRY.by_tag.get(tag, ())
+
+
+# 获取所有标签
+def get_all_tags():
+    return list(REGISTRY.by_tag)
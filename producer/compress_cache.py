@@ -0,0 +1,182 @@
+import os
+import json
+import shutil
+import hashlib
+
+from file_lock import file_lock
+from site_config import cache_path
+
+# ===================== 配置项 =====================
+CACHE_DIR = cache_path("compress")
+# img/ 目录内容哈希表（用于输出去重），按 (大小, 修改时间) 增量刷新
+IMG_HASH_INDEX = cache_path("img-hashes.json")
+# 缓存总大小上限，超出后按最近使用时间淘汰
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+# 压缩逻辑有变化时递增，让旧缓存全部失效
+CACHE_VERSION = 1
+CHUNK_SIZE = 1024 * 1024
+
+
+# ===================== 缓存函数 =====================
+def file_digest(path):
+    """计算文件内容的 sha256"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def cache_key(source, settings):
+    """
+    缓存键 = 源文件内容哈希 + 编码参数
+    :param source: 源文件路径，或内存中的图片字节
+    :param settings: 影响输出的参数字典（质量、格式等）
+    """
+    digest = hashlib.sha256(source).hexdigest() if isinstance(source, bytes) else file_digest(source)
+    payload = json.dumps({"v": CACHE_VERSION, "src": digest, "settings": settings},
+                         sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _entry_path(key, output_path):
+    ext = os.path.splitext(output_path)[1].lower()
+    return os.path.join(CACHE_DIR, key[:2], key + ext)
+
+
+def _link_or_copy(src, dst):
+    """优先硬链接（不占额外空间），跨盘等失败时退回复制"""
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy(src, dst)
+
+
+def fetch(key, output_path):
+    """命中缓存则把缓存结果放到 output_path，返回是否命中"""
+    entry = _entry_path(key, output_path)
+    if not os.path.exists(entry):
+        return False
+    try:
+        _link_or_copy(entry, output_path)
+        # 刷新修改时间，作为 LRU 淘汰依据
+        os.utime(entry)
+    except FileNotFoundError:
+        # 并行的 producer 刚好把这个条目淘汰了，当作未命中
+        return False
+    return True
+
+
+def store(key, output_path):
+    """把压缩结果存入缓存（先写临时文件再重命名，多进程同时写也安全）"""
+    entry = _entry_path(key, output_path)
+    if os.path.exists(entry):
+        return
+    os.makedirs(os.path.dirname(entry), exist_ok=True)
+    tmp_path = f"{entry}.{os.getpid()}.tmp"
+    shutil.copy(output_path, tmp_path)
+    os.replace(tmp_path, entry)
+
+
+def evict(max_bytes=CACHE_MAX_BYTES):
+    """缓存超过上限时，从最久未使用的条目开始删除"""
+    if not os.path.isdir(CACHE_DIR):
+        return
+    entries = []
+    for root, _, files in os.walk(CACHE_DIR):
+        for name in files:
+            path = os.path.join(root, name)
+            st = os.stat(path)
+            entries.append((st.st_mtime, st.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    if total <= max_bytes:
+        return
+
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass  # 并行的 producer 已经删掉了
+        total -= size
+        removed += 1
+    print(f"压缩缓存淘汰 {removed} 个条目，当前 {total / 1024 / 1024:.1f}MB")
+
+
+# ===================== 输出去重 =====================
+def load_img_hashes(img_dir):
+    """读取并增量刷新 img/ 的内容哈希表：{文件名: [大小, 修改时间, sha256]}"""
+    hashes = {}
+    if os.path.exists(IMG_HASH_INDEX):
+        with open(IMG_HASH_INDEX, "r", encoding="utf-8") as f:
+            hashes = json.load(f)
+
+    fresh = {}
+    for name in os.listdir(img_dir) if os.path.isdir(img_dir) else []:
+        path = os.path.join(img_dir, name)
+        if not os.path.isfile(path):
+            continue
+        st = os.stat(path)
+        cached = hashes.get(name)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime:
+            fresh[name] = cached
+        else:
+            fresh[name] = [st.st_size, st.st_mtime, file_digest(path)]
+    return fresh
+
+
+def save_img_hashes(hashes):
+    os.makedirs(os.path.dirname(IMG_HASH_INDEX), exist_ok=True)
+    tmp_path = f"{IMG_HASH_INDEX}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(hashes, f)
+    os.replace(tmp_path, IMG_HASH_INDEX)
+
+
+def dedupe_outputs(output_paths, img_dir, derived=None):
+    """
+    输出去重：新生成的图片如果和 img/ 里已有文件内容完全一致，
+    删除新文件并改为引用已有文件
+    :param derived: 可选函数，输出路径 → 随它一起生成的派生文件（GIF 的动画 WebP、海报等）；
+                    新文件被去重删掉时派生文件一并删除，改用已有文件自己的
+    :return: 去重后的输出路径列表（顺序不变）
+    """
+    # 加锁：两个 producer 同时生成相同图片时，不能各自删掉自己的、去引用对方的
+    with file_lock("img-hashes"):
+        return _dedupe_outputs(output_paths, img_dir, derived)
+
+
+def _dedupe_outputs(output_paths, img_dir, derived=None):
+    new_names = {os.path.basename(path) for path in output_paths}
+    hashes = load_img_hashes(img_dir)
+
+    # 已有文件优先作为保留对象；本次新生成的文件之间按先后顺序保留第一个
+    by_digest = {}
+    for name, (_, _, digest) in hashes.items():
+        if name not in new_names:
+            by_digest.setdefault(digest, name)
+
+    results = []
+    for path in output_paths:
+        name = os.path.basename(path)
+        if name not in hashes:
+            results.append(path)
+            continue
+        digest = hashes[name][2]
+        kept = by_digest.setdefault(digest, name)
+        if kept != name:
+            os.remove(path)
+            for extra in (derived(path) if derived else ()):
+                if os.path.exists(extra):
+                    os.remove(extra)
+            del hashes[name]
+            print(f"图片与已有文件相同，复用：{name} → {kept}")
+        results.append(os.path.join(img_dir, kept))
+
+    save_img_hashes(hashes)
+    return results
@@ -0,0 +1,277 @@
+"""
+可自建的阅读量统计服务，接口与线上 Worker 一致：
+    /hit?id=comic-001   记一次阅读，返回 {"success": true, "data": {"id": ..., "views": n}}
+    /stat               全站 {"pv": 总阅读, "uv": 独立访客}；带 ?id= 时只查询该漫画阅读量（不计数）
+    /top?limit=20       热门排行 [{"id": ..., "views": n}, ...]（不带 limit 时返回前 DEFAULT_TOP_LIMIT 条）
+
+计数全部在内存里，每 FLUSH_INTERVAL 秒把有变化的数据整体写盘一次；热门排行用常驻的 Top-N 堆维护；
+独立访客用 HyperLogLog 估算（固定 4KB，误差约 1.6%），不保存访客列表。
+
+用法：
+    python counter_server.py --port 8787
+"""
+import os
+import json
+import math
+import heapq
+import signal
+import hashlib
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from site_config import PROJECT_ROOT
+
+# ===================== 配置项 =====================
+COUNTER_STATE_FILE = os.path.join(PROJECT_ROOT, "counter-state.json")
+HOST = "127.0.0.1"
+PORT = 8787
+# 批量写盘间隔（秒）：进程异常退出最多丢这么久的计数
+FLUSH_INTERVAL = 10
+# 排行榜保留的条数（/top 的 limit 上限）：build_ranking.py 按分类出榜要从这份名单里筛，留得多一些
+TOP_SIZE = 1000
+# /top 不带 limit 时返回的条数（页面上直接请求的热门列表）
+DEFAULT_TOP_LIMIT = 100
+# 漫画 ID 的最大长度，防止任意字符串撑爆内存
+MAX_ID_LENGTH = 64
+# HyperLogLog 的寄存器数 = 2^UV_PRECISION，标准误差约 1.04 / sqrt(寄存器数)
+UV_PRECISION = 12
+
+
+# ===================== 独立访客估算 =====================
+class VisitorEstimator:
+    """
+    HyperLogLog：访客键（64 位哈希）的前 UV_PRECISION 位选寄存器，寄存器记录剩余位里
+    第一个 1 出现的最大位置；内存和写盘大小固定，与访客数无关
+    """
+
+    def __init__(self, precision=UV_PRECISION, registers=None):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(registers) if registers else bytearray(self.size)
+
+    def add(self, visitor):
+        """:param visitor: 16 位十六进制的访客键"""
+        value = int(visitor, 16)
+        index = value >> (64 - self.precision)
+        rest = value & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self):
+        m = self.size
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        # 访客很少时用线性计数，小基数下更准
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return round(estimate)
+
+    def dump(self):
+        return self.registers.hex()
+
+    @classmethod
+    def from_hex(cls, data, precision=UV_PRECISION):
+        return cls(precision, bytes.fromhex(data))
+
+
+# ===================== 计数器 =====================
+class HitCounter:
+    """
+    内存计数器：阅读量、独立访客、Top-N 堆
+    阅读量只增不减，所以不在 Top-N 里的漫画只有超过堆里最小值时才可能进榜，
+    每次计数只需 O(log N) 的堆操作，/top 也不用对全部漫画排序
+    """
+
+    def __init__(self, top_size=TOP_SIZE):
+        self.lock = threading.Lock()
+        self.views = {}
+        self.visitors = VisitorEstimator()
+        self.pv = 0
+        self.top_size = top_size
+        self.top = {}        # 榜上漫画 → 当前阅读量
+        self.heap = []       # (阅读量, id)，旧值惰性删除
+        self.top_cache = None
+        self.dirty = False
+
+    def load(self, path):
+        if not os.path.exists(path):
+            return
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        self.views = state.get("views", {})
+        if "visitors_hll" in state:
+            self.visitors = VisitorEstimator.from_hex(state["visitors_hll"])
+        else:
+            # 旧格式保存的是完整访客列表：导入一次，之后只存寄存器
+            for visitor in state.get("visitors", []):
+                self.visitors.add(visitor)
+        self.pv = state.get("pv", sum(self.views.values()))
+        for comic_id, views in heapq.nlargest(self.top_size, self.views.items(), key=lambda kv: kv[1]):
+            self.top[comic_id] = views
+            self.heap.append((views, comic_id))
+        heapq.heapify(self.heap)
+        print(f"已加载统计数据：{len(self.views)} 个漫画，总阅读 {self.pv}")
+
+    def save(self, path):
+        """有变化时整体写盘（先写临时文件再替换，写到一半崩溃也不会损坏）"""
+        with self.lock:
+            if not self.dirty:
+                return False
+            state = {"pv": self.pv, "views": dict(self.views), "visitors_hll": self.visitors.dump()}
+            self.dirty = False
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+        return True
+
+    def _top_min(self):
+        """堆顶最小值（跳过已过期的旧值）"""
+        while self.heap and self.top.get(self.heap[0][1]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+        return self.heap[0] if self.heap else None
+
+    def _update_top(self, comic_id, views):
+        if comic_id not in self.top:
+            if len(self.top) >= self.top_size:
+                lowest = self._top_min()
+                if views <= lowest[0]:
+                    return
+                heapq.heappop(self.heap)
+                del self.top[lowest[1]]
+        self.top[comic_id] = views
+        heapq.heappush(self.heap, (views, comic_id))
+        # 旧值太多时重建一次，堆大小保持在 2 × TOP_SIZE 以内
+        if len(self.heap) > 2 * self.top_size:
+            self.heap = [(v, c) for c, v in self.top.items()]
+            heapq.heapify(self.heap)
+        self.top_cache = None
+
+    def hit(self, comic_id, visitor):
+        with self.lock:
+            views = self.views.get(comic_id, 0) + 1
+            self.views[comic_id] = views
+            self.pv += 1
+            self.visitors.add(visitor)
+            self._update_top(comic_id, views)
+            self.dirty = True
+            return views
+
+    def get_views(self, comic_id):
+        return self.views.get(comic_id, 0)
+
+    def stat(self):
+        with self.lock:
+            return {"pv": self.pv, "uv": self.visitors.count()}
+
+    def top_list(self, limit=None):
+        with self.lock:
+            # 榜单有变化才重新排序，且只排 top_size 条
+            if self.top_cache is None:
+                ranked = sorted(self.top.items(), key=lambda kv: (-kv[1], kv[0]))
+                self.top_cache = [{"id": c, "views": v, "pv": v} for c, v in ranked]
+            return self.top_cache[:limit or self.top_size]
+
+
+# ===================== HTTP 服务 =====================
+class CounterHandler(BaseHTTPRequestHandler):
+    counter = None
+
+    def send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def visitor_key(self):
+        """独立访客：IP + User-Agent 的哈希（不保存原始 IP）"""
+        ip = self.headers.get("X-Forwarded-For", self.client_address[0]).split(",")[0].strip()
+        raw = f"{ip}|{self.headers.get('User-Agent', '')}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        comic_id = query.get("id", [""])[0]
+
+        if url.path in ("/hit", "/stat") and comic_id and len(comic_id) > MAX_ID_LENGTH:
+            return self.send_json(400, {"success": False, "error": "id 过长"})
+
+        if url.path == "/hit":
+            if not comic_id:
+                return self.send_json(400, {"success": False, "error": "缺少 id"})
+            views = self.counter.hit(comic_id, self.visitor_key())
+            return self.send_json(200, {"success": True, "data": {"id": comic_id, "views": views}})
+        if url.path == "/stat":
+            if comic_id:
+                return self.send_json(200, {"success": True,
+                                            "data": {"id": comic_id, "views": self.counter.get_views(comic_id)}})
+            return self.send_json(200, {"success": True, "data": self.counter.stat()})
+        if url.path == "/top":
+            top_size = self.counter.top_size
+            try:
+                limit = max(1, min(int(query.get("limit", [DEFAULT_TOP_LIMIT])[0]), top_size))
+            except ValueError:
+                limit = min(DEFAULT_TOP_LIMIT, top_size)
+            return self.send_json(200, {"success": True, "data": self.counter.top_list(limit)})
+        self.send_json(404, {"success": False, "error": "not found"})
+
+    def log_message(self, format, *args):
+        # 每次阅读都打日志太吵，只保留错误
+        pass
+
+
+def flush_loop(counter, path, interval, stop_event):
+    """后台线程：定期批量写盘"""
+    while not stop_event.wait(interval):
+        try:
+            counter.save(path)
+        except OSError as e:
+            print(f"⚠️ 统计数据写盘失败：{e}")
+
+
+def serve(host=HOST, port=PORT, state_file=COUNTER_STATE_FILE, flush_interval=FLUSH_INTERVAL, top_size=TOP_SIZE):
+    counter = HitCounter(top_size)
+    counter.load(state_file)
+    CounterHandler.counter = counter
+
+    stop_event = threading.Event()
+    flusher = threading.Thread(target=flush_loop, args=(counter, state_file, flush_interval, stop_event),
+                               daemon=True)
+    flusher.start()
+
+    server = ThreadingHTTPServer((host, port), CounterHandler)
+    # SIGTERM 也走正常退出流程，保证最后一批计数写盘
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    print(f"✅ 统计服务已启动：http://{host}:{port}（每 {flush_interval}s 写盘）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_event.set()
+        server.server_close()
+        counter.save(state_file)
+        print("统计服务已停止，数据已写盘")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="自建阅读量统计服务（/hit、/stat、/top）")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--state", default=COUNTER_STATE_FILE, help="计数持久化文件")
+    parser.add_argument("--flush-interval", type=float, default=FLUSH_INTERVAL, help="写盘间隔（秒）")
+    parser.add_argument("--top-size", type=int, default=TOP_SIZE, help="排行榜保留条数")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    serve(args.host, args.port, args.state, args.flush_interval, args.top_size)
@@ -0,0 +1,71 @@
+import os
+import time
+import threading
+import contextlib
+
+try:
+    import fcntl  # Linux / macOS
+except ImportError:
+    fcntl = None
+    import msvcrt  # Windows
+
+from site_config import cache_path
+
+# ===================== 配置项 =====================
+LOCK_DIR = cache_path("locks")
+
+# 同一进程内按锁名可重入：{锁名: {"lock": RLock, "depth": 嵌套层数, "fd": 文件描述符}}
+_state = {}
+_state_guard = threading.Lock()
+
+
+def _acquire(fd):
+    if fcntl:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return
+    # msvcrt 锁的是字节区间（这里锁第 1 个字节）；LK_LOCK 最多等 10 秒就报错，所以循环重试
+    while True:
+        try:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            time.sleep(0.05)
+
+
+def _release(fd):
+    if fcntl:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+@contextlib.contextmanager
+def file_lock(name):
+    """
+    跨进程互斥锁（多个 producer 同时运行时保护共享文件），同一进程内可重入
+    :param name: 锁名，对应 LOCK_DIR/<name>.lock
+    """
+    with _state_guard:
+        state = _state.setdefault(name, {"lock": threading.RLock(), "depth": 0, "fd": None})
+
+    with state["lock"]:
+        if state["depth"] == 0:
+            os.makedirs(LOCK_DIR, exist_ok=True)
+            fd = os.open(os.path.join(LOCK_DIR, f"{name}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                _acquire(fd)
+            except BaseException:
+                os.close(fd)
+                raise
+            state["fd"] = fd
+        state["depth"] += 1
+        try:
+            yield
+        finally:
+            state["depth"] -= 1
+            if state["depth"] == 0:
+                _release(state["fd"])
+                os.close(state["fd"])
+                state["fd"] = None
@@ -0,0 +1,261 @@
+import os
+import json
+
+from file_lock import file_lock
+from site_config import PROJECT_ROOT, cache_path
+
+# ===================== 配置项 =====================
+# 索引日志：第 1 行是定长头部（记录已分配的最大序号），之后每行一条漫画记录，只追加不改写
+JOURNAL_PATH = os.path.join(PROJECT_ROOT, "comic-index.jsonl")
+# 给 build_index.py 和前端用的快照（由 compact() 生成）
+SNAPSHOT_PATH = os.path.join(PROJECT_ROOT, "comic-index.json")
+JOURNAL_VERSION = 1
+# 头部定长，这样更新 last_id 时只需原地覆盖第一行
+HEADER_SIZE = 64
+# 读写日志和快照都持有这把锁，多个 producer 进程可以同时运行
+LOCK_NAME = "comic-index"
+# 上次 compact() 写出的快照 (大小, 修改时间) 和当时的日志长度：快照与之不符说明被手动改过
+SNAPSHOT_STATE_PATH = cache_path("index-snapshot.json")
+# 日志自上次压实后新增超过这么多字节才重写快照（约 60 条记录）；快照全量重写，每次发布都重写会随索引变大越来越慢
+COMPACT_TAIL_BYTES = 64 * 1024
+
+
+# ===================== 工具函数 =====================
+def parse_id_num(comic_id):
+    """comic-012 → 12"""
+    return int(comic_id.split("-")[-1])
+
+
+def _encode_header(last_id):
+    header = json.dumps({"version": JOURNAL_VERSION, "last_id": last_id})
+    return (header.ljust(HEADER_SIZE - 1) + "\n").encode("utf-8")
+
+
+def _encode_entry(entry):
+    return (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def _tmp_path(path):
+    # 带进程号，多个进程同时写同一个文件时临时文件互不覆盖
+    return f"{path}.{os.getpid()}.tmp"
+
+
+def _snapshot_stat():
+    try:
+        st = os.stat(SNAPSHOT_PATH)
+    except FileNotFoundError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _load_snapshot_state():
+    if not os.path.exists(SNAPSHOT_STATE_PATH):
+        return None
+    with open(SNAPSHOT_STATE_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_snapshot_state():
+    """记录当前快照和日志的状态（调用方持有锁，且快照内容与日志一致）"""
+    os.makedirs(os.path.dirname(SNAPSHOT_STATE_PATH), exist_ok=True)
+    tmp_path = _tmp_path(SNAPSHOT_STATE_PATH)
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"snapshot": _snapshot_stat(), "journal_size": os.path.getsize(JOURNAL_PATH)}, f)
+    os.replace(tmp_path, SNAPSHOT_STATE_PATH)
+
+
+def _write_journal(last_id, comics):
+    tmp_path = _tmp_path(JOURNAL_PATH)
+    with open(tmp_path, "wb") as f:
+        f.write(_encode_header(last_id))
+        for comic in comics:
+            f.write(_encode_entry(comic))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, JOURNAL_PATH)
+
+
+def _read_snapshot():
+    with open(SNAPSHOT_PATH, "r", encoding="utf-8") as f:
+        return json.load(f).get("comics", [])
+
+
+# ===================== 日志读写 =====================
+def ensure_journal():
+    """日志不存在时初始化：已有 comic-index.json 则据此导入一次，否则创建空日志"""
+    if os.path.exists(JOURNAL_PATH):
+        _check_snapshot()
+        return
+
+    with file_lock(LOCK_NAME):
+        # 拿到锁后再看一次，别的进程可能刚初始化完
+        if os.path.exists(JOURNAL_PATH):
+            return
+
+        comics = _read_snapshot() if os.path.exists(SNAPSHOT_PATH) else []
+        _write_journal(max((parse_id_num(c["id"]) for c in comics), default=0), comics)
+        if comics:
+            _save_snapshot_state()
+        print(f"索引日志已初始化：{JOURNAL_PATH}（导入 {len(comics)} 条）")
+
+
+def _check_snapshot():
+    """
+    comic-index.json 在上次 compact() 之后被手动改过（修正标题、删掉某条等）时，
+    把它重新导入日志，否则下一次 compact() 会用日志内容把手动修改覆盖掉。
+    快照的 (大小, 修改时间) 与记录一致时只做一次 stat；不一致再比较内容，
+    git 检出、touch 这类内容没变的情况只更新记录。
+    """
+    current = _snapshot_stat()
+    if current is None:
+        return
+    state = _load_snapshot_state()
+    if state and state["snapshot"] == current:
+        return
+
+    with file_lock(LOCK_NAME):
+        state = _load_snapshot_state()
+        current = _snapshot_stat()
+        if current is None or (state and state["snapshot"] == current):
+            return
+        try:
+            snapshot = _read_snapshot()
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            print(f"⚠️ comic-index.json 无法解析，忽略手动修改（下次压实时会按日志重写）：{e}")
+            return
+        last_id, journal = _read_journal()
+        if snapshot == journal:
+            _save_snapshot_state()
+            return
+        if state is None:
+            # 没有记录（升级前生成的快照）：只有快照比日志新时才当作手动修改
+            if os.path.getmtime(SNAPSHOT_PATH) <= os.path.getmtime(JOURNAL_PATH):
+                return
+            tail = []
+        else:
+            # 上次压实之后其他进程追加、还没压实进快照的记录，合并时保留
+            _, tail = _read_journal(state["journal_size"])
+
+        merged = {comic["id"]: comic for comic in snapshot}
+        merged.update((comic["id"], comic) for comic in tail)
+        comics = list(merged.values())
+        last_id = max([last_id] + [parse_id_num(c["id"]) for c in comics])
+        _write_journal(last_id, comics)
+        _save_snapshot_state()
+        print("=" * 60)
+        print(f"⚠️ 检测到 comic-index.json 在上次生成后被手动修改，已把它重新导入索引日志，手动修改会保留"
+              f"（共 {len(comics)} 条，另合并了 {len(tail)} 条尚未写进快照的新记录）")
+        print("=" * 60)
+
+
+def read_last_id():
+    """读取已分配的最大序号（只读定长头部，与索引大小无关）"""
+    ensure_journal()
+    with file_lock(LOCK_NAME):
+        with open(JOURNAL_PATH, "rb") as f:
+            header = json.loads(f.read(HEADER_SIZE).decode("utf-8"))
+    return header["last_id"]
+
+
+def _write_last_id(last_id):
+    with open(JOURNAL_PATH, "r+b") as f:
+        f.write(_encode_header(last_id))
+
+
+def allocate_ids(count):
+    """
+    预留 count 个连续序号（只改写头部）；读和写在同一把锁里，并行的 producer 不会拿到相同的序号
+    :return: 序号整数列表
+    """
+    with file_lock(LOCK_NAME):
+        last_id = read_last_id()
+        _write_last_id(last_id + count)
+    return list(range(last_id + 1, last_id + count + 1))
+
+
+def append_entries(entries):
+    """追加漫画记录（每条一行），必要时把头部的 last_id 推进到最大记录序号"""
+    with file_lock(LOCK_NAME):
+        last_id = read_last_id()
+        with open(JOURNAL_PATH, "ab") as f:
+            # 上次追加到一半崩溃时最后一行不完整，另起一行，坏行由 read_entries 跳过
+            if f.tell() > HEADER_SIZE:
+                with open(JOURNAL_PATH, "rb") as tail:
+                    tail.seek(-1, os.SEEK_END)
+                    if tail.read(1) != b"\n":
+                        f.write(b"\n")
+            for entry in entries:
+                f.write(_encode_entry(entry))
+
+        max_id = max((parse_id_num(e["id"]) for e in entries), default=0)
+        if max_id > last_id:
+            _write_last_id(max_id)
+
+
+def _read_journal(offset=None):
+    """
+    读取日志（调用方持有锁）；同一 id 出现多次时以最后一次为准，顺序按首次出现
+    :param offset: 只读这个字节位置之后的记录（不在行首时返回空列表）
+    :return: (头部的 last_id, [记录...])
+    """
+    comics = {}
+    with open(JOURNAL_PATH, "rb") as f:
+        last_id = json.loads(f.read(HEADER_SIZE).decode("utf-8"))["last_id"]
+        if offset is not None:
+            if offset < HEADER_SIZE:
+                return last_id, []
+            f.seek(offset - 1)
+            if f.read(1) != b"\n":
+                return last_id, []
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                print(f"⚠️ 跳过不完整的索引记录（可能是写入时中断）：{line[:60].decode('utf-8', 'replace')!r}")
+                continue
+            comics[entry["id"]] = entry
+    return last_id, list(comics.values())
+
+
+def read_entries():
+    """读取全部记录；同一 id 出现多次时以最后一次为准，顺序按首次出现"""
+    ensure_journal()
+    with file_lock(LOCK_NAME):
+        return _read_journal()[1]
+
+
+def compact():
+    """
+    压实：把日志整理成带缩进的 comic-index.json 快照
+    先写临时文件再替换，写到一半崩溃也不会留下截断的快照；读日志和替换快照在同一把锁里，
+    并行的 producer 不会用旧快照覆盖新快照
+    """
+    with file_lock(LOCK_NAME):
+        comics = read_entries()
+        tmp_path = _tmp_path(SNAPSHOT_PATH)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"comics": comics}, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, SNAPSHOT_PATH)
+        _save_snapshot_state()
+    print(f"索引快照已生成：{SNAPSHOT_PATH}（共 {len(comics)} 条）")
+    return comics
+
+
+def compact_if_needed(min_tail_bytes=COMPACT_TAIL_BYTES):
+    """
+    日志自上次压实以来新增不到 min_tail_bytes 时不重写快照（build_index 仍然每次都压实）
+    没有快照、没有压实记录或日志被整体重写过时总是压实
+    :return: 压实后的记录列表，未压实返回 None
+    """
+    ensure_journal()
+    with file_lock(LOCK_NAME):
+        state = _load_snapshot_state()
+        if state and state["snapshot"] == _snapshot_stat():
+            tail = os.path.getsize(JOURNAL_PATH) - state["journal_size"]
+            if 0 <= tail < min_tail_bytes:
+                return None
+        return compact()
@@ -0,0 +1,177 @@
+import os
+import sys
+import json
+import time
+import contextlib
+
+try:
+    import resource
+except ImportError:
+    resource = None  # Windows
+
+from site_config import PROJECT_ROOT
+
+# ===================== 配置项 =====================
+METRICS_ENABLED = True
+# 每个阶段一行 JSON：{"run", "time", "stage", "seconds", "bytes_in", "bytes_out", "ratio", "status", ...}
+METRICS_FILE = os.path.join(PROJECT_ROOT, "metrics", "stages.jsonl")
+# node exporter 的 textfile collector 目录下的 .prom 文件，None 表示不输出
+PROMETHEUS_TEXTFILE = os.environ.get("COMIC_PROM_TEXTFILE") or None
+PROMETHEUS_PREFIX = "comic_producer"
+
+# 本次运行的标识（同一次运行的记录可按 run 聚合）
+RUN_ID = f"{time.strftime('%Y%m%d_%H%M%S')}-{os.getpid()}"
+# 本进程内各阶段的累计值，用于 Prometheus 输出
+_totals = {}
+# capture() 期间记录先放进列表，由调用方（进程池任务）带回主进程再 record
+_captured = None
+
+
+def record(rec):
+    """写入一条阶段记录并计入累计值"""
+    if _captured is not None:
+        _captured.append(rec)
+        return
+    if not METRICS_ENABLED:
+        return
+
+    rec.setdefault("run", RUN_ID)
+    rec.setdefault("time", time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()))
+    if rec.get("bytes_in") and rec.get("bytes_out") is not None:
+        rec["ratio"] = round(rec["bytes_out"] / rec["bytes_in"], 4)
+
+    totals = _totals.setdefault(rec["stage"], {"count": 0, "errors": 0, "seconds": 0.0,
+                                                "bytes_in": 0, "bytes_out": 0, "peak_rss": 0})
+    totals["count"] += 1
+    totals["errors"] += rec.get("status") == "error"
+    totals["seconds"] += rec["seconds"]
+    totals["bytes_in"] += rec.get("bytes_in") or 0
+    totals["bytes_out"] += rec.get("bytes_out") or 0
+    totals["peak_rss"] = max(totals["peak_rss"], rec.get("peak_rss") or 0)
+
+    try:
+        os.makedirs(os.path.dirname(METRICS_FILE), exist_ok=True)
+        # 追加模式单行写入，多个进程同时写也不会交错
+        with open(METRICS_FILE, "a", encoding="utf-8") as f:
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    except OSError as e:
+        print(f"⚠️ 指标写入失败：{e}")
+
+
+@contextlib.contextmanager
+def stage(name, **labels):
+    """
+    计时一个阶段，调用方可在记录里补 bytes_in / bytes_out 等字段；
+    没有抛异常但失败了（如 git 推送失败）可写入 rec["error"]，同样记为失败
+    用法：
+        with metrics.stage("html", comic=comic_id) as m:
+            ...
+            m["bytes_out"] = os.path.getsize(html_file)
+    """
+    rec = {"stage": name, **labels, "bytes_in": None, "bytes_out": None}
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield rec
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        rec["seconds"] = round(time.perf_counter() - start, 6)
+        rec["status"] = "error" if rec.get("error") else status
+        record(rec)
+
+
+@contextlib.contextmanager
+def capture():
+    """进程池子进程里使用：收集记录而不写文件，返回给主进程统一 record"""
+    global _captured
+    previous, _captured = _captured, []
+    try:
+        yield _captured
+    finally:
+        _captured = previous
+
+
+def file_size(path):
+    return os.path.getsize(path) if path and os.path.exists(path) else 0
+
+
+# ===================== 内存 =====================
+def _proc_status(field):
+    """读 /proc/self/status 里的内存字段（kB），非 Linux 返回 None"""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def current_rss():
+    """当前常驻内存（字节），取不到时返回 0"""
+    return _proc_status("VmRSS") or 0
+
+
+def peak_rss():
+    """
+    峰值常驻内存（字节）：Linux 读 VmHWM，可以用 reset_peak_rss() 清零后按单张图片统计；
+    其他平台用 getrusage，只能得到进程启动以来的峰值
+    """
+    peak = _proc_status("VmHWM")
+    if peak is None and resource:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS 单位是字节，Linux 是 kB
+        peak = peak if sys.platform == "darwin" else peak * 1024
+    return peak or 0
+
+
+def reset_peak_rss():
+    """把 VmHWM 重置为当前值（Linux 4.0+，写 /proc/self/clear_refs），不支持时什么也不做"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def write_prometheus(path=None):
+    """把本进程的累计值写成 Prometheus 文本格式（先写临时文件再替换，collector 不会读到半个文件）"""
+    path = path or PROMETHEUS_TEXTFILE
+    if not path or not METRICS_ENABLED:
+        return
+
+    metrics = [
+        ("stage_runs", "count", "阶段执行次数"),
+        ("stage_errors", "errors", "阶段失败次数"),
+        ("stage_seconds", "seconds", "阶段累计耗时（秒）"),
+        ("stage_bytes_in", "bytes_in", "阶段输入字节数"),
+        ("stage_bytes_out", "bytes_out", "阶段输出字节数"),
+        ("stage_peak_rss_bytes", "peak_rss", "阶段内单次执行的最大常驻内存（字节）"),
+    ]
+    lines = []
+    for name, key, help_text in metrics:
+        lines.append(f"# HELP {PROMETHEUS_PREFIX}_{name} {help_text}")
+        lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{name} gauge")
+        for stage_name, totals in sorted(_totals.items()):
+            lines.append(f'{PROMETHEUS_PREFIX}_{name}{{stage="{stage_name}"}} {totals[key]}')
+    lines.append(f"# HELP {PROMETHEUS_PREFIX}_last_run_timestamp_seconds 最近一次写出指标的时间")
+    lines.append(f"# TYPE {PROMETHEUS_PREFIX}_last_run_timestamp_seconds gauge")
+    lines.append(f"{PROMETHEUS_PREFIX}_last_run_timestamp_seconds {time.time():.0f}")
+
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"⚠️ Prometheus 指标写入失败：{e}")
+
+
+def summary():
+    """本进程各阶段耗时汇总（按耗时降序），运行结束时打印"""
+    rows = sorted(_totals.items(), key=lambda kv: -kv[1]["seconds"])
+    return "\n".join(f"- {name}: {t['seconds']:.3f}s（{t['count']} 次）" for name, t in rows)
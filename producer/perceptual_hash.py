@@ -0,0 +1,227 @@
+import os
+import io
+import re
+import json
+import argparse
+
+from PIL import Image
+
+from file_lock import file_lock
+from site_config import IMG_DIR, cache_path
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # 没有 numpy 时逐像素比较，结果相同，只是慢一些
+
+# ===================== 配置项 =====================
+# img/ 里每张图的 dHash：{文件名: [大小, 修改时间, 16 位十六进制哈希]}，按 (大小, 修改时间) 增量刷新
+HASH_INDEX = cache_path("dhash-index.json")
+# dHash 边长：缩成 (HASH_SIZE+1)×HASH_SIZE 的灰度图，比较相邻像素得到 HASH_SIZE² 位
+HASH_SIZE = 8
+# 汉明距离不超过这个值视为近似重复（64 位里约 10%，重新压缩、轻微调色都在范围内）
+MAX_DISTANCE = 6
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".webp"}
+# 缩略图、GIF 的静态海报和动画 WebP 是同一张图的派生文件，不进索引
+DERIVED_RE = re.compile(r"-(\d+w|poster)\.\w+$")
+LOCK_NAME = "dhash-index"
+
+
+# ===================== 哈希计算 =====================
+def image_hash(source):
+    """
+    计算 dHash（GIF 取第一帧）
+    :param source: 图片路径，或内存中的图片字节
+    :return: 64 位整数，图片打不开时返回 None
+    """
+    try:
+        with Image.open(io.BytesIO(source) if isinstance(source, bytes) else source) as img:
+            # JPEG 直接按缩小的尺寸解码，大图也只解出一小块
+            img.draft("L", (HASH_SIZE * 8, HASH_SIZE * 8))
+            img.seek(0)
+            small = img.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS)
+    except Exception as e:
+        print(f"⚠️ 感知哈希计算失败：{e}")
+        return None
+
+    if np is not None:
+        pixels = np.asarray(small, dtype=np.int16)
+        bits = np.packbits(pixels[:, 1:] > pixels[:, :-1])
+        return int.from_bytes(bits.tobytes(), "big")
+
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(HASH_SIZE):
+        start = row * (HASH_SIZE + 1)
+        for col in range(start, start + HASH_SIZE):
+            value = (value << 1) | (pixels[col + 1] > pixels[col])
+    return value
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+class BKTree:
+    """
+    BK 树：子节点按与父节点的汉明距离分桶，查询时由三角不等式只进入
+    [d - 阈值, d + 阈值] 范围内的桶，阈值较小时只访问很少一部分节点
+    节点结构：[哈希, [条目...], {距离: 子节点}]
+    """
+
+    def __init__(self, items=()):
+        self.root = None
+        self.size = 0
+        for value, item in items:
+            self.add(value, item)
+
+    def __len__(self):
+        return self.size
+
+    def add(self, value, item):
+        self.size += 1
+        if self.root is None:
+            self.root = [value, [item], {}]
+            return
+        node = self.root
+        while True:
+            dist = hamming(value, node[0])
+            if dist == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(dist)
+            if child is None:
+                node[2][dist] = [value, [item], {}]
+                return
+            node = child
+
+    def search(self, value, max_distance=None):
+        """
+        :return: [(距离, 条目), ...]，按距离升序
+        """
+        max_distance = MAX_DISTANCE if max_distance is None else max_distance
+        results = []
+        stack = [self.root] if self.root else []
+        while stack:
+            node = stack.pop()
+            dist = hamming(value, node[0])
+            if dist <= max_distance:
+                results.extend((dist, item) for item in node[1])
+            for child_dist, child in node[2].items():
+                if dist - max_distance <= child_dist <= dist + max_distance:
+                    stack.append(child)
+        results.sort()
+        return results
+
+
+# ===================== 哈希索引 =====================
+def is_indexed_name(name, names):
+    """只索引原图：跳过缩略图、GIF 海报，以及有同名 GIF 的动画 WebP"""
+    stem, ext = os.path.splitext(name)
+    if ext.lower() not in IMAGE_EXTENSIONS or DERIVED_RE.search(name):
+        return False
+    return not (ext.lower() == ".webp" and stem + ".gif" in names)
+
+
+def _load_raw():
+    if not os.path.exists(HASH_INDEX):
+        return {}
+    with open(HASH_INDEX, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_raw(hashes):
+    os.makedirs(os.path.dirname(HASH_INDEX), exist_ok=True)
+    tmp_path = f"{HASH_INDEX}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(hashes, f)
+    os.replace(tmp_path, HASH_INDEX)
+
+
+def _refresh(hashes, img_dir, names=None):
+    """
+    按 (大小, 修改时间) 增量刷新：没变的直接沿用，新文件和改动过的文件重新计算
+    :param names: 只刷新这些文件（None 表示扫描整个目录，顺带去掉已删除的文件）
+    :return: 是否有变化
+    """
+    changed = False
+    if names is None:
+        entries = {e.name: e for e in os.scandir(img_dir) if e.is_file()} if os.path.isdir(img_dir) else {}
+        for name in [n for n in hashes if n not in entries]:
+            del hashes[name]
+            changed = True
+        stats = {name: e.stat() for name, e in entries.items() if is_indexed_name(name, entries)}
+    else:
+        stats = {name: os.stat(os.path.join(img_dir, name)) for name in names
+                 if os.path.isfile(os.path.join(img_dir, name))}
+
+    for name, st in stats.items():
+        cached = hashes.get(name)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime:
+            continue
+        value = image_hash(os.path.join(img_dir, name))
+        if value is None:
+            continue
+        hashes[name] = [st.st_size, st.st_mtime, f"{value:016x}"]
+        changed = True
+    return changed
+
+
+def index_images(paths, img_dir=IMG_DIR):
+    """压缩完成后把新输出的图片记入索引（压缩时调用，发布前查重就不用再解码这些图）"""
+    names = {os.path.basename(path) for path in paths}
+    names = [name for name in names if is_indexed_name(name, names)]
+    if not names:
+        return
+    with file_lock(LOCK_NAME):
+        hashes = _load_raw()
+        if _refresh(hashes, img_dir, names):
+            _save_raw(hashes)
+
+
+def load_tree(img_dir=IMG_DIR):
+    """读取并增量刷新 img/ 的哈希索引，建成 BK 树（条目为文件名）"""
+    with file_lock(LOCK_NAME):
+        hashes = _load_raw()
+        if _refresh(hashes, img_dir):
+            _save_raw(hashes)
+    return BKTree((int(value, 16), name) for name, (_, _, value) in sorted(hashes.items()))
+
+
+def find_pairs(tree, max_distance=None):
+    """列出索引中两两近似的图片：[(距离, 文件名A, 文件名B), ...]"""
+    pairs = set()
+    stack = [tree.root] if tree.root else []
+    while stack:
+        node = stack.pop()
+        stack.extend(node[2].values())
+        for item in node[1]:
+            for dist, other in tree.search(node[0], max_distance):
+                if other != item:
+                    pairs.add((dist, *sorted((item, other))))
+    return sorted(pairs)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="用感知哈希（dHash）查找与 img/ 已有图片近似重复的图片")
+    parser.add_argument("images", nargs="*", help="要检查的图片；不指定时列出 img/ 内部两两近似的图片")
+    parser.add_argument("--distance", type=int, default=MAX_DISTANCE, help="汉明距离阈值（64 位）")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    tree = load_tree()
+    print(f"哈希索引：{len(tree)} 张图片（{HASH_INDEX}）")
+    if not args.images:
+        pairs = find_pairs(tree, args.distance)
+        for dist, a, b in pairs:
+            print(f"{a} ≈ {b}（距离 {dist}）")
+        print(f"✅ 共 {len(pairs)} 对近似重复")
+    for path in args.images:
+        value = image_hash(path)
+        matches = tree.search(value, args.distance) if value is not None else []
+        if matches:
+            print(f"⚠️ {path}：" + "、".join(f"{name}（距离 {dist}）" for dist, name in matches))
+        else:
+            print(f"✅ {path}：没有近似重复")
@@ -0,0 +1,90 @@
+import os
+import gzip
+import json
+import hashlib
+
+from site_config import OUTPUT_DIR, cache_path
+
+try:
+    import brotli  # 可选依赖：pip install brotli，没有时只生成 .gz
+except ImportError:
+    brotli = None
+
+# ===================== 配置项 =====================
+# 记录每个文件上次压缩时的内容哈希（含编码器），内容没变就跳过
+STATE_FILE = cache_path("precompress.json")
+TEXT_EXTENSIONS = {".html", ".json", ".js", ".css", ".svg", ".txt", ".xml"}
+COMPRESSED_EXTENSIONS = (".gz", ".br")
+
+
+# ===================== 压缩函数 =====================
+def gzip_bytes(data):
+    # mtime=0 让相同内容产出相同字节，避免无意义的 git 变更
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def brotli_bytes(data):
+    return brotli.compress(data, quality=11, mode=brotli.MODE_TEXT)
+
+
+def get_encoders():
+    encoders = [(".gz", gzip_bytes)]
+    if brotli:
+        encoders.append((".br", brotli_bytes))
+    return encoders
+
+
+def precompress_dir(root=OUTPUT_DIR):
+    """给 root 下所有文本文件生成最高压缩级别的 .gz / .br 兄弟文件（增量）"""
+    state = {}
+    if os.path.exists(STATE_FILE):
+        with open(STATE_FILE, "r", encoding="utf-8") as f:
+            state = json.load(f)
+
+    if not brotli:
+        print("⚠️ 未安装 brotli，只生成 .gz（pip install brotli）")
+
+    encoders = get_encoders()
+    # 编码器集合也记进状态，后来装上 brotli 时已有文件会补上 .br
+    encoder_tag = ",".join(ext for ext, _ in encoders)
+    fresh_state = {}
+    compressed = skipped = 0
+    for dir_path, _, files in os.walk(root):
+        for name in files:
+            path = os.path.join(dir_path, name)
+
+            # 源文件已删除的压缩版本一并清理
+            if name.endswith(COMPRESSED_EXTENSIONS):
+                if not os.path.exists(path[:-3]):
+                    os.remove(path)
+                continue
+            if os.path.splitext(name)[1].lower() not in TEXT_EXTENSIONS:
+                continue
+
+            with open(path, "rb") as f:
+                data = f.read()
+            rel_path = os.path.relpath(path, root)
+            digest = f"{hashlib.sha256(data).hexdigest()}:{encoder_tag}"
+            fresh_state[rel_path] = digest
+            if state.get(rel_path) == digest:
+                skipped += 1
+                continue
+
+            # 压缩后没有变小的不保留，让服务器直接返回原文件
+            for ext, encode in encoders:
+                packed = encode(data)
+                if len(packed) < len(data):
+                    with open(path + ext, "wb") as f:
+                        f.write(packed)
+                elif os.path.exists(path + ext):
+                    os.remove(path + ext)
+            compressed += 1
+
+    os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+    with open(STATE_FILE, "w", encoding="utf-8") as f:
+        json.dump(fresh_state, f)
+    print(f"✅ 预压缩完成：新压缩 {compressed} 个文件，未变化跳过 {skipped} 个")
+
+
+if __name__ == "__main__":
+    precompress_dir()
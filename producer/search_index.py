@@ -0,0 +1,151 @@
+import os
+import re
+import json
+import glob
+import math
+import time
+import unicodedata
+
+from site_config import OUTPUT_DIR
+
+# ===================== 配置项 =====================
+SEARCH_DIR = os.path.join(OUTPUT_DIR, "search")
+# 各字段的权重：标题命中比笑点描述命中更靠前
+FIELD_WEIGHTS = {"title": 3, "sub_topic": 2, "topic": 2, "category": 1, "funny_example": 1}
+# 结果展示用的文档表按 DOC_CHUNK 条一个文件，前端只拉取排名靠前的结果所在的文件
+DOC_CHUNK = 256
+# 格式变化时递增（前端按 manifest.version 判断）
+SEARCH_VERSION = 1
+
+# 中日文连续字符段切二元组，字母数字段整词保留；前端 tokenize() 必须保持同样的规则
+# 建索引时中日文另外按单字收录，单字查询（“猫”）才能命中多字的标题（“猫猫行为”）
+TOKEN_RE = re.compile(r"[\u3040-\u30ff\u3400-\u9fff\uf900-\ufaff]+|[a-z0-9]+")
+CJK_RE = re.compile(r"[\u3040-\u30ff\u3400-\u9fff\uf900-\ufaff]")
+
+
+# ===================== 分词 =====================
+def tokenize(text, unigrams=False):
+    """
+    分词：NFKC 归一化 + 小写，中文按相邻两字切分（单字段保留单字），英文/数字按整词
+    :param unigrams: 建索引时为 True，多字的中文段再额外产出每个单字；查询时不加，多字查询仍按二元组精确匹配
+    :return: 词元列表（可能重复，用于计算词频）
+    """
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    tokens = []
+    for run in TOKEN_RE.findall(text):
+        if CJK_RE.match(run) and len(run) > 1:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+            if unigrams:
+                tokens.extend(run)
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def shard_name(token):
+    """倒排分片名：词元首字符的码位（十六进制），查询时前端按同样规则算出要拉哪些分片"""
+    return f"{ord(token[0]):x}"
+
+
+# ===================== 构建 =====================
+def build_search_index(comics, search_dir=SEARCH_DIR):
+    """
+    生成静态倒排索引：
+    - search/manifest.json：文档数、分片数等
+    - search/t-<首字符码位>.json：{词元: [[文档序号, 权重], ...]}
+    - search/docs-N.json：文档序号 → 列表页展示字段
+    :param comics: 完整索引记录（最新在后，文档序号按最新在前编号）
+    """
+    os.makedirs(search_dir, exist_ok=True)
+    for old_file in glob.glob(os.path.join(search_dir, "*.json")):
+        os.remove(old_file)
+
+    docs = comics[::-1]
+    postings = {}
+    for doc_num, c in enumerate(docs):
+        weights = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(c.get(field), unigrams=True):
+                weights[token] = weights.get(token, 0) + weight
+        for token, weight in weights.items():
+            postings.setdefault(token, []).append([doc_num, weight])
+
+    shards = {}
+    for token, items in postings.items():
+        # 同一词元内按权重降序，前端截断时也能保留最相关的
+        items.sort(key=lambda item: (-item[1], item[0]))
+        shards.setdefault(shard_name(token), {})[token] = items
+    for name, tokens in shards.items():
+        write_search_json(os.path.join(search_dir, f"t-{name}.json"), tokens)
+
+    for start in range(0, len(docs), DOC_CHUNK):
+        chunk = [{
+            "id": c["id"],
+            "title": c["title"],
+            "topic": c.get("topic", ""),
+            "category": c.get("category", "未分类"),
+            "img": c["img"],
+            "thumbs": c.get("thumbs", []),
+            # 与列表页相同：GIF 的搜索结果也先显示静态海报
+            "poster": c.get("poster"),
+            "html": c["html"]
+        } for c in docs[start:start + DOC_CHUNK]]
+        write_search_json(os.path.join(search_dir, f"docs-{start // DOC_CHUNK}.json"), chunk)
+
+    manifest = {
+        "version": SEARCH_VERSION,
+        "docs": len(docs),
+        "doc_chunk": DOC_CHUNK,
+        "tokens": len(postings),
+        "shards": len(shards),
+        "generated": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+    }
+    write_search_json(os.path.join(search_dir, "manifest.json"), manifest)
+    print(f"✅ 搜索索引已生成：{len(docs)} 篇，{len(postings)} 个词元，{len(shards)} 个分片")
+    return manifest
+
+
+def write_search_json(path, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+
+
+# ===================== 本地查询（调试用，与前端排序一致） =====================
+def search(query, search_dir=SEARCH_DIR, limit=10):
+    """
+    按前端同样的规则查询：覆盖的查询词元数优先，其次按 权重×idf 之和
+    :return: [(漫画ID, 得分), ...]
+    """
+    with open(os.path.join(search_dir, "manifest.json"), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    terms = list(dict.fromkeys(tokenize(query)))
+    scores, matched = {}, {}
+    loaded = {}
+    for token in terms:
+        name = shard_name(token)
+        if name not in loaded:
+            path = os.path.join(search_dir, f"t-{name}.json")
+            loaded[name] = {}
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    loaded[name] = json.load(f)
+        items = loaded[name].get(token, [])
+        idf = math.log(1 + manifest["docs"] / len(items)) if items else 0
+        for doc_num, weight in items:
+            scores[doc_num] = scores.get(doc_num, 0) + weight * idf
+            matched[doc_num] = matched.get(doc_num, 0) + 1
+
+    ranked = sorted(scores, key=lambda d: (-matched[d], -scores[d], d))[:limit]
+    results = []
+    for doc_num in ranked:
+        with open(os.path.join(search_dir, f"docs-{doc_num // manifest['doc_chunk']}.json"), "r",
+                  encoding="utf-8") as f:
+            results.append((json.load(f)[doc_num % manifest["doc_chunk"]]["id"], round(scores[doc_num], 3)))
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+    for comic_id, score in search(" ".join(sys.argv[1:])):
+        print(comic_id, score)
@@ -0,0 +1,18 @@
+import os
+
+# ===================== 配置项 =====================
+# 站点根目录（img/、comics/、output/、索引都在这里）；
+# 可用环境变量 COMIC_PROJECT_ROOT 指向别的站点目录（基准测试、测试等场景，子进程也会继承）
+PROJECT_ROOT = os.environ.get("COMIC_PROJECT_ROOT") or os.path.dirname(os.path.abspath(__file__))
+IMG_DIR = os.path.join(PROJECT_ROOT, "img")
+COMIC_HTML_DIR = os.path.join(PROJECT_ROOT, "comics")
+OUTPUT_DIR = os.path.join(PROJECT_ROOT, "output")
+# 各模块的缓存、日志、锁文件都放在 .cache/ 下（不进 git）
+CACHE_DIR = os.path.join(PROJECT_ROOT, ".cache")
+# 阅读量统计服务（线上 Worker，或自建的 counter_server.py）：详情页上报、排行榜拉取热门列表
+COUNTER_URL = "https://comic-hot-counter.zhouguangzheng.workers.dev"
+
+
+def cache_path(*parts):
+    """.cache/ 下的路径，如 cache_path("locks") → PROJECT_ROOT/.cache/locks"""
+    return os.path.join(CACHE_DIR, *parts)
@@ -0,0 +1,145 @@
+import os
+import json
+import time
+import hashlib
+
+import compress_cache
+from file_lock import file_lock
+from site_config import PROJECT_ROOT, cache_path
+
+# ===================== 配置项 =====================
+# 每个漫画（按源图内容 + 元数据区分）已完成的阶段及其产出文件的哈希；中断后重跑从第一个未完成的阶段继续
+JOURNAL_FILE = cache_path("stage-journal.json")
+# 阶段顺序：重做某个阶段时，它之后的阶段全部作废
+STAGES = ("compress", "thumbnails", "html", "index", "git")
+# 全部完成的记录保留天数（期间用同样的源图重跑会直接跳过）
+KEEP_DAYS = 30
+LOCK_NAME = "stage-journal"
+
+
+def job_key(job):
+    """漫画任务的稳定标识：所有源图的内容哈希 + 元数据"""
+    digests = [hashlib.sha256(src).hexdigest() if isinstance(src, bytes) else compress_cache.file_digest(src)
+               for src in job["images"]]
+    payload = json.dumps({"images": digests, "meta": job.get("meta")}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class StageJournal:
+    """
+    阶段日志：{任务键: {"comic_id", "created", "stages": {阶段: {"outputs": {相对路径: sha256}, "data": ...}}}}
+    产出文件缺失或内容被改动时，对应阶段视为未完成
+    """
+
+    def __init__(self, path=JOURNAL_FILE):
+        self.path = path
+        self.digests = {}  # 本次运行内的文件哈希缓存
+        self.touched = set()  # 本实例改动过的记录，保存时只合并这些，不覆盖其他进程的记录
+        self.records = self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def get_or_create(self, job):
+        key = job_key(job)
+        record = self.records.setdefault(key, {"comic_id": None, "created": time.time(), "stages": {}})
+        record["key"] = key
+        self.touched.add(key)
+        return record
+
+    def _digest(self, rel_path):
+        if rel_path not in self.digests:
+            path = os.path.join(PROJECT_ROOT, rel_path)
+            self.digests[rel_path] = compress_cache.file_digest(path) if os.path.exists(path) else None
+        return self.digests[rel_path]
+
+    def stage_done(self, record, stage):
+        """该阶段及之前的阶段都已完成，且产出文件都还在、内容没变"""
+        for name in STAGES[:STAGES.index(stage) + 1]:
+            done = record["stages"].get(name)
+            if not done:
+                return False
+            if any(self._digest(p) != digest for p, digest in done["outputs"].items()):
+                return False
+        return True
+
+    def data(self, record, stage):
+        return record["stages"][stage].get("data")
+
+    def mark(self, record, stage, outputs=(), data=None):
+        """记录阶段完成（同时作废之后的阶段）"""
+        self.touched.add(record["key"])
+        for name in STAGES[STAGES.index(stage) + 1:]:
+            record["stages"].pop(name, None)
+        for rel_path in outputs:
+            self.digests.pop(rel_path, None)
+        record["stages"][stage] = {"outputs": {p: self._digest(p) for p in outputs}, "data": data,
+                                   "time": time.time()}
+
+    def is_complete(self, record):
+        """全部阶段已完成；完成后的产出可能被 rebuild 等正常改写，不再校验哈希"""
+        return STAGES[-1] in record["stages"]
+
+    def incomplete(self):
+        """未完成的记录（清理孤儿文件时，它们的产出还要留着续跑）"""
+        return [r for r in self.records.values() if r["comic_id"] and STAGES[-1] not in r["stages"]]
+
+    def forget(self, key):
+        self.records.pop(key, None)
+        self.touched.add(key)
+
+    def save(self):
+        """
+        加锁后重新读取磁盘上的日志，只合并本实例改动过的记录（多个 producer 并行时互不覆盖），
+        清掉过期的已完成记录，先写临时文件再替换
+        """
+        with file_lock(LOCK_NAME):
+            merged = self._load()
+            for key in self.touched:
+                if key in self.records:
+                    merged[key] = self.records[key]
+                else:
+                    merged.pop(key, None)
+
+            expire = time.time() - KEEP_DAYS * 24 * 3600
+            merged = {k: r for k, r in merged.items()
+                      if not (STAGES[-1] in r["stages"] and r["stages"][STAGES[-1]]["time"] < expire)}
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                # key 只是运行时方便回查，不写盘
+                records = {k: {field: v for field, v in r.items() if field != "key"} for k, r in merged.items()}
+                json.dump(records, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+
+        # 本实例里的记录对象继续沿用（调用方还持有引用），只补上其他进程新增的记录
+        for key, record in merged.items():
+            self.records.setdefault(key, record)
+
+
+def mark_keys(keys, stage):
+    """按任务键补记某个阶段完成（合并提交推送成功后调用）"""
+    if not keys:
+        return
+    with file_lock(LOCK_NAME):
+        journal = StageJournal()
+        for key in keys:
+            record = journal.records.get(key)
+            if record:
+                record["key"] = key
+                journal.mark(record, stage)
+        journal.save()
+
+
+def drop_incomplete():
+    """放弃全部未完成的记录（之后它们的产出会被当作孤儿清理）"""
+    with file_lock(LOCK_NAME):
+        journal = StageJournal()
+        dropped = [k for k, r in journal.records.items() if STAGES[-1] not in r["stages"]]
+        for key in dropped:
+            journal.forget(key)
+        journal.save()
+    return len(dropped)
@@ -0,0 +1,81 @@
+import os
+import json
+import sys
+import tempfile
+import subprocess
+
+import pytest
+from PIL import Image
+
+# producer 的模块在导入时就确定站点目录：先指向临时目录，测试不会碰到真实的 img/、索引和 .cache/
+os.environ.setdefault("COMIC_PROJECT_ROOT", tempfile.mkdtemp(prefix="comic-test-"))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PRODUCER_DIR = os.path.join(ROOT_DIR, "producer")
+# 仓库根目录还留着旧版 auto_generate_comic.py 等同名模块：producer/ 要排在前面
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, PRODUCER_DIR)
+
+
+def _env(site):
+    return dict(os.environ, COMIC_PROJECT_ROOT=str(site), PYTHONIOENCODING="utf-8")
+
+
+def _run(cmd, site, check):
+    result = subprocess.run(cmd, cwd=PRODUCER_DIR, env=_env(site), capture_output=True, text=True, encoding="utf-8")
+    if check and result.returncode != 0:
+        raise AssertionError(f"子进程失败（{result.returncode}）：\n{result.stdout}\n{result.stderr}")
+    return result
+
+
+@pytest.fixture
+def site(tmp_path):
+    """独立的站点目录（空 git 仓库）：子进程里的 producer 通过 COMIC_PROJECT_ROOT 指向它"""
+    site_dir = tmp_path / "site"
+    site_dir.mkdir()
+    for cmd in (["init", "-q"], ["config", "user.email", "test@example.com"], ["config", "user.name", "test"]):
+        subprocess.run(["git", *cmd], cwd=site_dir, check=True)
+    return site_dir
+
+
+@pytest.fixture
+def run_python(site):
+    """以 site 为站点目录运行一段 Python 代码（工作目录是 producer/，可直接 import 其中的模块）"""
+    return lambda code, check=True: _run([sys.executable, "-c", code], site, check)
+
+
+@pytest.fixture
+def start_python(site):
+    """同 run_python，但不等待结束，返回 Popen（用于多个进程同时运行）"""
+    return lambda code: subprocess.Popen([sys.executable, "-c", code], cwd=PRODUCER_DIR, env=_env(site),
+                                         stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, encoding="utf-8")
+
+
+@pytest.fixture
+def producer(site):
+    """以 site 为站点目录运行 auto_generate_comic.py 命令行（只在本地提交、不记指标）"""
+    return lambda *args, check=True: _run(
+        [sys.executable, "auto_generate_comic.py", "--no-metrics", "--no-push", *args], site, check)
+
+
+@pytest.fixture
+def make_batch(tmp_path):
+    """写一张源图和一份 JSONL 清单（每行都引用这张图），返回清单路径"""
+    def make(rows, color=(200, 30, 30)):
+        Image.new("RGB", (640, 480), color).save(tmp_path / "raw_comic1.png")
+        batch = tmp_path / "batch.jsonl"
+        batch.write_text("".join(json.dumps({"images": ["raw_comic1.png"], **row}, ensure_ascii=False) + "\n"
+                                 for row in rows), encoding="utf-8")
+        return batch
+    return make
+
+
+@pytest.fixture
+def read_index(site):
+    """读取站点的 comic-index.json 快照（先压实：发布时日志积累不够不会重写快照，和 build_index 一样）"""
+    def read():
+        _run([sys.executable, "-c", "import index_journal; index_journal.compact()"], site, check=True)
+        with open(site / "comic-index.json", "r", encoding="utf-8") as f:
+            return json.load(f)["comics"]
+    return read
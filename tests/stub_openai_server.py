@@ -0,0 +1,112 @@
+import io
+import json
+import time
+import base64
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image
+
+# ===================== 配置项 =====================
+# 出图接口的模拟耗时（秒），并发测试靠它让请求在服务端重叠
+IMAGE_DELAY = 0.2
+
+
+def png_b64(size=(64, 64), color=(255, 200, 0)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, "PNG")
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+class StubOpenAIServer(ThreadingHTTPServer):
+    """
+    本地 OpenAI 兼容桩服务：/v1/chat/completions 回显改写结果，/v1/images/generations 返回一张纯色 PNG
+    :param rate_limited: 前 N 个请求直接返回 429，用来验证重试
+    :param broken_images: 前 N 个出图请求返回 200 但图片数据不是合法的 base64，用来验证单个想法失败不影响整批
+    记录请求数、429 次数和同时处理中的最大请求数
+    """
+
+    daemon_threads = True
+
+    def __init__(self, port=0, rate_limited=0, image_delay=IMAGE_DELAY, broken_images=0):
+        super().__init__(("127.0.0.1", port), StubHandler)
+        self.rate_limited = rate_limited
+        self.broken_images = broken_images
+        self.image_delay = image_delay
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.rejected = 0
+        self.inflight = 0
+        self.max_inflight = 0
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with server.lock:
+            server.requests += 1
+            limited = server.rejected < server.rate_limited
+            if limited:
+                server.rejected += 1
+            else:
+                server.inflight += 1
+                server.max_inflight = max(server.max_inflight, server.inflight)
+        if limited:
+            return self.reply(429, {"error": {"message": "Rate limit reached", "type": "requests",
+                                              "code": "rate_limit_exceeded"}})
+        try:
+            if self.path.endswith("/chat/completions"):
+                idea = body["messages"][-1]["content"].strip().splitlines()[-1]
+                self.reply(200, {
+                    "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()),
+                    "model": body.get("model"),
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": f"cartoon, {idea}"}}],
+                })
+            elif self.path.endswith("/images/generations"):
+                time.sleep(server.image_delay)
+                with server.lock:
+                    broken = server.broken_images > 0
+                    server.broken_images -= broken
+                self.reply(200, {"created": int(time.time()), "data": [{"b64_json": "x" if broken else png_b64()}]})
+            else:
+                self.reply(404, {"error": {"message": f"unknown path {self.path}"}})
+        finally:
+            with server.lock:
+                server.inflight -= 1
+
+    def reply(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地 OpenAI 兼容桩服务（配合 gpt_prompt_to_image.py --base-url）")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--rate-limited", type=int, default=0, help="前 N 个请求返回 429")
+    args = parser.parse_args()
+    server = StubOpenAIServer(args.port, args.rate_limited)
+    print(f"✅ 桩服务已启动：{server.base_url}")
+    server.serve_forever()
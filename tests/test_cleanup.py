@@ -0,0 +1,36 @@
+import json
+
+
+def test_cleanup_keeps_files_referenced_by_deduplicated_comics(site, producer, make_batch, read_index):
+    batch = make_batch([{"title": "第一个"}, {"title": "内容相同的第二个"}])
+    producer("--dup-policy", "off", "batch", str(batch))
+    first, second = read_index()
+    # 第二个漫画的图片与第一个完全相同，去重后直接引用第一个的文件
+    assert second["img"] == first["img"] == "img/comic-001-1.png"
+    assert not (site / "img" / "comic-002-1.png").exists()
+
+    # 手动从索引里删掉第一个漫画，它的详情页成了孤儿，图片仍被第二个引用
+    (site / "comic-index.json").write_text(json.dumps({"comics": [second]}, ensure_ascii=False), encoding="utf-8")
+    result = producer("cleanup")
+    assert "comics/comic-001.html" in result.stdout
+    assert not (site / "comics" / "comic-001.html").exists()
+    assert (site / "img" / "comic-001-1.png").exists()
+    for thumb in second["thumbs"]:
+        assert (site / thumb["src"]).exists()
+    assert [c["id"] for c in read_index()] == ["comic-002"]
+
+
+def test_cleanup_keeps_outputs_of_unfinished_comics(site, run_python, producer, make_batch, read_index):
+    producer("batch", str(make_batch([{"title": "已发布"}])))
+    # 第二个漫画压缩完成后中断：产出还不在索引里，但可以续跑，不能当孤儿删掉
+    batch = make_batch([{"title": "未完成"}], color=(30, 30, 200))
+    run_python("import os, auto_generate_comic as p\n"
+               "p.append_comic_entries = lambda entries: os._exit(3)\n"
+               f"p.main_batch({str(batch)!r})", check=False)
+    assert (site / "img" / "comic-002-1.png").exists()
+
+    producer("cleanup")
+    assert (site / "img" / "comic-002-1.png").exists()
+    producer("cleanup", "--abandon")
+    assert not (site / "img" / "comic-002-1.png").exists()
+    assert [c["id"] for c in read_index()] == ["comic-001"]
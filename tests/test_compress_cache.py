@@ -0,0 +1,47 @@
+import os
+
+# 在 compress 之后、写索引之前退出进程（os._exit 不走任何清理，和断电/被杀一样）
+CRASH_BEFORE_INDEX = """
+import os
+import auto_generate_comic as producer
+producer.GIT_PUSH_ENABLED = False
+producer.metrics.METRICS_ENABLED = False
+producer.append_comic_entries = lambda entries: os._exit(3)
+producer.main_batch({batch!r})
+"""
+
+
+def test_resume_after_crash_between_compress_and_index(site, run_python, producer, make_batch, read_index):
+    batch = make_batch([{"title": "断点续跑"}])
+    crashed = run_python(CRASH_BEFORE_INDEX.format(batch=str(batch)), check=False)
+    assert crashed.returncode == 3
+    image = site / "img" / "comic-001-1.png"
+    assert image.exists()
+    assert not (site / "comic-index.json").exists()
+    compressed_at = os.stat(image).st_mtime_ns
+
+    result = producer("batch", str(batch))
+    assert "从上次中断处继续" in result.stdout
+    # 压缩结果直接沿用，不重新编码
+    assert os.stat(image).st_mtime_ns == compressed_at
+    comics = read_index()
+    # 沿用崩溃前分配的序号，没有重复分配，也没有重复记录
+    assert [(c["id"], c["title"]) for c in comics] == [("comic-001", "断点续跑")]
+    assert comics[0]["img"] == "img/comic-001-1.png"
+    assert (site / "comics" / "comic-001.html").exists()
+
+    # 全部完成后再跑一次直接跳过
+    assert "已发布过的漫画 1 个，跳过" in producer("batch", str(batch)).stdout
+    assert len(read_index()) == 1
+
+
+def test_same_source_hits_cache_and_is_deduplicated(site, producer, make_batch, read_index):
+    producer("--dup-policy", "off", "batch", str(make_batch([{"title": "第一次"}])))
+    result = producer("--dup-policy", "off", "batch", str(make_batch([{"title": "同一张图再发一次"}])))
+    assert "命中压缩缓存" in result.stdout
+    assert [c["img"] for c in read_index()] == ["img/comic-001-1.png", "img/comic-001-1.png"]
+    assert not (site / "img" / "comic-002-1.png").exists()
+
+    # --no-cache 时不查缓存，重新编码
+    result = producer("--dup-policy", "off", "--no-cache", "batch", str(make_batch([{"title": "第三次"}])))
+    assert "命中压缩缓存" not in result.stdout
@@ -0,0 +1,69 @@
+import json
+import hashlib
+import threading
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import counter_server
+
+
+def visitor(n):
+    return hashlib.sha256(str(n).encode("utf-8")).hexdigest()[:16]
+
+
+@pytest.mark.parametrize("count", [50, 5000, 100000])
+def test_unique_visitor_estimate_is_close(count):
+    estimator = counter_server.VisitorEstimator()
+    for n in range(count):
+        estimator.add(visitor(n))
+        # 重复访问不增加独立访客
+        estimator.add(visitor(n))
+    # 标准误差约 1.6%，按 3 倍放宽
+    assert abs(estimator.count() - count) <= count * 0.05
+
+
+def test_visitor_registers_survive_save_and_load(tmp_path):
+    state_file = str(tmp_path / "counter-state.json")
+    counter = counter_server.HitCounter()
+    for n in range(3000):
+        counter.hit(f"comic-{n % 7:03d}", visitor(n))
+    counter.save(state_file)
+    with open(state_file, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    # 只存固定大小的寄存器，不存访客列表
+    assert "visitors" not in state and len(state["visitors_hll"]) == 2 * (1 << counter_server.UV_PRECISION)
+
+    restored = counter_server.HitCounter()
+    restored.load(state_file)
+    assert restored.stat() == counter.stat()
+
+
+@pytest.fixture
+def counter_url(monkeypatch):
+    counter = counter_server.HitCounter(top_size=5)
+    for n in range(8):
+        for _ in range(n + 1):
+            counter.hit(f"comic-{n:03d}", visitor(n))
+    monkeypatch.setattr(counter_server.CounterHandler, "counter", counter)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), counter_server.CounterHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def get_top(url):
+    with urllib.request.urlopen(url) as resp:
+        return [item["id"] for item in json.load(resp)["data"]]
+
+
+def test_top_limit_is_clamped_to_top_size(counter_url):
+    top = ["comic-007", "comic-006", "comic-005", "comic-004", "comic-003"]
+    assert get_top(f"{counter_url}/top?limit=2") == top[:2]
+    # 超过榜单大小、非法或缺省的 limit 都不会超出 top_size
+    assert get_top(f"{counter_url}/top?limit=100000") == top
+    assert get_top(f"{counter_url}/top?limit=abc") == top
+    assert get_top(f"{counter_url}/top") == top
+    assert get_top(f"{counter_url}/top?limit=-3") == top[:1]
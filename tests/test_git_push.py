@@ -0,0 +1,56 @@
+import subprocess
+
+import pytest
+
+# 推送到本地裸仓库：第一次没有 origin 推送失败，之后加上 origin 再跑
+PUBLISH = """
+import auto_generate_comic as producer
+producer.metrics.METRICS_ENABLED = False
+producer.main_batch({batch!r})
+producer.flush_git_push()
+"""
+
+
+def git(cwd, *args):
+    return subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True, text=True).stdout
+
+
+@pytest.fixture
+def site(tmp_path):
+    """和实际部署一样，站点放在仓库的子目录 producer/ 里"""
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    git(repo, "init", "-q", "-b", "main")
+    git(repo, "config", "user.email", "test@example.com")
+    git(repo, "config", "user.name", "test")
+    site_dir = repo / "producer"
+    site_dir.mkdir()
+    return site_dir
+
+
+def test_commits_when_site_is_a_repo_subdirectory(site, producer, make_batch):
+    producer("batch", str(make_batch([{"title": "子目录"}])))
+    committed = git(site.parent, "show", "--name-only", "--format=", "HEAD").split()
+    assert "producer/img/comic-001-1.png" in committed
+    assert "producer/comics/comic-001.html" in committed
+    # 没有留在暂存区里的文件
+    assert git(site.parent, "diff", "--cached", "--name-only") == ""
+
+
+def test_push_is_retried_after_it_failed(tmp_path, site, run_python, make_batch, read_index):
+    batch = make_batch([{"title": "推送重试"}])
+    first = run_python(PUBLISH.format(batch=str(batch))).stdout
+    assert "Git推送失败" in first
+    head = git(site.parent, "rev-parse", "HEAD").strip()
+
+    remote = tmp_path / "remote.git"
+    git(tmp_path, "init", "-q", "--bare", str(remote))
+    git(site.parent, "remote", "add", "origin", str(remote))
+    second = run_python(PUBLISH.format(batch=str(batch))).stdout
+    assert "只推送" in second and "Git推送成功" in second
+    # 没有新的提交，推送的就是上次那个
+    assert git(site.parent, "rev-parse", "HEAD").strip() == head
+    assert git(remote, "rev-parse", "main").strip() == head
+
+    assert "已发布过的漫画 1 个，跳过" in run_python(PUBLISH.format(batch=str(batch))).stdout
+    assert len(read_index()) == 1
@@ -0,0 +1,80 @@
+import os
+import json
+import time
+import asyncio
+
+from PIL import Image
+
+import gpt_prompt_to_image as gen
+from stub_openai_server import StubOpenAIServer
+
+IDEAS = [{"idea": f"想法{i}", "category": "日常", "sub_category": f"子类{i}"} for i in range(6)]
+
+
+def run(ideas, output_dir, server, concurrency, write_raw=True, use_cache=False):
+    return asyncio.run(gen.generate_all(ideas, str(output_dir), concurrency=concurrency, per_minute=0,
+                                        base_url=server.base_url, use_cache=use_cache, write_raw=write_raw))
+
+
+def test_retries_rate_limited_requests(tmp_path, monkeypatch):
+    monkeypatch.setattr(gen, "BACKOFF_BASE", 0.01)
+    with StubOpenAIServer(rate_limited=3, image_delay=0) as server:
+        results = run(IDEAS[:2], tmp_path, server, concurrency=1)
+    assert all(results)
+    assert server.rejected == 3
+    # 2 个想法各 1 次改写 + 1 次出图，外加被 429 拒掉的 3 次
+    assert server.requests == 2 * 2 + 3
+
+
+def test_gives_up_after_max_retries(tmp_path, monkeypatch):
+    monkeypatch.setattr(gen, "BACKOFF_BASE", 0.01)
+    monkeypatch.setattr(gen, "MAX_RETRIES", 1)
+    with StubOpenAIServer(rate_limited=2, image_delay=0) as server:
+        results = run(IDEAS[:1], tmp_path, server, concurrency=1)
+    assert results == [None]
+    assert os.listdir(tmp_path) == []
+
+
+def test_bad_image_data_fails_only_that_idea(tmp_path):
+    with StubOpenAIServer(image_delay=0, broken_images=1) as server:
+        results = run(IDEAS[:3], tmp_path, server, concurrency=1)
+    # 第一个想法拿到的图片数据解不开（binascii.Error 不是 OpenAIError），其余照常生成
+    assert results[0] is None and all(results[1:])
+    assert len(os.listdir(tmp_path)) == 2
+
+
+def test_concurrency_limit(tmp_path):
+    with StubOpenAIServer(image_delay=0.2) as server:
+        results = run(IDEAS, tmp_path, server, concurrency=2)
+    assert all(results)
+    assert server.max_inflight == 2
+
+
+def test_writes_one_comic_dir_per_idea(tmp_path):
+    with StubOpenAIServer(image_delay=0) as server:
+        run(IDEAS[:3], tmp_path, server, concurrency=3)
+    names = sorted(os.listdir(tmp_path))
+    # 临时目录都已改名，没有残留
+    assert len(names) == 3 and not any(name.startswith(".") for name in names)
+    for idx, name in enumerate(names):
+        assert name.startswith("raw_comic_") and name.endswith(f"_{idx + 1:03d}")
+        comic_dir = tmp_path / name
+        with Image.open(comic_dir / "raw_comic.png") as img:
+            assert img.format == "PNG"
+        meta = json.loads((comic_dir / "comic_meta.json").read_text(encoding="utf-8"))
+        assert meta == {"category": "日常", "sub_category": f"子类{idx}"}
+
+
+def test_prompt_cache_lives_in_site_cache_and_skips_rewrites(tmp_path):
+    assert gen.PROMPT_CACHE_FILE == os.path.join(os.environ["COMIC_PROJECT_ROOT"], ".cache", "prompt-cache.json")
+    # 想法带上时间戳，不会命中别的测试留下的缓存
+    ideas = [{"idea": f"缓存想法{time.time_ns()}-{i}"} for i in range(2)]
+    with StubOpenAIServer(image_delay=0) as server:
+        assert all(run(ideas, tmp_path / "first", server, concurrency=2, use_cache=True))
+        assert server.requests == 2 * 2
+        # 第二次运行从磁盘缓存读出改写结果，只请求出图
+        assert all(run(ideas, tmp_path / "second", server, concurrency=2, use_cache=True))
+        assert server.requests == 2 * 2 + 2
+    with open(gen.PROMPT_CACHE_FILE, "r", encoding="utf-8") as f:
+        prompts = [entry["prompt"] for entry in json.load(f).values()]
+    assert all(f"cartoon, {idea['idea']}" in prompts for idea in ideas)
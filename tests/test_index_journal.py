@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+import index_journal
+
+
+@pytest.fixture
+def journal(tmp_path, monkeypatch):
+    """在临时目录里使用索引日志和快照（本进程内）"""
+    monkeypatch.setattr(index_journal, "JOURNAL_PATH", str(tmp_path / "comic-index.jsonl"))
+    monkeypatch.setattr(index_journal, "SNAPSHOT_PATH", str(tmp_path / "comic-index.json"))
+    monkeypatch.setattr(index_journal, "SNAPSHOT_STATE_PATH", str(tmp_path / "index-snapshot.json"))
+    return index_journal
+
+
+def entry(num, **fields):
+    return {"id": f"comic-{num:03d}", "title": f"标题{num}", **fields}
+
+
+def test_recovers_from_torn_last_line(journal):
+    journal.append_entries([entry(1), entry(2)])
+    # 模拟追加到一半崩溃：最后一行写了一半，还截断在一个汉字中间
+    torn = journal._encode_entry(entry(3))
+    with open(journal.JOURNAL_PATH, "ab") as f:
+        f.write(torn[:torn.index("标".encode("utf-8")) + 1])
+
+    assert [e["id"] for e in journal.read_entries()] == ["comic-001", "comic-002"]
+
+    # 之后的追加另起一行，坏行不影响新记录
+    journal.append_entries([entry(4)])
+    assert [e["id"] for e in journal.read_entries()] == ["comic-001", "comic-002", "comic-004"]
+    assert journal.read_last_id() == 4
+    assert [e["id"] for e in journal.compact()] == ["comic-001", "comic-002", "comic-004"]
+
+
+def test_later_record_wins(journal):
+    journal.append_entries([entry(1), entry(2)])
+    journal.append_entries([entry(1, title="改过的标题")])
+    comics = journal.read_entries()
+    assert [e["id"] for e in comics] == ["comic-001", "comic-002"]
+    assert comics[0]["title"] == "改过的标题"
+
+
+def test_compact_keeps_hand_edits_to_snapshot(journal):
+    journal.append_entries([entry(1), entry(2), entry(3)])
+    journal.compact()
+
+    with open(journal.SNAPSHOT_PATH, "r", encoding="utf-8") as f:
+        snapshot = json.load(f)
+    snapshot["comics"][0]["title"] = "手动修正"
+    del snapshot["comics"][1]
+    with open(journal.SNAPSHOT_PATH, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, ensure_ascii=False)
+    # 手动修改之后、压实之前另一个进程又追加了一条
+    journal.append_entries([entry(4)])
+
+    comics = journal.compact()
+    assert [(e["id"], e["title"]) for e in comics] == [
+        ("comic-001", "手动修正"), ("comic-003", "标题3"), ("comic-004", "标题4")]
+    # 已删除的序号不会被重新分配
+    assert journal.allocate_ids(1) == [5]
+
+
+def test_compacts_only_after_tail_threshold(journal):
+    journal.append_entries([entry(1)])
+    # 还没有快照：总是压实
+    assert [e["id"] for e in journal.compact_if_needed(min_tail_bytes=1024)] == ["comic-001"]
+
+    journal.append_entries([entry(2)])
+    assert journal.compact_if_needed(min_tail_bytes=1024) is None
+    with open(journal.SNAPSHOT_PATH, "r", encoding="utf-8") as f:
+        assert [e["id"] for e in json.load(f)["comics"]] == ["comic-001"]
+
+    # 积累够了再压实，中间跳过的记录一并写进快照
+    journal.append_entries([entry(n, topic="长" * 100) for n in range(3, 8)])
+    comics = journal.compact_if_needed(min_tail_bytes=1024)
+    assert [e["id"] for e in comics] == [f"comic-{n:03d}" for n in range(1, 8)]
+    assert journal.compact_if_needed(min_tail_bytes=1024) is None
@@ -0,0 +1,38 @@
+import pytest
+from PIL import Image
+
+import auto_generate_comic as producer
+
+
+@pytest.mark.parametrize("workers", ["1", "2"])
+def test_over_ceiling_defers_comic_instead_of_publishing_original(site, producer, make_batch, read_index, workers):
+    batch = make_batch([{"title": "超出上限一"}, {"title": "超出上限二"}])
+    # 1MB 的上限谁也满足不了：进程池里超出、主进程重试也超出
+    result = producer("--workers", workers, "--dup-policy", "off", "--max-rss", "1", "batch", str(batch))
+    assert "本次不发布" in result.stdout
+    assert not (site / "comic-index.json").exists()
+    # 不把原图当压缩结果写进 img/ 或压缩缓存
+    assert not list((site / "img").iterdir())
+    assert not (site / ".cache" / "compress").exists()
+
+    # 不限内存再跑：沿用分配好的 ID 正常压缩发布
+    result = producer("--workers", workers, "--dup-policy", "off", "batch", str(batch))
+    assert "其中 2 个从上次中断处继续" in result.stdout
+    assert [c["id"] for c in read_index()] == ["comic-001", "comic-002"]
+    assert (site / "img" / "comic-001-1.png").exists()
+
+
+@pytest.mark.parametrize("mode, ext", [("RGB", ".jpg"), ("RGBA", ".png")])
+def test_low_memory_decodes_within_max_dimension(tmp_path, monkeypatch, mode, ext):
+    monkeypatch.setattr(producer, "MEMORY_BOUNDED", True)
+    monkeypatch.setattr(producer, "MAX_SOURCE_DIMENSION", 1000)
+    monkeypatch.setattr(producer, "COMPRESS_CACHE_ENABLED", False)
+    source = tmp_path / f"big{ext}"
+    Image.new(mode, (3000, 1800), (40, 120, 200) + ((255,) if mode == "RGBA" else ())).save(source)
+
+    output = tmp_path / f"out{ext}"
+    producer.compress_image(str(source), str(output))
+    with Image.open(output) as img:
+        assert max(img.size) <= 1000
+        assert abs(img.width / img.height - 3000 / 1800) < 0.01
+        assert img.mode == "RGB"
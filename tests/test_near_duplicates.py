@@ -0,0 +1,57 @@
+import json
+import random
+
+from PIL import Image, ImageDraw
+
+import perceptual_hash
+
+
+def scene(seed, size=(640, 480)):
+    """随机色块画面（纯色图的 dHash 全为 0，彼此都会算作近似重复）"""
+    rnd = random.Random(seed)
+    img = Image.new("RGB", size, (240, 240, 240))
+    draw = ImageDraw.Draw(img)
+    for _ in range(12):
+        x, y = rnd.randrange(size[0]), rnd.randrange(size[1])
+        r = rnd.randrange(30, 160)
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=tuple(rnd.randrange(256) for _ in range(3)))
+    return img
+
+
+def write_batch(path, rows):
+    path.write_text("".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows), encoding="utf-8")
+    return path
+
+
+def test_bk_tree_search_matches_brute_force():
+    rnd = random.Random(1)
+    values = [rnd.getrandbits(64) for _ in range(500)]
+    # 加一些只差几位的近邻
+    values += [v ^ (1 << rnd.randrange(64)) ^ (1 << rnd.randrange(64)) for v in values[:50]]
+    tree = perceptual_hash.BKTree((v, n) for n, v in enumerate(values))
+    for query in values[:80]:
+        expected = sorted((perceptual_hash.hamming(query, v), n) for n, v in enumerate(values)
+                          if perceptual_hash.hamming(query, v) <= 6)
+        assert tree.search(query, 6) == expected
+
+
+def test_reencoded_copy_is_flagged_or_rejected(tmp_path, producer, read_index):
+    scene(1).save(tmp_path / "original.png")
+    # 缩小后再存成 JPEG：字节完全不同，画面相同
+    scene(1).resize((480, 360)).save(tmp_path / "copy.jpg", quality=70)
+    scene(2).save(tmp_path / "other.png")
+
+    producer("batch", str(write_batch(tmp_path / "first.jsonl", [{"images": ["original.png"], "title": "原图"}])))
+
+    copy_batch = write_batch(tmp_path / "copy.jsonl", [{"images": ["copy.jpg"], "title": "转存"},
+                                                       {"images": ["other.png"], "title": "另一张"}])
+    result = producer("--dup-policy", "reject", "batch", str(copy_batch))
+    assert "近似重复" in result.stdout and "comic-001-1.png" in result.stdout
+    assert "拒绝发布近似重复的漫画 1 个" in result.stdout
+    assert [c["title"] for c in read_index()] == ["原图", "另一张"]
+
+    # flag 只提示，照常发布
+    flag_batch = write_batch(tmp_path / "flag.jsonl", [{"images": ["copy.jpg"], "title": "转存再试"}])
+    result = producer("batch", str(flag_batch))
+    assert "近似重复" in result.stdout
+    assert [c["title"] for c in read_index()] == ["原图", "另一张", "转存再试"]
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+import auto_generate_comic as producer
+
+
+@pytest.fixture
+def emit_webp(monkeypatch):
+    monkeypatch.setattr(producer, "GIF_EMIT_WEBP", True)
+
+
+def save_gif(path, frames):
+    frames[0].save(path, save_all=True, append_images=frames[1:], duration=100, loop=0, disposal=2)
+    return str(path)
+
+
+def transparent_gif(path):
+    """透明底上一个移动的圆点"""
+    frames = []
+    for i in range(4):
+        frame = Image.new("RGBA", (200, 200), (0, 0, 0, 0))
+        ImageDraw.Draw(frame).ellipse((20 + i * 20, 40, 80 + i * 20, 100), fill=(250, 200, 30, 255))
+        frames.append(frame)
+    return save_gif(path, frames)
+
+
+def noisy_gif(path, transparent_corner=False):
+    """随机噪点帧：GIF 压不动，有损 WebP 明显更小"""
+    rng = np.random.default_rng(0)
+    frames = []
+    for _ in range(3):
+        pixels = rng.integers(0, 255, (400, 400, 4), dtype=np.uint8)
+        pixels[..., 3] = 255
+        if transparent_corner:
+            pixels[:100, :100, 3] = 0
+        frames.append(Image.fromarray(pixels, "RGBA"))
+    return save_gif(path, frames)
+
+
+@pytest.mark.parametrize("bounded", [False, True])
+def test_keeps_transparency(tmp_path, monkeypatch, bounded):
+    monkeypatch.setattr(producer, "MEMORY_BOUNDED", bounded)
+    output = tmp_path / "out.gif"
+    producer.optimize_gif(noisy_gif(tmp_path / "src.gif", transparent_corner=True), str(output))
+
+    with Image.open(output) as img:
+        assert "transparency" in img.info
+        for idx in range(img.n_frames):
+            img.seek(idx)
+            frame = img.convert("RGBA")
+            assert frame.getpixel((10, 10))[3] == 0
+            assert frame.getpixel((300, 300))[3] == 255
+
+
+def test_webp_kept_only_when_smaller(tmp_path, emit_webp):
+    output = tmp_path / "noisy.gif"
+    producer.optimize_gif(noisy_gif(tmp_path / "noisy-src.gif", transparent_corner=True), str(output))
+    webp = tmp_path / "noisy.webp"
+    assert webp.stat().st_size < output.stat().st_size
+    with Image.open(webp) as img:
+        # 透明 GIF 生成的 WebP 同样带透明通道，不是黑底
+        assert img.convert("RGBA").getpixel((10, 10))[3] == 0
+
+    # 小色块动画 GIF 本身就很小，WebP 不划算，不保留
+    output = tmp_path / "dot.gif"
+    producer.optimize_gif(transparent_gif(tmp_path / "dot-src.gif"), str(output))
+    assert output.exists()
+    assert not (tmp_path / "dot.webp").exists()
+
+
+def test_detail_page_renders_images(tmp_path, monkeypatch):
+    monkeypatch.setattr(producer, "PROJECT_ROOT", str(tmp_path))
+    monkeypatch.setattr(producer, "COMIC_HTML_DIR", str(tmp_path))
+    (tmp_path / "img").mkdir()
+    (tmp_path / "img" / "comic-001-2.webp").write_bytes(b"")
+
+    html_path = producer.generate_comic_html(
+        "comic-001", "<猫>与狗", "主题", "生活日常", "居家日常", "笑点",
+        ["img/comic-001-1.png", "img/comic-001-2.gif"])
+    with open(html_path, "r", encoding="utf-8") as f:
+        page = f.read()
+
+    assert '<img src="../img/comic-001-1.png" alt="&lt;猫&gt;与狗"' in page
+    assert '<source srcset="../img/comic-001-2.webp" type="image/webp">' in page
+    assert '<img src="../img/comic-001-2.gif"' in page
+    assert "<h1>&lt;猫&gt;与狗</h1>" in page
+    assert "$" not in page
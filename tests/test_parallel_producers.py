@@ -0,0 +1,13 @@
+def test_concurrent_allocate_ids_across_processes(run_python, start_python):
+    code = ("import index_journal\n"
+            "ids = [n for _ in range(20) for n in index_journal.allocate_ids(3)]\n"
+            "print('IDS', *ids)")
+    procs = [start_python(code) for _ in range(4)]
+    ids = []
+    for proc in procs:
+        out, err = proc.communicate(timeout=60)
+        assert proc.returncode == 0, err
+        ids.extend(int(n) for n in out.split("IDS", 1)[1].split())
+    # 4 个进程同时分配（每个 20 次 × 3 个）：序号不重复、不跳号
+    assert sorted(ids) == list(range(1, 4 * 20 * 3 + 1))
+    assert run_python("import index_journal; print(index_journal.read_last_id())").stdout.split()[-1] == "240"
@@ -0,0 +1,26 @@
+APPEND_IMAGE = """
+import index_journal
+entry = index_journal.read_entries()[0]
+index_journal.append_entries([dict(entry, imgs=entry["imgs"] + ["img/comic-001-2.gif"])])
+"""
+
+
+def test_rebuild_rewrites_page_when_its_images_change(site, run_python, producer, make_batch):
+    producer("batch", str(make_batch([{"title": "重建"}])))
+    page = site / "comics" / "comic-001.html"
+    assert '<img src="../img/comic-001-1.png"' in page.read_text(encoding="utf-8")
+
+    # 第一次 rebuild 记下指纹；之后什么都没变就全部跳过
+    producer("rebuild")
+    assert "重写 0 个，跳过 1 个" in producer("rebuild").stdout
+
+    # 索引里多了一张 GIF：页面要重写并输出它
+    run_python(APPEND_IMAGE)
+    (site / "img" / "comic-001-2.gif").write_bytes(b"GIF89a")
+    assert "重写 1 个" in producer("rebuild").stdout
+    assert '<img src="../img/comic-001-2.gif"' in page.read_text(encoding="utf-8")
+
+    # 后来为 GIF 生成了动画 WebP：页面要改成 <picture>
+    (site / "img" / "comic-001-2.webp").write_bytes(b"RIFF")
+    assert "重写 1 个" in producer("rebuild").stdout
+    assert '<source srcset="../img/comic-001-2.webp"' in page.read_text(encoding="utf-8")
@@ -0,0 +1,28 @@
+import search_index
+
+
+def comic(num, title, **fields):
+    return {"id": f"comic-{num:03d}", "title": title, "img": f"img/comic-{num:03d}-1.png",
+            "html": f"comics/comic-{num:03d}.html", **fields}
+
+
+COMICS = [
+    comic(1, "猫猫行为大赏", category="萌宠"),
+    comic(2, "上班摸鱼", topic="打工人的一天", category="职场"),
+    comic(3, "狗狗拆家", funny_example="回家发现沙发没了，猫在旁边看戏", category="萌宠"),
+]
+
+
+def test_single_character_query_matches_longer_words(tmp_path):
+    search_index.build_search_index(COMICS, str(tmp_path))
+    # 单字查询命中多字标题（标题权重高，排在只在笑点里出现的前面）
+    assert [comic_id for comic_id, _ in search_index.search("猫", str(tmp_path))] == ["comic-001", "comic-003"]
+    # 多字查询仍按二元组匹配，单字不会把不相关的漫画带进来
+    assert [comic_id for comic_id, _ in search_index.search("摸鱼", str(tmp_path))] == ["comic-002"]
+    assert search_index.search("鱼猫", str(tmp_path)) == []
+
+
+def test_query_tokens_do_not_include_unigrams():
+    assert search_index.tokenize("猫猫行为") == ["猫猫", "猫行", "行为"]
+    assert search_index.tokenize("猫") == ["猫"]
+    assert search_index.tokenize("Ｃａｔ 猫", unigrams=True) == ["cat", "猫"]